@@ -0,0 +1,1381 @@
+"""
+Performance checks for the POS database layer.
+
+Runs against a throw-away copy of the schema filled with sample data, so it
+never touches the live hotel_restaurant.db.
+
+    python benchmark.py latency      # before/after timing of the hot calls
+    python benchmark.py stress       # many terminals writing at once, zero lost orders
+    python benchmark.py plans        # EXPLAIN QUERY PLAN of every hot query, fails on a full scan
+    python benchmark.py kot          # rows written per KOT as a table's cart grows
+    python benchmark.py reports      # every period x dimension report over a year of history
+    python benchmark.py export       # CSV export memory stays flat, POS writes keep going meanwhile
+    python benchmark.py history      # sales history page time, first page vs deep pages
+    python benchmark.py archive      # move old history to archive files, reports unchanged
+    python benchmark.py gst          # GST slab summary from the rollup vs from the order lines
+    python benchmark.py occupancy    # occupancy / ADR / RevPAR over years of stays vs a night-by-night count
+    python benchmark.py print        # time the GUI waits per ticket: printing inline vs the print queue
+    python benchmark.py render       # render time per receipt: ASCII85-wrapped vs plain compressed page streams
+    python benchmark.py escpos       # ticket latency: PDF vs ESC/POS to a (loopback) network printer
+    python benchmark.py stations     # KOTs split per kitchen station, printed in parallel, printed qty per line
+    python benchmark.py invoices     # bulk invoice copies: throughput per worker count, flat memory, same bytes every run
+    python benchmark.py upgrade      # maintenance commands on a DB (and archive) written by the original version
+"""
+import argparse
+import base64
+import concurrent.futures
+import csv
+import datetime
+import hashlib
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import zlib
+
+import bulk_invoices
+import database
+import database_halls
+import database_reports
+import database_analytics
+import database_export
+import database_archive
+import database_occupancy
+import escpos
+import printer
+import print_queue
+
+
+# ==========================================
+# SAMPLE DATABASE
+# ==========================================
+
+def build_sample_db(folder, tables=30, items=200, history_orders=5000, lines_per_order=4):
+    """Creates a fresh DB in `folder` with a realistic amount of history."""
+    database.DB_NAME = os.path.join(folder, "bench_hotel.db")
+    database.init_db()
+    database.init_room_db()
+    database_halls.init_hall_db()
+
+    def seed(cursor):
+        cursor.executemany("INSERT INTO dining_tables (table_number, status) VALUES (?, 'AVAILABLE')",
+                           [(f"T{n}",) for n in range(1, tables + 1)])
+        cursor.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, 'Double', 2500)",
+                           [(str(100 + n),) for n in range(1, 21)])
+        cursor.executemany("""
+            INSERT INTO items (name, category_id, price_dinein, price_delivery, image_path, tax_rate)
+            VALUES (?, ?, ?, ?, '', 5.0)
+        """, [(f"Item {n}", (n % 3) + 1, 100 + n, 110 + n) for n in range(1, items + 1)])
+
+        # Closed history, plus one open order on every table
+        for n in range(history_orders):
+            day = f"2025-{(n % 12) + 1:02d}-{(n % 28) + 1:02d}"
+            opened = f"{day} {11 + n % 12:02d}:{n % 60:02d}:00"
+            cursor.execute("""
+                INSERT INTO orders (table_id, order_type, status, order_date, opened_at, kot_at, closed_at)
+                VALUES (?, 'DINE_IN', 'COMPLETED', ?, ?, ?, ?)
+            """, ((n % tables) + 1, day, opened, opened, opened))
+            order_id = cursor.lastrowid
+            cursor.executemany("""
+                INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price, printed_qty, notes)
+                VALUES (?, ?, 1, 120, 5.0, 120, 1, '')
+            """, [(order_id, f"Item {(n + k) % items + 1}") for k in range(lines_per_order)])
+        for t_id in range(1, tables + 1):
+            cursor.execute("INSERT INTO orders (table_id, order_type, status, order_date, opened_at) VALUES (?, 'DINE_IN', 'OPEN', ?, ?)",
+                           (t_id, database.today, database._now()))
+            order_id = cursor.lastrowid
+            cursor.executemany("""
+                INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price, printed_qty, notes)
+                VALUES (?, ?, 2, 150, 5.0, 300, 2, '')
+            """, [(order_id, f"Item {k}") for k in range(1, lines_per_order + 1)])
+        cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('hotel_name', 'Bench Hotel')")
+
+    database.run_write(seed)
+    database.rebuild_daily_sales() # The seed wrote history directly, bypassing the close hooks
+    return database.DB_NAME
+
+
+def time_call(func, repeats):
+    """Returns (median, p95) wall time of func() in microseconds."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+# ==========================================
+# 1. CONNECTION LATENCY (before / after)
+# ==========================================
+
+def hot_calls():
+    """The calls a table click and a table-grid refresh make."""
+    return [
+        ("get_active_order", lambda: database.get_active_order(5)),
+        ("get_all_categories", database.get_all_categories),
+        ("get_menu_items", lambda: database.get_menu_items("DINE_IN")),
+        ("get_all_tables", database.get_all_tables),
+        ("get_setting", lambda: database.get_setting("hotel_name")),
+        ("get_daily_report", lambda: database.get_daily_report("2025-03-03")),
+    ]
+
+
+def bench_latency(repeats=300):
+    folder = tempfile.mkdtemp(prefix="pos_bench_")
+    try:
+        build_sample_db(folder)
+        persistent = database.get_connection
+
+        # "Before" = the old behaviour: a brand new connection for every call, and a cold menu cache
+        database.get_connection = lambda: sqlite3.connect(database.DB_NAME)
+        try:
+            before = {name: time_call(lambda fn=fn: (database._menu_changed(), fn()), repeats)
+                      for name, fn in hot_calls()}
+        finally:
+            database.get_connection = persistent
+
+        for _, fn in hot_calls():
+            fn() # warm the per-thread connection and its statement cache
+        after = {name: time_call(fn, repeats) for name, fn in hot_calls()}
+
+        print(f"\n{'call':<22}{'before µs':>12}{'after µs':>12}{'p95 before':>12}{'p95 after':>12}{'speedup':>10}")
+        for name, _ in hot_calls():
+            (b_med, b_p95), (a_med, a_p95) = before[name], after[name]
+            print(f"{name:<22}{b_med:>12.1f}{a_med:>12.1f}{b_p95:>12.1f}{a_p95:>12.1f}{b_med / a_med:>9.1f}x")
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 2. MULTI-TERMINAL WRITE STRESS
+# ==========================================
+
+def _stress_terminal(job):
+    """One 'terminal' process: rings up takeouts, runs a table + a room, and races the others for the ballroom."""
+    db_path, terminal, rounds = job
+    database.DB_NAME = db_path
+    cart = [
+        {'id': 1, 'name': 'Item 1', 'price': 101.0, 'qty': 2, 'tax_rate': 5.0, 'printed': 0, 'note': ''},
+        {'id': 2, 'name': 'Item 2', 'price': 102.0, 'qty': 1, 'tax_rate': 5.0, 'printed': 0, 'note': 'less spicy'},
+    ]
+    table_id = terminal + 1
+    room = str(101 + terminal)
+    failures = 0
+    halls_won = 0
+    first_day = datetime.date(2030, 1, 1)
+    for n in range(rounds):
+        if database.save_takeout_order(cart) is None:
+            failures += 1
+        try:
+            database.save_order(table_id, cart, "DINE_IN")
+            database.mark_kot_printed(table_id)
+            database.save_order(room, cart, "ROOM_SERVICE")
+            database.check_in_guest(room, f"Guest {terminal}", "-")
+            database.checkout_room_orders(room)
+            database.check_out_guest(room)
+        except Exception as e:
+            print(f"Terminal {terminal}: {e}")
+            failures += 1
+        database.checkout_table(table_id) # Swallows its own errors; the final counts catch a lost one
+        # Every terminal wants the Grand Ballroom on the same day: exactly one may get it
+        day = (first_day + datetime.timedelta(days=n)).strftime("%Y-%m-%d")
+        halls_won += database_halls.book_hall(1, f"Terminal {terminal}", "-", day, "Party", "", 20000)
+    database.close_connection()
+    return failures, halls_won
+
+
+def stress_writers(terminals=12, rounds=40):
+    folder = tempfile.mkdtemp(prefix="pos_stress_")
+    try:
+        build_sample_db(folder, tables=terminals, items=10, history_orders=0)
+        db_path = database.DB_NAME
+        database.close_connection()
+
+        start = time.perf_counter()
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(terminals) as pool:
+            results = pool.map(_stress_terminal, [(db_path, n, rounds) for n in range(terminals)])
+        failures = sum(failed for failed, _ in results)
+        halls_won = sum(won for _, won in results)
+        elapsed = time.perf_counter() - start
+
+        cursor = database.get_connection().cursor()
+        expected = terminals * rounds
+        counts = {}
+        for order_type, status in [("TAKEOUT", "CLOSED"), ("DINE_IN", "COMPLETED"), ("ROOM_SERVICE", "CLOSED")]:
+            cursor.execute("""
+                SELECT COUNT(*) FROM orders o
+                WHERE o.order_type = ? AND o.status = ?
+                  AND (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) = 2
+            """, (order_type, status))
+            counts[order_type] = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM bookings WHERE status = 'CHECKED_OUT'")
+        counts["CHECKOUTS"] = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM orders WHERE status = 'OPEN'")
+        still_open = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*), COUNT(DISTINCT event_date) FROM hall_bookings WHERE hall_id = 1")
+        hall_rows, hall_days = cursor.fetchone()
+        halls_ok = hall_rows == hall_days == halls_won == rounds
+        # The rollup the close hooks built concurrently must equal one rebuilt from scratch
+        rollup_sql = ["SELECT sale_date, stream, order_type, tax_rate, ROUND(subtotal, 2), orders_count FROM daily_sales ORDER BY 1, 2, 3, 4",
+                      "SELECT sale_date, hour, item_id, item_name, qty, ROUND(revenue, 2) FROM item_sales_hourly ORDER BY 1, 2, 3, 4"]
+        incremental = [cursor.execute(sql).fetchall() for sql in rollup_sql]
+        database.rebuild_daily_sales()
+        rollup_ok = incremental == [cursor.execute(sql).fetchall() for sql in rollup_sql]
+
+        writes = expected * 9
+        print(f"\n{terminals} terminals x {rounds} rounds: ~{writes} write transactions in {elapsed:.1f}s "
+              f"({writes / elapsed:.0f}/s), {failures} failed calls")
+        lost = 0
+        for name, got in counts.items():
+            lost += expected - got
+            print(f"  {name:<14}{got:>6} / {expected}")
+        print(f"  left OPEN     {still_open:>6}")
+        print(f"  daily rollup  {'matches a rebuild' if rollup_ok else 'DIFFERS from a rebuild'}")
+        print(f"  hall days     {hall_rows:>6} booked by {terminals} racing terminals, {halls_won} wins / {rounds} days")
+        ok = lost == 0 and still_open == 0 and failures == 0 and rollup_ok and halls_ok
+        print("✅ Zero lost orders." if ok else f"❌ {lost} orders lost!")
+        return ok
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 3. QUERY PLANS (every hot query must use an index)
+# ==========================================
+
+# Small lookup tables the app is *supposed* to walk in full (one row per table/room/hall/menu item)
+DRIVING_TABLES = {"dining_tables", "rooms", "halls", "items", "categories", "settings", "users"}
+
+
+def plan_calls():
+    """The hot functions of database.py and database_halls.py, with arguments that hit real rows."""
+    day = database.today
+    return [
+        ("get_all_tables", database.get_all_tables),
+        ("get_active_order", lambda: database.get_active_order(5)),
+        ("get_active_order(room)", lambda: database.get_active_order("101", is_room=True)),
+        ("save_order", lambda: database.save_order(5, database.get_active_order(5), "DINE_IN")),
+        ("mark_kot_printed", lambda: database.mark_kot_printed(5)),
+        ("mark_kot_printed(room)", lambda: database.mark_kot_printed("101", is_room=True)),
+        ("get_daily_report", lambda: database.get_daily_report(day)),
+        ("get_daily_transactions", lambda: database.get_daily_transactions(day)),
+        ("get_all_rooms", database.get_all_rooms),
+        ("get_room_food_total", lambda: database.get_room_food_total("101")),
+        ("get_room_order_items", lambda: database.get_room_order_items("101")),
+        ("get_active_booking_details", lambda: database.get_active_booking_details("101")),
+        ("book_hall", lambda: database_halls.book_hall(1, "Bench", "-", day, "Party", "", 5000)),
+        ("get_bookings", database_halls.get_bookings),
+        ("get_bookings(next page)", lambda: database_halls.get_bookings(after=(day, 1))),
+        ("month_calendar", lambda: database_halls.month_calendar(day[:7])),
+        ("get_sales_history", database.get_sales_history),
+        ("get_sales_history(next page)", lambda: database.get_sales_history(after=(day + " 12:00:00", 10**9))),
+        ("get_sales_history(filtered)", lambda: database.get_sales_history(order_type="DINE_IN", table_id=5,
+                                                                            start=day, end=day)),
+        ("checkout_room_orders", lambda: database.checkout_room_orders("101")),
+        ("check_out_guest", lambda: database.check_out_guest("101")),
+        ("checkout_table", lambda: database.checkout_table(5)),
+    ]
+
+
+def _alias_map(sql):
+    """{'o': 'orders', 'orders': 'orders', ...} for every FROM/JOIN/UPDATE target in sql."""
+    aliases = {}
+    for table, alias in re.findall(r"(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.upper() not in ("WHERE", "SET", "ON", "JOIN", "LEFT", "INNER", "GROUP", "ORDER", "VALUES"):
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def check_plans():
+    folder = tempfile.mkdtemp(prefix="pos_plans_")
+    try:
+        build_sample_db(folder)
+        # A guest with room service running, so the room queries have something to find
+        database.check_in_guest("101", "Plan Guest", "-")
+        database.save_order("101", [{'id': 1, 'name': 'Item 1', 'price': 101.0, 'qty': 1, 'tax_rate': 5.0,
+                                     'printed': 0, 'note': ''}], "ROOM_SERVICE")
+
+        conn = database.get_connection()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        bad = 0
+        for name, fn in plan_calls():
+            del statements[:]
+            fn()
+            for sql in [s for s in statements if s.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT"))]:
+                aliases = _alias_map(sql)
+                with_plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+                for _, _, _, detail in with_plan:
+                    scan = re.match(r"SCAN (\w+)", detail)
+                    if not scan or "INDEX" in detail or detail == "SCAN CONSTANT ROW": # INSERT ... SELECT without FROM
+                        continue
+                    table = aliases.get(scan.group(1).lower(), scan.group(1).lower())
+                    if table not in DRIVING_TABLES:
+                        bad += 1
+                        print(f"❌ {name}: full scan of {table}\n     {' '.join(sql.split())[:150]}")
+            print(f"  checked {name}")
+        conn.set_trace_callback(None)
+        print("✅ Every hot query uses an index." if bad == 0 else f"❌ {bad} full scans found.")
+        return bad == 0
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 4. WRITE VOLUME PER KOT
+# ==========================================
+
+def kot_write_volume(sizes=(5, 20, 60)):
+    """A long-running table: a big saved cart, then one more item and one changed qty per KOT."""
+    folder = tempfile.mkdtemp(prefix="pos_kot_")
+    try:
+        build_sample_db(folder, history_orders=0)
+        conn = database.get_connection()
+        print(f"\n{'cart lines':<12}{'rows written':>14}{'µs per KOT':>12}")
+        for table_id, size in enumerate(sizes, start=1):
+            database.checkout_table(table_id)
+            cart = [{'line_id': None, 'id': n, 'name': f"Item {n}", 'price': 100.0 + n, 'qty': 1,
+                     'tax_rate': 5.0, 'printed': 0, 'note': ''} for n in range(1, size + 1)]
+            database.save_order(table_id, cart, "DINE_IN")
+            database.mark_kot_printed(table_id)
+
+            cart = database.get_active_order(table_id) # What the POS screen reloads
+            cart[0]['qty'] += 1
+            cart.append({'line_id': None, 'id': 999, 'name': "Item 199", 'price': 299.0, 'qty': 1,
+                         'tax_rate': 5.0, 'printed': 0, 'note': ''})
+            before = conn.total_changes
+            start = time.perf_counter()
+            database.save_order(table_id, cart, "DINE_IN")
+            elapsed = (time.perf_counter() - start) * 1e6
+            # total_changes also counts the dining_tables status update
+            print(f"{len(cart):<12}{conn.total_changes - before:>14}{elapsed:>12.0f}")
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 5. RANGE REPORTS OVER A YEAR
+# ==========================================
+
+def bench_reports(history_orders=20000):
+    folder = tempfile.mkdtemp(prefix="pos_reports_")
+    try:
+        build_sample_db(folder, history_orders=history_orders)
+        worst = 0.0
+        print(f"\n{history_orders} orders over 2025\n{'report':<24}{'rows':>8}{'ms':>10}")
+        for period in database_reports.PERIODS:
+            for dimension in database_reports.DIMENSIONS:
+                start = time.perf_counter()
+                rows = database_reports.sales_report("2025-01-01", "2025-12-31", period, dimension)
+                elapsed = (time.perf_counter() - start) * 1000
+                worst = max(worst, elapsed)
+                print(f"{period + ' x ' + dimension:<24}{len(rows):>8}{elapsed:>10.1f}")
+        start = time.perf_counter()
+        database_reports.range_summary("2025-01-01", "2025-12-31")
+        print(f"{'range_summary':<24}{'':>8}{(time.perf_counter() - start) * 1000:>10.1f}")
+        for name, fn in [("top_sellers", lambda: database_analytics.top_sellers("2025-01-01", "2025-12-31")),
+                         ("heatmap (whole menu)", lambda: database_analytics.heatmap("2025-01-01", "2025-12-31")),
+                         ("heatmap (one item)", lambda: database_analytics.heatmap("2025-01-01", "2025-12-31", "Item 7"))]:
+            start = time.perf_counter()
+            fn()
+            print(f"{name:<24}{'':>8}{(time.perf_counter() - start) * 1000:>10.1f}")
+        # What the Detailed Transactions view waits for: the first batch, per sort column
+        for column in (1, 3):
+            start = time.perf_counter()
+            cursor = database_reports.open_transactions("2025-01-01", "2025-12-31", sort_column=column)
+            cursor.fetchmany(500)
+            cursor.connection.close()
+            print(f"{'transactions by col ' + str(column):<24}{500:>8}{(time.perf_counter() - start) * 1000:>10.1f}")
+        print(f"Slowest report: {worst:.0f} ms")
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 6. STREAMING EXPORT
+# ==========================================
+
+def _pos_writer(stop, latencies):
+    """A terminal ringing up takeouts while the export runs."""
+    cart = [{'id': 1, 'name': 'Item 1', 'price': 101.0, 'qty': 1, 'tax_rate': 5.0, 'printed': 0, 'note': ''}]
+    while not stop.is_set():
+        start = time.perf_counter()
+        database.save_takeout_order(cart)
+        latencies.append((time.perf_counter() - start) * 1000)
+    database.close_connection()
+
+
+def bench_export(sizes=(5000, 40000)):
+    print(f"\n{'orders':>8}{'rows out':>10}{'peak KB':>10}{'seconds':>9}{'POS writes':>12}{'max write ms':>14}")
+    for history in sizes:
+        folder = tempfile.mkdtemp(prefix="pos_export_")
+        try:
+            build_sample_db(folder, history_orders=history)
+            database.close_connection()
+            stop, latencies = threading.Event(), []
+            writer = threading.Thread(target=_pos_writer, args=(stop, latencies))
+            writer.start()
+
+            start = time.perf_counter()
+            written = database_export.export_history(os.path.join(folder, "out"), "2025-01-01", "2025-12-31", compress=True)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            writer.join()
+
+            # Second run just for the memory peak (tracemalloc slows everything down)
+            tracemalloc.start()
+            database_export.export_history(os.path.join(folder, "out"), "2025-01-01", "2025-12-31", compress=True)
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            print(f"{history:>8}{sum(written.values()):>10}{peak:>10.0f}{elapsed:>9.2f}{len(latencies):>12}{max(latencies):>14.1f}")
+        finally:
+            database.close_connection()
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 7. SALES HISTORY PAGING
+# ==========================================
+
+def bench_history(history_orders=40000, depths=(1, 10, 100, 500)):
+    """Time to fetch page N by keyset vs the old-style OFFSET, same page size."""
+    folder = tempfile.mkdtemp(prefix="pos_history_")
+    try:
+        build_sample_db(folder, history_orders=history_orders)
+        size = database.SALES_PAGE_SIZE
+        conn = database.get_connection()
+        print(f"\n{history_orders} closed orders, {size} per page\n{'page':>6}{'keyset ms':>12}{'OFFSET ms':>12}")
+        after, page = None, 0
+        for depth in depths:
+            while page < depth - 1: # Walk there the way a scrolling user would
+                rows = database.get_sales_history(after=after)
+                if len(rows) < size:
+                    break # That was the last page
+                after, page = (rows[-1][1], rows[-1][0]), page + 1
+            if page < depth - 1:
+                print(f"{depth:>6}  (the history ends at page {page + (1 if rows else 0)})")
+                break
+            start = time.perf_counter()
+            rows = database.get_sales_history(after=after)
+            keyset = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            offset_rows = conn.execute("""
+                SELECT o.id FROM orders o WHERE o.status != 'OPEN' AND o.closed_at IS NOT NULL
+                ORDER BY o.closed_at DESC, o.id DESC LIMIT ? OFFSET ?
+            """, (size, (depth - 1) * size)).fetchall()
+            offset = (time.perf_counter() - start) * 1000
+            assert [r[0] for r in rows] == [r[0] for r in offset_rows], "keyset page differs from OFFSET page"
+            print(f"{depth:>6}{keyset:>12.2f}{offset:>12.2f}")
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 8. HOT / COLD ARCHIVAL
+# ==========================================
+
+def _report_snapshot():
+    """Everything a report or export can show, to compare before / after archiving."""
+    conn = database.get_connection()
+    snap = {f"{p} x {d}": database_reports.sales_report("2024-01-01", "2026-12-31", p, d)
+            for p in database_reports.PERIODS for d in database_reports.DIMENSIONS}
+    snap["summary"] = database_reports.range_summary("2024-01-01", "2026-12-31")
+    snap["transactions"] = sorted(database_reports.get_transactions("2024-01-01", "2026-12-31"))
+    snap["daily_sales"] = conn.execute("SELECT * FROM daily_sales ORDER BY 1, 2, 3, 4, 5").fetchall()
+    snap["item_sales_hourly"] = conn.execute("SELECT * FROM item_sales_hourly ORDER BY 1, 2, 3, 4").fetchall()
+    return snap
+
+
+def _hot_timings():
+    conn = database.get_connection()
+    timings = {name: time_call(fn, 200)[0] for name, fn in hot_calls()}
+    timings["scan orders"] = time_call(lambda: conn.execute("SELECT COUNT(*), SUM(subtotal) FROM orders").fetchone(), 20)[0]
+    return timings
+
+
+def bench_archive(history_orders=40000, days=120):
+    folder = tempfile.mkdtemp(prefix="pos_archive_")
+    try:
+        build_sample_db(folder, history_orders=history_orders)
+        database.check_in_guest("101", "Old Guest", "-")
+        database.check_out_guest("101")
+        database.get_connection().execute("UPDATE bookings SET check_in_date = '2025-02-01', check_out_date = '2025-02-03 11:00:00'")
+        database.rebuild_daily_sales()
+        before, hot_before = _report_snapshot(), _hot_timings()
+        database.get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_before = os.path.getsize(database.DB_NAME)
+
+        # An interrupted run (copied, crash before the delete) must finish cleanly next time
+        real_run_write = database.run_write
+        database.run_write = lambda work: (_ for _ in ()).throw(RuntimeError("simulated crash"))
+        try:
+            database_archive.archive_history(days)
+        except RuntimeError:
+            pass
+        finally:
+            database.run_write = real_run_write
+
+        start = time.perf_counter()
+        moved = database_archive.archive_history(days)
+        elapsed = time.perf_counter() - start
+        database_archive.compact()
+        size_after = os.path.getsize(database.DB_NAME)
+        for year, counts in moved.items():
+            print(f"  {year}: moved {counts}")
+
+        after = _report_snapshot()
+        database.rebuild_daily_sales() # Must see the archived years too
+        rebuilt = _report_snapshot()
+        hot_after = _hot_timings()
+        written = database_export.export_history(os.path.join(folder, "out"), "2024-01-01", "2026-12-31")
+
+        print(f"\nArchived in {elapsed:.2f} s; live DB {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+        print(f"{'hot call':<22}{'before µs':>11}{'after µs':>11}")
+        for name in hot_before:
+            print(f"{name:<22}{hot_before[name]:>11.0f}{hot_after[name]:>11.0f}")
+        print(f"Export across archives: {written}")
+        bad = [key for key in before if before[key] != after[key] or before[key] != rebuilt[key]]
+        print("✅ Reports, rollups and a rebuild match the pre-archive numbers." if not bad
+              else f"❌ Differences in: {', '.join(bad)}")
+        return not bad
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 9. GST SLAB SUMMARY
+# ==========================================
+
+def bench_gst(history_orders=40000):
+    """gst_summary (one pass over the rollup) against the same figures summed from every order line."""
+    folder = tempfile.mkdtemp(prefix="pos_gst_")
+    try:
+        build_sample_db(folder, history_orders=history_orders)
+        conn = database.get_connection()
+        # Mixed slabs, as on a real menu
+        conn.execute("UPDATE order_items SET tax_rate = CASE id % 4 WHEN 0 THEN 18.0 WHEN 1 THEN 12.0 ELSE 5.0 END")
+        database.rebuild_daily_sales()
+
+        start = time.perf_counter()
+        summary = database_reports.gst_summary("2025-01-01", "2025-12-31")
+        from_rollup = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        lines = conn.execute("""
+            SELECT strftime('%Y-%m', o.order_date), o.order_type, oi.tax_rate,
+                   ROUND(SUM(oi.total_price), 2), ROUND(SUM(oi.total_price * oi.tax_rate / 100.0), 2)
+            FROM orders o JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.status != 'OPEN' AND o.order_date >= '2025-01-01' AND o.order_date < '2026-01-01'
+            GROUP BY 1, 3
+        """).fetchall()
+        from_lines = (time.perf_counter() - start) * 1000
+
+        food = {(m, rate): (taxable, total_tax) for m, stream, rate, taxable, _, _, total_tax in summary if stream == "food"}
+        expected = {(m, rate): (taxable, tax) for m, _, rate, taxable, tax in lines}
+        print(f"\n{len(summary)} slab rows for 2025; rollup {from_rollup:.1f} ms, order lines {from_lines:.1f} ms")
+        ok = food == expected
+        print("✅ Rollup slabs match the order lines." if ok else "❌ Rollup slabs differ from the order lines.")
+        return ok
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 10. ROOM OCCUPANCY
+# ==========================================
+
+def _seed_stays(rooms, years):
+    """Back-to-back stays of 1-5 nights with 0-3 empty nights between, on every room, for `years` years."""
+    rng = random.Random(7)
+    types = [("Single", 1800), ("Double", 2500), ("Suite", 6000)]
+    first = datetime.date(2025, 12, 31) - datetime.timedelta(days=365 * years)
+
+    def seed(cursor):
+        cursor.execute("DELETE FROM bookings")
+        cursor.execute("DELETE FROM rooms")
+        stays = []
+        for n in range(rooms):
+            room, (room_type, price) = str(1000 + n), types[n % 3]
+            cursor.execute("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                           (room, room_type, price))
+            day = first + datetime.timedelta(days=rng.randint(0, 3))
+            while day.year < 2026:
+                out = day + datetime.timedelta(days=rng.choice([0, 1, 1, 2, 3, 5]))
+                stays.append((room, f"{day} 14:00:00", f"{out} 11:00:00", price * rng.choice([1, 1, 0.9])))
+                day = out + datetime.timedelta(days=rng.randint(0, 3))
+        cursor.executemany("""INSERT INTO bookings (room_number, guest_name, check_in_date, check_out_date, status, nightly_rate)
+                              VALUES (?, 'Guest', ?, ?, 'CHECKED_OUT', ?)""", stays)
+        return len(stays)
+
+    return database.run_write(seed)
+
+
+def _nights_by_hand(start, end):
+    """The same figures counted one night at a time in Python, as a reference."""
+    cursor = database.get_connection().cursor()
+    cursor.execute("""SELECT b.room_number, r.room_type, b.check_in_date, b.check_out_date, b.nightly_rate
+                      FROM bookings b JOIN rooms r ON r.room_number = b.room_number""")
+    rooms, revenue = {}, {}
+    for room, room_type, check_in, check_out, rate in cursor.fetchall():
+        ci = datetime.datetime.strptime(check_in, "%Y-%m-%d %H:%M:%S")
+        co = datetime.datetime.strptime(check_out, "%Y-%m-%d %H:%M:%S")
+        nights = max(1, (co.date() - ci.date()).days)
+        per_night = rate * max(1, (co - ci).days) / nights
+        for k in range(nights):
+            night = str(ci.date() + datetime.timedelta(days=k))
+            if start <= night <= end:
+                key = (night, room_type)
+                rooms.setdefault(key, set()).add(room) # A room sells once a night, however many stays touch it
+                revenue[key] = revenue.get(key, 0) + per_night
+    return {key: len(sold) for key, sold in rooms.items()}, revenue
+
+
+def bench_occupancy(rooms=300, years=3):
+    folder = tempfile.mkdtemp(prefix="pos_occ_")
+    try:
+        build_sample_db(folder, history_orders=100)
+        stays = _seed_stays(rooms, years)
+        start, end = f"{2026 - years}-01-01", "2025-12-31"
+        print(f"\n{rooms} rooms, {stays} stays over {years} years")
+
+        for label, first, last, group in (("last month, per day", "2025-12-01", end, "day"),
+                                          ("a month 2 years back", "2024-01-01", "2024-01-31", "day"),
+                                          ("1 year, per day x type", "2025-01-01", end, "day_room_type"),
+                                          (f"{years} years, per day", start, end, "day"),
+                                          (f"{years} years, per type", start, end, "room_type")):
+            t0 = time.perf_counter()
+            rows = database_occupancy.occupancy(first, last, group)
+            print(f"  {label:<26} {len(rows):>6} rows  {(time.perf_counter() - t0) * 1000:8.1f} ms")
+        for row in database_occupancy.occupancy(start, end, "room_type"):
+            print(f"    {row[1]:<8} occupancy {row[4]:5.1f} %   ADR {row[6]:8,.2f}   RevPAR {row[7]:8,.2f}")
+
+        t0 = time.perf_counter()
+        sold, revenue = _nights_by_hand(start, end)
+        by_hand = (time.perf_counter() - t0) * 1000
+        rows = database_occupancy.occupancy(start, end, "day_room_type")
+        bad = [row for row in rows
+               if row[3] != sold.get((row[0], row[1]), 0) or abs(row[5] - revenue.get((row[0], row[1]), 0)) > 0.01]
+        print(f"  night-by-night in Python   {by_hand:8.1f} ms")
+        print("✅ Room-nights and revenue match the night-by-night count." if not bad
+              else f"❌ {len(bad)} day/type rows differ, e.g. {bad[0]}")
+        return not bad
+    finally:
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 11. PRINT QUEUE
+# ==========================================
+
+def bench_print(tickets=60):
+    """How long the GUI thread is held per ticket, inline vs queued, and the queue's retry path."""
+    folder = tempfile.mkdtemp(prefix="pos_print_")
+    cwd = os.getcwd()
+    try:
+        build_sample_db(folder, history_orders=0)
+        os.chdir(folder) # The PDFs land in the working directory
+        cart = [{'id': n, 'name': f'Item {n}', 'price': 120.0, 'qty': 2, 'tax_rate': 5.0, 'printed': 0,
+                 'note': 'less spicy' if n % 3 == 0 else ''} for n in range(1, 9)]
+        delivered = printer.deliver
+        printer.deliver = lambda filename, kind="bill": None # Time the work, don't open 100 PDF viewers
+
+        inline = []
+        for n in range(tickets):
+            start = time.perf_counter()
+            printer.generate_kot(f"TABLE {n}", cart)
+            printer.generate_bill("DINE_IN", n, cart, 2016.0)
+            inline.append((time.perf_counter() - start) * 1000)
+
+        warm_up = [print_queue.submit("kot", "warm-up", "TABLE 0", cart) for _ in range(print_queue.WORKERS)]
+        while any(job.status != print_queue.DELIVERED for job in warm_up): # Workers started outside the timing
+            time.sleep(0.01)
+        queued, jobs = [], []
+        start_all = time.perf_counter()
+        for n in range(tickets):
+            start = time.perf_counter()
+            jobs.append(print_queue.submit("kot", f"KOT {n}", f"TABLE {n}", cart))
+            jobs.append(print_queue.submit("bill", f"Bill {n}", "DINE_IN", n, cart, 2016.0))
+            queued.append((time.perf_counter() - start) * 1000)
+        while any(job.status not in (print_queue.DELIVERED, print_queue.FAILED) for job in jobs):
+            time.sleep(0.005)
+        drained = time.perf_counter() - start_all
+
+        print(f"\n{tickets} KOT + bill pairs, GUI thread held per pair (ms):")
+        print(f"  {'':<8}{'median':>9}{'p95':>9}{'max':>9}")
+        for name, times in (("inline", inline), ("queued", queued)):
+            times = sorted(times)
+            print(f"  {name:<8}{statistics.median(times):9.2f}{times[int(len(times) * 0.95)]:9.2f}{times[-1]:9.2f}")
+        print(f"  queue drained {len(jobs)} tickets in {drained:.2f}s with {print_queue.WORKERS} workers")
+
+        # A printer that is offline twice, then back
+        failures = iter([OSError("printer offline"), OSError("printer offline")])
+        def flaky(filename, kind="bill"):
+            error = next(failures, None)
+            if error:
+                raise error
+        printer.deliver = flaky
+        print_queue.RETRY_DELAY, delay = 0.05, print_queue.RETRY_DELAY
+        seen = []
+        listener = lambda j: seen.append((j, j.status))
+        print_queue.add_listener(listener)
+        job = print_queue.submit("kot", "KOT retry", "TABLE 1", cart)
+        while job.status not in (print_queue.DELIVERED, print_queue.FAILED):
+            time.sleep(0.01)
+        print_queue.remove_listener(listener)
+        print_queue.RETRY_DELAY = delay
+        printer.deliver = delivered
+        print(f"  flaky printer: {' -> '.join(status for j, status in seen if j is job)} after {job.attempts} attempts")
+
+        ok = all(j.status == print_queue.DELIVERED for j in jobs) and job.status == print_queue.DELIVERED
+        print("✅ Every ticket delivered." if ok else "❌ Some tickets failed.")
+        return ok
+    finally:
+        print_queue.shutdown()
+        os.chdir(cwd)
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+_PDF_TOKEN = re.compile(rb"\((?:\\.|[^\\)])*\)|/[^\s/\[\]()<>]+|[-+]?(?:\d+\.?\d*|\.\d+)|[A-Za-z*']+")
+
+def _page_marks(path):
+    """
+    What a reportlab PDF puts on its pages, position by position:
+    sorted [(page, x, y, what), ...] for every string (with its font) and line / box.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    fonts = {b"/" + name: base.decode() for base, name in re.findall(rb"/BaseFont /(\S+) .*?/Name /(\S+)", data)}
+    marks = []
+    streams = re.findall(rb"<<([^<>]*)>>\s*stream\r?\n(.*?)endstream", data, re.S)
+    for page, (head, body) in enumerate(streams):
+        if b"ASCII85Decode" in head:
+            body = base64.a85decode(body.strip(), adobe=True)
+        if b"FlateDecode" in head:
+            body = zlib.decompress(body)
+        origins, args, font, at = [(0.0, 0.0)], [], None, (0.0, 0.0)
+        for token in _PDF_TOKEN.findall(body):
+            if token[:1] in b"(/" or not token[:1].isalpha():
+                args.append(token)
+                continue
+            op = token.decode()
+            x0, y0 = origins[-1]
+            if op == "q":
+                origins.append(origins[-1])
+            elif op == "Q":
+                origins.pop()
+            elif op == "cm": # Only translations are used
+                origins[-1] = (x0 + float(args[4]), y0 + float(args[5]))
+            elif op == "Tf":
+                font = (fonts[args[0]], float(args[1]))
+            elif op == "Tm":
+                at = (float(args[4]), float(args[5]))
+            elif op == "Tj":
+                marks.append((page, round(x0 + at[0], 1), round(y0 + at[1], 1), font, args[0].decode("latin-1")))
+            elif op in ("m", "l", "re"):
+                marks.append((page, round(x0 + float(args[0]), 1), round(y0 + float(args[1]), 1), op,
+                              tuple(round(float(a), 1) for a in args[2:])))
+            args = []
+    return sorted(marks)
+
+
+class _FixedClock(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 1, 12, 13, 0, 0)
+
+
+def bench_render(receipts=200):
+    """Render time per receipt with ASCII85-wrapped page streams vs plain compressed ones, same marks on the page."""
+    folder = tempfile.mkdtemp(prefix="pos_render_")
+    cwd = os.getcwd()
+    a85 = printer.USE_A85
+    printer.datetime = types.SimpleNamespace(datetime=_FixedClock) # Same KOT ID / times in every mode
+    try:
+        os.chdir(folder) # The PDFs land in the working directory
+        hotel = {"hotel_name": "GRAND HOTEL & SUITES", "hotel_address": "123, Hospitality Lane, City Center",
+                 "hotel_gst": "27AAAAA0000A1Z5", "hotel_phone": "9876543210"}
+        cart = [{'id': n, 'name': f'Item {n}', 'price': 120.0, 'qty': 2, 'tax_rate': 5.0, 'printed': 0,
+                 'note': 'less spicy' if n % 3 == 0 else ''} for n in range(1, 9)]
+        guest = ("Asha Verma", "9812345678", "2025-01-10 12:00:00")
+        food = [(f"Item {n}", 2, 120.0, 240.0, 5.0 if n % 2 else 18.0) for n in range(1, 9)]
+        receipts_by_kind = {
+            "kot": lambda: printer.render_kot("TABLE 5", cart),
+            "bill": lambda: printer.render_bill("DELIVERY", 5, cart, 2016.0, 50, {"name": "Ravi", "address": "12 Ghat Road"}),
+            "room_bill": lambda: printer.render_room_bill("101", guest, food, 2500, "CARD", hotel),
+        }
+        modes = [("A85", 1), ("no A85", 0)] # (label, ASCII85 page streams)
+
+        print(f"\nRender time per receipt, median of {receipts} (ms):")
+        print(f"  {'':<11}" + "".join(f"{label:>13}" for label, _ in modes) + f"{'saved':>9}")
+        same = True
+        for kind, render in receipts_by_kind.items():
+            medians, marks = [], []
+            for label, printer.USE_A85 in modes:
+                path = render() # Warm-up
+                marks.append(_page_marks(path))
+                times = []
+                for _ in range(receipts):
+                    start = time.perf_counter()
+                    render()
+                    times.append((time.perf_counter() - start) * 1000)
+                medians.append(statistics.median(times))
+            same = same and all(m == marks[0] for m in marks) and bool(marks[0])
+            print(f"  {kind:<11}" + "".join(f"{m:13.2f}" for m in medians) + f"{1 - medians[-1] / medians[0]:9.0%}")
+
+        print("✅ Every receipt has the same text and lines in every mode." if same
+              else "❌ The receipts differ between the modes.")
+        return same
+    finally:
+        printer.USE_A85 = a85
+        printer.datetime = datetime
+        os.chdir(cwd)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _raw_printer(received):
+    """Stands in for a network thermal printer: keeps what each connection sent. Close it to stop."""
+    server = socket.create_server(("127.0.0.1", 0))
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                chunks = []
+                while chunk := conn.recv(65536):
+                    chunks.append(chunk)
+                received.append(b"".join(chunks))
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+def _wait_for(jobs):
+    while any(job.status not in (print_queue.DELIVERED, print_queue.FAILED) for job in jobs):
+        time.sleep(0.001)
+
+
+def bench_escpos(tickets=100):
+    """Ticket latency, PDF vs ESC/POS, inline and through the print queue; plus the PDF fallback."""
+    folder = tempfile.mkdtemp(prefix="pos_escpos_")
+    cwd = os.getcwd()
+    received = []
+    server = _raw_printer(received)
+    delivered = printer.deliver
+    try:
+        build_sample_db(folder, history_orders=0)
+        os.chdir(folder) # The PDFs land in the working directory
+        printer.deliver = lambda filename, kind="bill": None # Time the work, don't open PDF viewers
+        cart = [{'id': n, 'name': f'Item {n}', 'price': 120.0, 'qty': 2, 'tax_rate': 5.0, 'printed': 0,
+                 'note': 'less spicy' if n % 3 == 0 else ''} for n in range(1, 9)]
+        printer_url = f"tcp://127.0.0.1:{server.getsockname()[1]}"
+        sinks = [("PDF", ""), ("ESC/POS tcp", printer_url), ("ESC/POS file", "file:" + os.path.join(folder, "tickets.bin"))]
+
+        print(f"\n{tickets} KOT + bill pairs, ms per pair (median / p95):")
+        inline = {}
+        for name, sink in sinks:
+            database.save_settings({"kot_printer": sink, "bill_printer": sink, "upi_id": "grandhotel@okbank"})
+            times = []
+            for n in range(tickets):
+                start = time.perf_counter()
+                printer.generate_kot(f"TABLE {n}", cart)
+                printer.generate_bill("DINE_IN", n, cart, 2016.0)
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            inline[name] = statistics.median(times)
+            print(f"  inline  {name:<14}{statistics.median(times):8.2f}{times[int(len(times) * 0.95)]:8.2f}")
+
+        # Submit -> delivered through the queue, one ticket at a time
+        for name, sink in sinks[:2]:
+            database.save_settings({"kot_printer": sink, "bill_printer": sink})
+            _wait_for([print_queue.submit("kot", "warm-up", "TABLE 0", cart) for _ in range(print_queue.WORKERS)])
+            times = []
+            for n in range(tickets):
+                start = time.perf_counter()
+                _wait_for([print_queue.submit("kot", f"KOT {n}", f"TABLE {n}", cart)])
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            print(f"  queued  {name:<14}{statistics.median(times):8.2f}{times[int(len(times) * 0.95)]:8.2f}   (one KOT, submit -> delivered)")
+
+        time.sleep(0.2) # The last connection's bytes reach the stand-in printer
+        with open(os.path.join(folder, "tickets.bin"), "rb") as f:
+            written = f.read()
+        tcp_ok = (len(received) == 2 * tickets + tickets + print_queue.WORKERS
+                  and all(t.startswith(escpos.INIT) and t.endswith(escpos.CUT) for t in received))
+        qr_ok = all((b"1P0upi://pay?" in t) == (b"TOTAL" in t) for t in received) # Every bill has its QR code
+        file_ok = written.count(escpos.INIT) == 2 * tickets
+        print(f"  printer got {len(received)} tickets ({sum(map(len, received)) / max(1, len(received)):.0f} bytes each); "
+              f"file got {written.count(escpos.INIT)}")
+
+        # Printer unplugged: a few retries, then the PDF
+        dead = socket.create_server(("127.0.0.1", 0))
+        dead_url = f"tcp://127.0.0.1:{dead.getsockname()[1]}"
+        dead.close()
+        database.save_settings({"kot_printer": dead_url})
+        print_queue.RETRY_DELAY, delay = 0.01, print_queue.RETRY_DELAY
+        seen = []
+        listener = lambda j: seen.append((j, j.status))
+        print_queue.add_listener(listener)
+        job = print_queue.submit("kot", "KOT fallback", "TABLE 1", cart)
+        _wait_for([job])
+        print_queue.remove_listener(listener)
+        print_queue.RETRY_DELAY = delay
+        fallback_ok = job.status == print_queue.DELIVERED and bool(job.filename)
+        print(f"  printer offline: {' -> '.join(status for j, status in seen if j is job)} "
+              f"({os.path.basename(job.filename or '-')})")
+
+        ok = tcp_ok and qr_ok and file_ok and fallback_ok
+        print(f"✅ ESC/POS tickets {inline['PDF'] / inline['ESC/POS tcp']:.0f}x faster than the PDF; every ticket arrived whole."
+              if ok else f"❌ Check failed: tcp={tcp_ok} qr={qr_ok} file={file_ok} fallback={fallback_ok}")
+        return ok
+    finally:
+        print_queue.shutdown()
+        printer.deliver = delivered
+        server.close()
+        os.chdir(cwd)
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _send_kot(table_id, cart):
+    """What the POS 'Send KOT' button does: save, one ticket per station with the new qty, mark those lines."""
+    new_lines = [item for item in cart if item['qty'] > item.get('printed', 0)]
+    database.save_order(table_id, cart, "DINE_IN")
+    jobs = print_queue.submit_kots(f"KOT T{table_id}", f"TABLE {table_id}",
+                                   [dict(item, qty=item['qty'] - item.get('printed', 0)) for item in new_lines])
+    database.mark_kot_printed(table_id, lines=[(item['qty'], item['line_id']) for item in new_lines])
+    for item in cart:
+        item['printed'] = item['qty']
+    return jobs
+
+
+def _ticket_items(ticket):
+    """{item name: qty} printed on an ESC/POS KOT."""
+    return {name.decode(): int(qty) for qty, name in re.findall(rb"(\d+) +(Item \d+)\n", ticket)}
+
+
+def _move_station(job):
+    """Another terminal (process) sends a category's KOT lines to a different station."""
+    db_path, cat_id, station = job
+    database.DB_NAME = db_path
+    database.set_category_station(cat_id, station)
+
+
+def bench_stations(rounds=5):
+    """
+    Food / drinks / snacks on one KOT go to KITCHEN / BAR / TANDOOR printers. Times how soon the
+    working stations print while the bar printer is jammed (a sender per printer vs one shared
+    sender), then checks every station got exactly its lines and printed_qty follows each ticket.
+    """
+    folder = tempfile.mkdtemp(prefix="pos_stations_")
+    cwd = os.getcwd()
+    kitchen, tandoor, bar = [], [], []
+    printers = {"KITCHEN": (kitchen, _raw_printer(kitchen)), "TANDOOR": (tandoor, _raw_printer(tandoor)),
+                "BAR": (bar, _raw_printer(bar))}
+    url = lambda station: f"tcp://127.0.0.1:{printers[station][1].getsockname()[1]}"
+    jammed = socket.create_server(("127.0.0.1", 0), backlog=0) # Full backlog: connecting hangs until the timeout
+    jam = socket.create_connection(jammed.getsockname())
+    delivered, send_executor = printer.deliver, print_queue._send_executor
+    timeout, delay = escpos.SEND_TIMEOUT, print_queue.RETRY_DELAY
+    try:
+        build_sample_db(folder, history_orders=0)
+        os.chdir(folder) # Fallback PDFs land in the working directory
+        printer.deliver = lambda filename, kind="bill": None
+        escpos.SEND_TIMEOUT, print_queue.RETRY_DELAY = 0.25, 0.05
+        database.set_category_station(2, "bar")      # DRINKS: Item 1, 4, 7
+        database.set_category_station(3, "TANDOOR")  # SNACKS: Item 2, 5, 8; FOOD stays in the KITCHEN
+        station_of = {f"Item {n}": ("KITCHEN", "BAR", "TANDOOR")[n % 3] for n in range(1, 10)}
+        line = lambda n, qty: {'line_id': None, 'id': n, 'name': f"Item {n}", 'price': 100.0 + n, 'qty': qty,
+                               'tax_rate': 5.0, 'printed': 0, 'note': ''}
+
+        # 1. Bar printer jammed: when do the kitchen and tandoor tickets print?
+        jammed_url = f"tcp://127.0.0.1:{jammed.getsockname()[1]}"
+        database.save_settings({"kot_printer": url("KITCHEN"),
+                                "station_printers": f"BAR={jammed_url}; TANDOOR={url('TANDOOR')}"})
+        shared = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        print(f"\nBar printer jammed ({escpos.SEND_TIMEOUT}s connect timeout); ms until KITCHEN + TANDOOR printed:")
+        for label, executor in (("one shared sender", lambda sink: shared), ("sender per printer", send_executor)):
+            print_queue._send_executor = executor
+            times = []
+            for n in range(rounds):
+                table_id = n + 1
+                database.checkout_table(table_id)
+                start = time.perf_counter()
+                jobs = _send_kot(table_id, [line(1, 1), line(3, 2), line(2, 1)]) # Drink first in the queue
+                _wait_for([jobs["KITCHEN"], jobs["TANDOOR"]])
+                times.append((time.perf_counter() - start) * 1000)
+                _wait_for(jobs.values()) # Bar: retries, then its PDF
+            print(f"  {label:<20}{statistics.median(times):9.1f}")
+        print_queue._send_executor = send_executor
+        shared.shutdown()
+        bar_fell_back = any(name.startswith("KOT_TABLE") and "_BAR_" in name for name in os.listdir(folder))
+
+        # 2. Every printer working: each station gets its own lines, then only what was added
+        for received in (kitchen, tandoor, bar):
+            received.clear()
+        database.save_settings({"station_printers": f"BAR={url('BAR')}; TANDOOR={url('TANDOOR')}"})
+        table_id = rounds + 1
+        database.checkout_table(table_id)
+        cart = [line(n, n % 3 + 1) for n in range(1, 10)]
+        batches = [{item['name']: item['qty'] for item in cart}]
+        _wait_for(_send_kot(table_id, cart).values())
+        cart[2]['qty'] += 2                # Item 3 (KITCHEN): 2 more
+        cart.append(line(4, 1))            # Another drink line
+        cart[3]['qty'] -= 1                # Item 4 down by one: nothing to print
+        batches.append({"Item 3": 2, "Item 4": 1})
+        _wait_for(_send_kot(table_id, cart).values())
+        time.sleep(0.1) # The last connections' bytes reach the stand-ins
+
+        ok = bar_fell_back
+        for station, (received, _) in printers.items():
+            want = [{name: qty for name, qty in batch.items() if station_of[name] == station} for batch in batches]
+            got = [_ticket_items(ticket) for ticket in received]
+            title_ok = all(ticket.count(f"{station} TICKET".encode()) == 1 for ticket in received)
+            good = got == [w for w in want if w] and title_ok
+            ok = ok and good
+            print(f"  {station:<8} tickets: {got} {'✅' if good else '❌ expected ' + str([w for w in want if w])}")
+        saved = database.get_active_order(table_id)
+        printed_ok = all(item['printed'] == item['qty'] for item in saved) and len(saved) == len(cart)
+        print(f"  printed_qty = qty on all {len(saved)} lines: {printed_ok}; jammed bar fell back to PDF: {bar_fell_back}")
+        ok = ok and printed_ok
+
+        # 3. Another terminal moves SNACKS from the TANDOOR to the BAR: the next KOT here follows it
+        before = list(database.split_kot([line(2, 1)]))
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            pool.map(_move_station, [(database.DB_NAME, 3, "BAR")])
+        after = list(database.split_kot([line(2, 1)]))
+        moved = before == ["TANDOOR"] and after == ["BAR"]
+        print(f"  station moved on another terminal: Item 2 went to {before} -> {after} {'✅' if moved else '❌'}")
+        ok = ok and moved
+        print("✅ Every station got exactly its own lines." if ok else "❌ Station routing check failed.")
+        return ok
+    finally:
+        print_queue._send_executor = send_executor
+        print_queue.shutdown()
+        printer.deliver = delivered
+        escpos.SEND_TIMEOUT, print_queue.RETRY_DELAY = timeout, delay
+        jam.close()
+        jammed.close()
+        for _, server in printers.values():
+            server.close()
+        os.chdir(cwd)
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _seed_month(orders, stays):
+    """
+    April 2025: dine-in / takeout / delivery bills (some discounted), and stays whose room
+    service went on the invoice, linked by booking_id or (older stays) only by the close time.
+    Returns the number of tickets a regeneration of the month should write.
+    """
+    rng = random.Random(11)
+    types = ["DINE_IN"] * 6 + ["TAKEOUT", "DELIVERY", "ROOM_SERVICE"]
+
+    def seed(cursor):
+        def order(order_type, closed, place=None, booking_id=None, discount=0):
+            cursor.execute("""
+                INSERT INTO orders (table_id, room_number, order_type, status, customer_name, customer_address,
+                                    order_date, opened_at, closed_at, payment_mode, discount, booking_id)
+                VALUES (?, ?, ?, 'CLOSED', ?, ?, ?, ?, ?, 'CASH', ?, ?)
+            """, (place if order_type == "DINE_IN" else None, place if order_type == "ROOM_SERVICE" else None, order_type,
+                  "Ravi" if order_type == "DELIVERY" else None, "12 Ghat Road" if order_type == "DELIVERY" else None,
+                  closed[:10], closed, closed, discount, booking_id))
+            order_id = cursor.lastrowid
+            cursor.executemany("""
+                INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price, printed_qty, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, '')
+            """, [(order_id, f"Item {n}", qty, 100.0 + n, rate, (100.0 + n) * qty, qty)
+                  for n, qty, rate in [(rng.randint(1, 40), rng.randint(1, 3), rng.choice([5.0, 5.0, 18.0]))
+                                       for _ in range(rng.randint(2, 8))]])
+
+        for n in range(orders):
+            closed = f"2025-04-{n % 30 + 1:02d} {11 + n % 11:02d}:{n % 60:02d}:{n % 7:02d}"
+            order_type = types[n % len(types)]
+            order(order_type, closed, (n % 30) + 1 if order_type == "DINE_IN" else str(101 + n % 20),
+                  discount=rng.choice([0, 0, 0, 25.0]))
+        for n in range(stays):
+            room = str(101 + n % 20)
+            check_in = f"2025-04-{n % 27 + 1:02d} 14:00:00"
+            check_out = f"2025-04-{n % 27 + 2 + n % 3:02d} 11:{n % 60:02d}:30"
+            cursor.execute("""INSERT INTO bookings (room_number, guest_name, guest_phone, check_in_date, check_out_date,
+                                                    status, payment_mode, nightly_rate)
+                              VALUES (?, ?, '9812345678', ?, ?, 'CHECKED_OUT', 'CARD', 2500)""",
+                           (room, f"Guest {n}", check_in, check_out))
+            if n % 2: # Room service on the invoice, linked
+                order("ROOM_SERVICE", check_out, room, booking_id=cursor.lastrowid)
+            else:     # Checked out before booking_id: closed a moment before the stay
+                order("ROOM_SERVICE", check_out[:-2] + "28", room)
+
+    database.run_write(seed)
+    return orders + stays
+
+
+def _tree_digest(folder):
+    """{file: sha1} of everything bulk_invoices wrote."""
+    digests = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as f:
+            digests[name] = hashlib.sha1(f.read()).hexdigest()
+    return digests
+
+
+def _reprint_check(folder):
+    """
+    Real checkouts today (table with a discount, delivery, room with room service): the copies
+    bulk_invoices renders must show what the POS printed at the time.
+    """
+    line = lambda n, qty, rate=5.0: {'line_id': None, 'id': n, 'name': f"Item {n}", 'price': 100.0 + n, 'qty': qty,
+                                     'tax_rate': rate, 'printed': 0, 'note': ''}
+    if datetime.datetime.now().second > 55:
+        time.sleep(6) # Original and copy print the time to the minute
+    originals = []
+    cart = database.get_active_order(1) + [line(1, 2), line(2, 1, 18.0), line(3, 3)]
+    database.save_order(1, cart, "DINE_IN")
+    database.checkout_table(1, "UPI / QR", 30.0)
+    originals.append(printer.render_bill("DINE_IN", 1, cart, 0, 30.0, None))
+
+    cart = [line(4, 1), line(5, 2)]
+    customer = {'name': "Ravi", 'phone': "98", 'address': "12 Ghat Road"}
+    database.save_delivery_order(cart, customer['name'], customer['phone'], customer['address'], "CASH", 12.5)
+    originals.append(printer.render_bill("DELIVERY", "", cart, 0, 12.5, customer))
+
+    database.check_in_guest("101", "Asha Verma", "9812345678")
+    database.save_order("101", [line(6, 2), line(7, 1, 18.0)], "ROOM_SERVICE")
+    guest = database.get_active_booking_details("101")
+    hotel = printer.hotel_info()
+    originals.append(printer.render_room_bill("101", guest, database.get_room_order_items("101"), guest[3], "CARD", hotel))
+    database.check_out_guest("101", "CARD")
+
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    out = os.path.join(folder, "today")
+    bulk_invoices.regenerate(out, today, today, workers=1)
+    copies = sorted(name for name in os.listdir(out) if name.endswith(".pdf"))
+    same = len(copies) == len(originals) and all(
+        _page_marks(original) == _page_marks(os.path.join(out, copy)) for original, copy in zip(originals, copies))
+    print(f"  today's real checkouts: {len(copies)} copies, same page as printed at checkout: {same}")
+    return same
+
+
+def bench_invoices(orders=1500, stays=150):
+    """
+    Regenerates a month of bills / room invoices with 1..N render processes: tickets per second,
+    the same bytes from every run, the main process's memory for a week vs the month, and
+    copies of real checkouts that match what was printed.
+    """
+    folder = tempfile.mkdtemp(prefix="pos_invoices_")
+    cwd = os.getcwd()
+    try:
+        build_sample_db(folder, history_orders=0)
+        os.chdir(folder) # The 'originals' of the reprint check land here
+        ok = _reprint_check(folder)
+        expected = _seed_month(orders, stays)
+
+        cpus = os.cpu_count() or 1
+        counts = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1))) or [1]
+        print(f"\nApril 2025, {expected} tickets ({cpus} CPUs):")
+        print(f"  {'workers':>8}{'seconds':>10}{'tickets/s':>11}{'speed-up':>10}  same files")
+        first, base = None, None
+        for workers in counts + [counts[-1]]: # The last count twice: a repeat run writes the same bytes
+            out = os.path.join(folder, f"run_{workers}")
+            shutil.rmtree(out, ignore_errors=True)
+            start = time.perf_counter()
+            result = bulk_invoices.regenerate(out, "2025-04-01", "2025-04-30", workers)
+            elapsed = time.perf_counter() - start
+            digest = _tree_digest(out)
+            first = first or digest
+            base = base or elapsed
+            same = digest == first and result["tickets"] == expected and not result["failed"]
+            ok = ok and same
+            print(f"  {workers:>8}{elapsed:>10.2f}{result['tickets'] / elapsed:>11.0f}{base / elapsed:>9.1f}x  {same}")
+
+        with open(os.path.join(out, "index.csv"), newline="") as f:
+            rows = list(csv.reader(f))[1:]
+        linked = sum(1 for row in rows if row[1] == "ROOM") == stays and all(
+            float(row[7]) > 2500 for row in rows if row[1] == "ROOM") # Every stay's invoice carries its room service
+        print(f"  index.csv: {len(rows)} rows, every stay invoiced with its room service: {linked}")
+        ok = ok and linked and len(rows) == expected
+
+        print("\nMain process peak memory (tracemalloc):")
+        for label, end in (("1 week", "2025-04-07"), ("1 month", "2025-04-30")):
+            tracemalloc.start()
+            result = bulk_invoices.regenerate(os.path.join(folder, "mem"), "2025-04-01", end, counts[-1])
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            print(f"  {label:<8}{result['tickets']:>7} tickets{peak:>9.0f} KB")
+
+        print("✅ Copies are complete, identical run to run and match the printed ones." if ok
+              else "❌ Invoice regeneration check failed.")
+        return ok
+    finally:
+        os.chdir(cwd)
+        database.close_connection()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# ==========================================
+# 12. UPGRADE FROM THE ORIGINAL SCHEMA
+# ==========================================
+
+# The tables as the first version of the app created them (no rollups, no
+# running totals, no payment / rate columns)
+ORIGINAL_SCHEMA = """
+    CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT);
+    CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, tax_rate REAL Default 5.0);
+    CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, category TEXT, category_id INTEGER, price REAL,
+                        price_dinein REAL, price_delivery REAL, image_path TEXT, tax_rate REAL);
+    CREATE TABLE rooms (room_number TEXT PRIMARY KEY, room_type TEXT, price_per_night REAL, status TEXT DEFAULT 'AVAILABLE');
+    CREATE TABLE dining_tables (id INTEGER PRIMARY KEY AUTOINCREMENT, table_number TEXT UNIQUE, status TEXT DEFAULT "AVAILABLE");
+    CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, table_id INTEGER, room_number TEXT, order_type TEXT,
+                         customer_name TEXT, customer_phone TEXT, customer_address TEXT, status TEXT DEFAULT "OPEN",
+                         order_date TEXT DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE order_items (id INTEGER PRIMARY KEY AUTOINCREMENT, order_id INTEGER, item_name TEXT, quantity INTEGER,
+                              unit_price REAL, tax_rate REAL, total_price REAL, printed_qty INTEGER DEFAULT 0, notes TEXT);
+    CREATE TABLE bookings (id INTEGER PRIMARY KEY AUTOINCREMENT, room_number TEXT, guest_name TEXT, guest_phone TEXT,
+                           check_in_date TEXT, check_out_date TEXT, status TEXT DEFAULT 'ACTIVE');
+"""
+
+
+def _original_db(path):
+    """A DB as the original version left it: a dinner, a takeout and a two-night stay in April 2025."""
+    conn = sqlite3.connect(path)
+    conn.executescript(ORIGINAL_SCHEMA + """
+        INSERT INTO dining_tables (table_number) VALUES ('T1');
+        INSERT INTO rooms VALUES ('101', 'Double', 2500, 'AVAILABLE');
+        INSERT INTO orders (table_id, order_type, status, order_date) VALUES (1, 'DINE_IN', 'COMPLETED', '2025-04-02 20:10:00');
+        INSERT INTO orders (order_type, status, order_date) VALUES ('TAKEOUT', 'CLOSED', '2025-04-03 13:00:00');
+        INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price)
+            VALUES (1, 'Burger', 2, 150, 5, 300), (2, 'Coke', 1, 40, 12, 40);
+        INSERT INTO bookings (room_number, guest_name, check_in_date, check_out_date, status)
+            VALUES ('101', 'Asha', '2025-04-01 14:00:00', '2025-04-03 11:00:00', 'CHECKED_OUT');
+    """)
+    conn.commit()
+    conn.close()
+
+
+def check_upgrade():
+    """
+    Runs maintenance commands, each in a fresh process like a user would, on a DB written
+    by the original version: the first run upgrades the schema and must already work.
+    Then again with a per-year archive file of the same vintage next to the DB.
+    """
+    folder = tempfile.mkdtemp(prefix="pos_upgrade_")
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = [["occupancy", "--from", "2025-04-01", "--to", "2025-04-30"], ["gst", "--month", "2025-04"]]
+    ok = True
+    try:
+        for label, with_archive in (("original DB", False), ("original DB + archive file", True)):
+            db = os.path.join(folder, f"old_{int(with_archive)}.db")
+            _original_db(db)
+            if with_archive:
+                _original_db(os.path.join(folder, f"old_{int(with_archive)}_archive_2024.db"))
+            for command in commands:
+                run = subprocess.run([sys.executable, os.path.join(here, "maintenance.py"), "--db", db] + command,
+                                     capture_output=True, text=True, cwd=folder)
+                good = run.returncode == 0
+                ok = ok and good
+                print(f"  {label:<28}{command[0]:<11}{'✅' if good else '❌ ' + run.stderr.strip().splitlines()[-1]}")
+        print("✅ The original schema upgrades on the first run." if ok else "❌ Upgrade from the original schema failed.")
+        return ok
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="POS performance checks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_lat = sub.add_parser("latency", help="before/after latency of the hot DB calls")
+    p_lat.add_argument("--repeats", type=int, default=300)
+
+    p_stress = sub.add_parser("stress", help="concurrent writer processes against one DB")
+    p_stress.add_argument("--terminals", type=int, default=12)
+    p_stress.add_argument("--rounds", type=int, default=40)
+
+    sub.add_parser("plans", help="EXPLAIN QUERY PLAN check of the hot queries")
+    sub.add_parser("kot", help="rows written per KOT for growing carts")
+    p_rep = sub.add_parser("reports", help="range report timings over a year of history")
+    p_rep.add_argument("--orders", type=int, default=20000)
+    sub.add_parser("export", help="memory and POS-write impact of the streaming CSV export")
+    p_hist = sub.add_parser("history", help="sales history page time, shallow vs deep")
+    p_hist.add_argument("--orders", type=int, default=40000)
+    p_arch = sub.add_parser("archive", help="archive old history; check reports before / after")
+    p_arch.add_argument("--orders", type=int, default=40000)
+    p_gst = sub.add_parser("gst", help="GST slab summary: rollup vs order lines, timing and cross-check")
+    p_gst.add_argument("--orders", type=int, default=40000)
+    p_occ = sub.add_parser("occupancy", help="occupancy / ADR / RevPAR timing and cross-check")
+    p_occ.add_argument("--rooms", type=int, default=300)
+    p_occ.add_argument("--years", type=int, default=3)
+    p_print = sub.add_parser("print", help="GUI time per ticket, inline vs the background print queue")
+    p_print.add_argument("--tickets", type=int, default=60)
+    p_render = sub.add_parser("render", help="render time per receipt, ASCII85 page streams on vs off")
+    p_render.add_argument("--receipts", type=int, default=200)
+    p_esc = sub.add_parser("escpos", help="ticket latency, PDF vs ESC/POS thermal printer, and the PDF fallback")
+    p_esc.add_argument("--tickets", type=int, default=100)
+    p_st = sub.add_parser("stations", help="per-station KOTs: parallel printing, routing and printed qty check")
+    p_st.add_argument("--rounds", type=int, default=5)
+    p_inv = sub.add_parser("invoices", help="bulk invoice copies: throughput per worker count, memory, same bytes")
+    p_inv.add_argument("--orders", type=int, default=1500)
+    p_inv.add_argument("--stays", type=int, default=150)
+    sub.add_parser("upgrade", help="maintenance commands on a DB / archive written by the original version")
+
+    args = parser.parse_args()
+    if args.command == "latency":
+        bench_latency(args.repeats)
+    elif args.command == "stress":
+        raise SystemExit(0 if stress_writers(args.terminals, args.rounds) else 1)
+    elif args.command == "plans":
+        raise SystemExit(0 if check_plans() else 1)
+    elif args.command == "kot":
+        kot_write_volume()
+    elif args.command == "reports":
+        bench_reports(args.orders)
+    elif args.command == "export":
+        bench_export()
+    elif args.command == "history":
+        bench_history(args.orders)
+    elif args.command == "archive":
+        raise SystemExit(0 if bench_archive(args.orders) else 1)
+    elif args.command == "gst":
+        raise SystemExit(0 if bench_gst(args.orders) else 1)
+    elif args.command == "occupancy":
+        raise SystemExit(0 if bench_occupancy(args.rooms, args.years) else 1)
+    elif args.command == "print":
+        raise SystemExit(0 if bench_print(args.tickets) else 1)
+    elif args.command == "render":
+        raise SystemExit(0 if bench_render(args.receipts) else 1)
+    elif args.command == "escpos":
+        raise SystemExit(0 if bench_escpos(args.tickets) else 1)
+    elif args.command == "stations":
+        raise SystemExit(0 if bench_stations(args.rounds) else 1)
+    elif args.command == "invoices":
+        raise SystemExit(0 if bench_invoices(args.orders, args.stays) else 1)
+    elif args.command == "upgrade":
+        raise SystemExit(0 if check_upgrade() else 1)
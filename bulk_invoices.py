@@ -0,0 +1,208 @@
+import collections
+import concurrent.futures
+import csv
+import datetime
+import itertools
+import multiprocessing
+import os
+
+from reportlab import rl_config
+
+import database
+import printer
+
+# ==========================================
+# BULK INVOICE COPIES (auditors: every bill / room invoice of a month)
+# ==========================================
+# Re-renders the food bills and room invoices closed in a date range from the
+# stored orders and stays, into one folder with an index.csv. The file names
+# come from the record, not the clock:
+#
+#   2025-04-03_Bill_000123.pdf       order 123, closed on 3 April
+#   2025-04-03_Invoice_000045.pdf    stay 45, checked out on 3 April
+#
+# and the PDFs are written in reportlab's invariant mode (fixed creation date
+# and document ID), so running it again gives the same files, byte for byte.
+#
+# The main process streams the records off ONE read snapshot (open_reader, the
+# archived years through the history_* views) and hands them to a process pool
+# CHUNK_SIZE tickets at a time; at most IN_FLIGHT chunks per worker are waiting,
+# so memory stays flat however long the range is. Results are taken back in the
+# order they went out, which keeps index.csv in date order.
+#
+# A bill is one closed order (a table / room / takeout / delivery has one open
+# order at a time), at its close time, with the discount stored at checkout
+# (orders before that column print without one). A room invoice is the stay
+# plus the room service it closed: the orders linked by booking_id, or, for
+# stays closed before that link, the room's orders closed in the seconds
+# before the check-out. Hotel details are today's settings.
+
+CHUNK_SIZE = 25  # Tickets per pool task: a chunk is ~100 ms of work, so the hand-over cost is noise
+IN_FLIGHT = 4    # Chunks queued per worker; enough to keep them busy while the main process reads
+CHECKOUT_WINDOW = "-5 seconds" # Room service closed this close before a (pre booking_id) check-out was on its invoice
+
+INDEX_COLUMNS = ["File", "Kind", "Ref", "Date", "Table / Room", "Customer", "Payment",
+                 "Subtotal", "Tax", "Discount", "Total"]
+
+BILLS_SQL = f"""
+    SELECT o.id, o.closed_at, o.order_type, o.table_id, o.room_number, t.table_number,
+           o.customer_name, o.customer_address, COALESCE(o.payment_mode, 'N/A'), COALESCE(o.discount, 0)
+    FROM history_orders o
+    LEFT JOIN dining_tables t ON t.id = o.table_id
+    WHERE o.status != 'OPEN' AND o.closed_at >= ? AND o.closed_at < ?
+      AND o.booking_id IS NULL -- Not on a room invoice...
+      AND NOT (o.order_type = 'ROOM_SERVICE' AND EXISTS ( -- ...nor on one from before booking_id
+          SELECT 1 FROM history_bookings b
+          WHERE b.status = 'CHECKED_OUT' AND b.room_number = o.room_number
+            AND b.check_out_date >= o.closed_at AND datetime(b.check_out_date, '{CHECKOUT_WINDOW}') <= o.closed_at))
+    ORDER BY o.closed_at, o.id
+"""
+
+STAYS_SQL = """
+    SELECT b.id, b.check_out_date, b.room_number, b.guest_name, b.guest_phone, b.check_in_date,
+           COALESCE(b.payment_mode, 'N/A'), COALESCE(b.nightly_rate, r.price_per_night, 0)
+    FROM history_bookings b
+    LEFT JOIN rooms r ON r.room_number = b.room_number
+    WHERE b.status = 'CHECKED_OUT' AND b.check_out_date >= ? AND b.check_out_date < ?
+    ORDER BY b.check_out_date, b.id
+"""
+
+STAY_ORDERS_SQL = f"""
+    SELECT id FROM history_orders
+    WHERE room_number = ? AND closed_at >= datetime(?, '{CHECKOUT_WINDOW}') AND closed_at <= ?
+      AND (booking_id = ? OR (booking_id IS NULL AND order_type = 'ROOM_SERVICE'))
+"""
+
+
+def _when(stamp):
+    return datetime.datetime.strptime(stamp[:19], "%Y-%m-%d %H:%M:%S")
+
+
+def _in(ids):
+    return f"({', '.join('?' * len(ids))})"
+
+
+def _bills(cursor, start, day_after):
+    """(job, index row) per closed order, CHUNK_SIZE orders' lines read at a time."""
+    orders = cursor.connection.execute(BILLS_SQL, (start, day_after))
+    while True:
+        batch = orders.fetchmany(CHUNK_SIZE)
+        if not batch:
+            return
+        lines = collections.defaultdict(list)
+        cursor.execute(f"""SELECT order_id, item_name, quantity, unit_price, COALESCE(tax_rate, 0)
+                           FROM history_lines WHERE order_id IN {_in(batch)} ORDER BY order_id, id""",
+                       [row[0] for row in batch])
+        for order_id, name, qty, price, tax_rate in cursor.fetchall():
+            lines[order_id].append({'name': name, 'qty': qty, 'price': price, 'tax_rate': tax_rate})
+
+        for order_id, closed_at, order_type, table_id, room, table_number, name, address, payment, discount in batch:
+            cart = lines.get(order_id)
+            if not cart:
+                continue # Closed without anything on it: no bill was printed
+            subtotal = sum(item['price'] * item['qty'] for item in cart)
+            tax = sum(item['price'] * item['qty'] * item['tax_rate'] / 100 for item in cart)
+            total = subtotal + tax - discount
+            customer = {'name': name, 'address': address} if name else None
+            # The bill shows what the POS screen passed: the table's id, the room number, or nothing
+            table = table_id if order_type == "DINE_IN" else room if order_type == "ROOM_SERVICE" else ""
+            place = f"Table {table_number or table_id}" if table_id else f"Room {room}" if room else ""
+            filename = f"{closed_at[:10]}_Bill_{order_id:06d}.pdf"
+            job = ("bill", filename, (order_type, table, cart, total, discount, customer), {"printed_at": _when(closed_at)})
+            yield job, [filename, order_type, order_id, closed_at, place, name or "", payment,
+                        round(subtotal, 2), round(tax, 2), round(discount, 2), round(total, 2)]
+
+
+def _invoices(cursor, start, day_after, hotel):
+    """(job, index row) per stay checked out in the range, with its room service."""
+    stays = cursor.connection.execute(STAYS_SQL, (start, day_after))
+    for stay_id, check_out, room, guest, phone, check_in, payment, rate in stays:
+        cursor.execute(STAY_ORDERS_SQL, (room, check_out, check_out, stay_id))
+        order_ids = [row[0] for row in cursor.fetchall()]
+        food = []
+        if order_ids: # Grouped the way get_room_order_items does at check-out
+            cursor.execute(f"""SELECT item_name, SUM(quantity), unit_price, SUM(total_price), COALESCE(tax_rate, 0)
+                               FROM history_lines WHERE order_id IN {_in(order_ids)}
+                               GROUP BY item_name, tax_rate""", order_ids)
+            food = cursor.fetchall()
+
+        check_out_dt = _when(check_out)
+        days = printer.stay_days(check_in or "N/A", check_out_dt)
+        _, subtotal, tax = printer.room_bill_totals(rate, days, food)
+        filename = f"{check_out[:10]}_Invoice_{stay_id:06d}.pdf"
+        job = ("room_bill", filename, (room, (guest, phone, check_in), food, rate, payment, hotel), {"check_out": check_out_dt})
+        yield job, [filename, "ROOM", printer.invoice_number(room, check_out_dt), check_out, f"Room {room}", guest or "",
+                    payment, round(subtotal, 2), round(tax, 2), 0, round(subtotal + tax, 2)]
+
+
+RENDERERS = {"bill": printer.render_bill, "room_bill": printer.render_room_bill}
+
+
+def _start_worker():
+    rl_config.invariant = 1 # Fixed creation date / document ID: same data, same bytes
+
+
+def _render_chunk(folder, jobs):
+    """Runs in a worker process. Renders a chunk; returns an error message (or None) per ticket."""
+    errors = []
+    for kind, filename, args, kwargs in jobs:
+        try:
+            RENDERERS[kind](*args, filename=os.path.join(folder, filename), **kwargs)
+            errors.append(None)
+        except Exception as e:
+            errors.append(f"{filename}: {e}")
+    return errors
+
+
+def regenerate(folder, start, end, workers=None, progress=None):
+    """
+    Renders every bill and room invoice closed from start to end ('YYYY-MM-DD',
+    inclusive) into `folder`, with index.csv listing them (file, kind, ref, date,
+    table / room, customer, payment, subtotal, tax, discount, total).
+    workers = render processes (default: one per CPU). progress(done) is called
+    after every chunk. Returns {'tickets': written, 'failed': [messages]}.
+    """
+    os.makedirs(folder, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    result = {"tickets": 0, "failed": []}
+
+    conn = database.open_reader()
+    try:
+        database.attach_archives(conn)
+        conn.execute("BEGIN") # One snapshot for the bills, the stays and the index
+        cursor = conn.cursor()
+        day_after = database.next_day(end)
+        tickets = itertools.chain(_bills(cursor, start, day_after),
+                                  _invoices(cursor, start, day_after, printer.hotel_info()))
+
+        with open(os.path.join(folder, "index.csv"), "w", newline="", encoding="utf-8") as f, \
+             concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_start_worker,
+                                                    mp_context=multiprocessing.get_context("spawn")) as pool:
+            index = csv.writer(f)
+            index.writerow(INDEX_COLUMNS)
+            waiting = collections.deque()
+
+            def collect():
+                future, rows = waiting.popleft()
+                for row, error in zip(rows, future.result()):
+                    if error:
+                        result["failed"].append(error)
+                    else:
+                        index.writerow(row)
+                        result["tickets"] += 1
+                if progress:
+                    progress(result["tickets"] + len(result["failed"]))
+
+            while True:
+                chunk = list(itertools.islice(tickets, CHUNK_SIZE))
+                if not chunk:
+                    break
+                jobs, rows = zip(*chunk)
+                waiting.append((pool.submit(_render_chunk, folder, jobs), rows))
+                if len(waiting) >= workers * IN_FLIGHT:
+                    collect()
+            while waiting:
+                collect()
+    finally:
+        conn.close()
+    return result
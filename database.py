@@ -1,95 +1,343 @@
 import sqlite3
 import datetime
+import threading
+import random
+import time
+import os
+import re
 today = datetime.date.today().strftime("%Y-%m-%d")
 
 DB_NAME = 'hotel_restaurant.db'
 
+# ==========================================
+# CONNECTION MANAGER
+# ==========================================
+# Every thread keeps ONE open connection instead of connecting per call.
+# Pragmas are applied once when it opens, and sqlite3 keeps the compiled
+# statements in its cache, so repeated queries skip the re-parse.
+#
+# Multi-terminal mode: several POS terminals (front desk, bar, restaurant)
+# may share hotel_restaurant.db as long as it sits on a LOCAL disk of the
+# machine they run on (WAL does not work over network shares). Readers never
+# block writers, and every write goes through run_write() below.
+
+BUSY_TIMEOUT = 5.0     # Seconds SQLite itself waits on a locked DB
+WRITE_RETRIES = 5      # Extra attempts once the busy timeout has given up
+RETRY_BACKOFF = 0.05   # First back-off delay (seconds), doubled every attempt
+
+_local = threading.local()
+
+def get_connection():
+    """Returns this thread's connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_name == DB_NAME:
+        return conn
+    if conn is not None:
+        conn.close() # DB_NAME was switched (backups / benchmarks)
+
+    # isolation_level=None: reads run in autocommit (no stale snapshots held
+    # open between clicks) and run_write() issues its own BEGIN IMMEDIATE.
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT, isolation_level=None, cached_statements=256)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL, far fewer fsyncs
+    conn.execute("PRAGMA cache_size = -16000")   # ~16 MB page cache
+    conn.execute("PRAGMA mmap_size = 268435456") # 256 MB memory-mapped reads
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    _local.conn = conn
+    _local.db_name = DB_NAME
+    return conn
+
+def _is_busy(error):
+    msg = str(error).lower()
+    return "locked" in msg or "busy" in msg
+
+def run_write(work):
+    """
+    Runs work(cursor) as ONE short BEGIN IMMEDIATE transaction and commits it.
+    Taking the write lock up front means two terminals can't both read and then
+    collide when upgrading to a write. If another terminal keeps the DB busy past
+    BUSY_TIMEOUT, the whole transaction is rolled back and retried with
+    exponential back-off, so work() must only touch the database.
+    Returns whatever work() returns.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        # Already inside a caller's transaction: just join it
+        return work(conn.cursor())
+
+    for attempt in range(WRITE_RETRIES + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            result = work(cursor)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e) or attempt == WRITE_RETRIES:
+                raise
+            delay = RETRY_BACKOFF * (2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5)) # Jitter so terminals don't retry in lock-step
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+def close_connection():
+    """Closes this thread's connection (worker threads call this when done)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def open_reader(same_thread=True):
+    """
+    A separate read-only connection for long reads (exports, big report lists).
+    A half-read cursor pins its snapshot, so keep those off the shared connection
+    and close this one as soon as the rows are consumed.
+    same_thread=False lets a worker open it and hand it over to the GUI thread.
+    """
+    return sqlite3.connect(f"file:{DB_NAME}?mode=ro", uri=True, timeout=BUSY_TIMEOUT, isolation_level=None,
+                           check_same_thread=same_thread)
+
+def backup_database(dest):
+    """Copies the live DB using SQLite's backup API (a plain file copy would miss the WAL)."""
+    target = sqlite3.connect(dest)
+    try:
+        get_connection().backup(target)
+    finally:
+        target.close()
+
+def next_day(date_str):
+    """'2024-05-31' -> '2024-06-01' (used for index-friendly day ranges)."""
+    day = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+    return (day + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+# One cart line -> order_items row. category_id is taken from the menu item at save time.
+LINE_INSERT = """
+    INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price, printed_qty, notes,
+                             item_id, category_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT category_id FROM items WHERE id = ?))
+"""
+
+def _line_row(order_id, item, printed=0):
+    """Parameters for LINE_INSERT from a cart dict."""
+    item_id = item.get('id') or None # 0 = not on the menu any more
+    return (order_id, item['name'], item['qty'], item['price'], item.get('tax_rate', 5.0),
+            item['price'] * item['qty'], printed, item.get('note', ''), item_id, item_id)
+
+def _now():
+    """Local time as ISO-8601 text ('2024-05-31 19:42:07'), the format every *_at / *_date column uses."""
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+def _columns(cursor, table):
+    """Column names of a table ([] if it doesn't exist). 'arch2024.orders' reads an attached DB."""
+    db, _, name = table.rpartition(".")
+    cursor.execute(f"PRAGMA {db + '.' if db else ''}table_info({name})")
+    return [row[1] for row in cursor.fetchall()]
+
+def _add_column(cursor, table, column, definition):
+    """Adds a column to an existing DB if it's missing. Returns True when it was added (so it needs a backfill)."""
+    if column in _columns(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
 # ==========================================
 # HOTEL MANAGEMENT DATABASE FUNCTIONS
 # ==========================================
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-
-    # 1. SETTINGS & USERS
-    cursor.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
-    cursor.execute('CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT)')
+    def work(cursor):
+        # 1. SETTINGS & USERS
+        cursor.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
+        cursor.execute('CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT)')
     
-    cursor.execute("SELECT COUNT(*) FROM users")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("INSERT INTO users (username, password, role) VALUES ('admin', '1234', 'ADMIN')")
-
-    # 2. CATEGORIES (Added this here so get_all_categories() works)
-    cursor.execute('CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, tax_rate REAL Default 5.0)')
-    cursor.execute("SELECT COUNT(*) FROM categories")
-    if cursor.fetchone()[0] == 0:
-        cursor.executemany("INSERT INTO categories (name, tax_rate) VALUES (?, ?)", 
-                           [('FOOD', 0.0), ('DRINKS', 12.0), ('SNACKS', 5.0)])
-
-    # 3. ITEMS
-    cursor.execute('''CREATE TABLE IF NOT EXISTS items (
-        id INTEGER PRIMARY KEY, 
-        name TEXT, 
-        category TEXT, 
-        category_id INTEGER, 
-        price REAL, 
-        price_dinein REAL, 
-        price_delivery REAL, 
-        image_path TEXT,
-        tax_rate REAL,
-        FOREIGN KEY(category_id) REFERENCES categories(id))''')
-
-    # 4. ROOMS
-    cursor.execute('''CREATE TABLE IF NOT EXISTS rooms (
-        room_number TEXT PRIMARY KEY,
-        room_type TEXT, 
-        price_per_night REAL,
-        status TEXT DEFAULT 'AVAILABLE')''')
-
-    # 5. TABLES
-    cursor.execute('''CREATE TABLE IF NOT EXISTS dining_tables (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        table_number TEXT UNIQUE, 
-        status TEXT DEFAULT "AVAILABLE")''')
-
-    # 6. ORDERS
-    cursor.execute('''CREATE TABLE IF NOT EXISTS orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        table_id INTEGER, 
-        room_number TEXT,
-        order_type TEXT, 
-        customer_name TEXT,     
-        customer_phone TEXT,    
-        customer_address TEXT,  
-        status TEXT DEFAULT "OPEN", 
-        order_date TEXT DEFAULT CURRENT_TIMESTAMP)''')
+        cursor.execute("SELECT COUNT(*) FROM users")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("INSERT INTO users (username, password, role) VALUES ('admin', '1234', 'ADMIN')")
+
+        # 2. CATEGORIES (Added this here so get_all_categories() works)
+        cursor.execute('CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, tax_rate REAL Default 5.0, station TEXT)')
+        _add_column(cursor, "categories", "station", "TEXT") # KOT station (NULL = DEFAULT_STATION)
+        cursor.execute("SELECT COUNT(*) FROM categories")
+        if cursor.fetchone()[0] == 0:
+            cursor.executemany("INSERT INTO categories (name, tax_rate) VALUES (?, ?)", 
+                               [('FOOD', 0.0), ('DRINKS', 12.0), ('SNACKS', 5.0)])
+
+        # 3. ITEMS
+        cursor.execute('''CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY, 
+            name TEXT, 
+            category TEXT, 
+            category_id INTEGER, 
+            price REAL, 
+            price_dinein REAL, 
+            price_delivery REAL, 
+            image_path TEXT,
+            tax_rate REAL,
+            FOREIGN KEY(category_id) REFERENCES categories(id))''')
+
+        # Every edit of the menu, from any terminal (or an outside DB tool), bumps
+        # settings.menu_version in the same transaction; _load_menu() compares it
+        for table in ("items", "categories"):
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_menu AFTER {event} ON {table}
+                    BEGIN {MENU_VERSION_BUMP}; END""")
+
+        # 4. ROOMS
+        cursor.execute('''CREATE TABLE IF NOT EXISTS rooms (
+            room_number TEXT PRIMARY KEY,
+            room_type TEXT, 
+            price_per_night REAL,
+            status TEXT DEFAULT 'AVAILABLE')''')
+
+        # 5. TABLES
+        cursor.execute('''CREATE TABLE IF NOT EXISTS dining_tables (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, 
+            table_number TEXT UNIQUE, 
+            status TEXT DEFAULT "AVAILABLE")''')
+
+        # 6. ORDERS
+        cursor.execute('''CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, 
+            table_id INTEGER, 
+            room_number TEXT,
+            order_type TEXT, 
+            customer_name TEXT,     
+            customer_phone TEXT,    
+            customer_address TEXT,  
+            status TEXT DEFAULT "OPEN", 
+            order_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            subtotal REAL DEFAULT 0,
+            tax REAL DEFAULT 0,
+            total REAL DEFAULT 0,
+            opened_at TEXT,         -- ISO-8601 local time, see _now()
+            kot_at TEXT,            -- first KOT sent to the kitchen
+            closed_at TEXT,
+            payment_mode TEXT,
+            discount REAL DEFAULT 0, -- Taken off the bill at checkout (amount, not %)
+            booking_id INTEGER)''')  # The stay whose room invoice billed it (room service open at check-out)
     
-    # 7. ORDER ITEMS 
-    cursor.execute('''CREATE TABLE IF NOT EXISTS order_items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        order_id INTEGER, 
-        item_name TEXT, 
-        quantity INTEGER, 
-        unit_price REAL, 
-        tax_rate REAL, 
-        total_price REAL,
-        printed_qty INTEGER DEFAULT 0, 
-        notes TEXT,                     
-        FOREIGN KEY(order_id) REFERENCES orders(id))''')
-
-    conn.commit()
-    conn.close()
+        # 7. ORDER ITEMS 
+        cursor.execute('''CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, 
+            order_id INTEGER, 
+            item_name TEXT, 
+            quantity INTEGER, 
+            unit_price REAL, 
+            tax_rate REAL, 
+            total_price REAL,
+            printed_qty INTEGER DEFAULT 0, 
+            notes TEXT,                     
+            item_id INTEGER,
+            category_id INTEGER,
+            FOREIGN KEY(order_id) REFERENCES orders(id),
+            FOREIGN KEY(item_id) REFERENCES items(id))''')
+
+        # Lines remember which menu item they came from (older DBs: matched by name, best effort)
+        if _add_column(cursor, "order_items", "item_id", "INTEGER REFERENCES items(id)"):
+            print("🔧 Linking old order lines to menu items by name...")
+            cursor.execute("UPDATE order_items SET item_id = (SELECT MAX(i.id) FROM items i WHERE i.name = order_items.item_name)")
+        if _add_column(cursor, "order_items", "category_id", "INTEGER"):
+            cursor.execute("UPDATE order_items SET category_id = (SELECT i.category_id FROM items i WHERE i.id = order_items.item_id)")
+
+        # 8. RUNNING TOTALS on orders, kept in sync by triggers on order_items
+        # (older DBs get the columns added + filled from their line items once)
+        added = [_add_column(cursor, "orders", col, "REAL DEFAULT 0") for col in ("subtotal", "tax", "total")]
+        recompute = """
+            UPDATE orders SET
+                subtotal = (SELECT COALESCE(SUM(total_price), 0) FROM order_items WHERE order_id = orders.id),
+                tax = (SELECT COALESCE(SUM(total_price * tax_rate / 100.0), 0) FROM order_items WHERE order_id = orders.id)
+            WHERE id IN ({ids});
+            UPDATE orders SET total = subtotal + tax WHERE id IN ({ids});
+        """
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_order_items_insert AFTER INSERT ON order_items
+            BEGIN {recompute.format(ids="NEW.order_id")} END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_order_items_update
+            AFTER UPDATE OF order_id, quantity, unit_price, tax_rate, total_price ON order_items
+            BEGIN {recompute.format(ids="OLD.order_id, NEW.order_id")} END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_order_items_delete AFTER DELETE ON order_items
+            BEGIN {recompute.format(ids="OLD.order_id")} END""")
+        if any(added):
+            print("🔧 Backfilling order totals...")
+            for statement in recompute.format(ids="SELECT id FROM orders").split(";")[:2]:
+                cursor.execute(statement)
+
+        # Timestamps with the time of day (order_date stays as the business day).
+        # Older orders only know their day, so they get midnight of it.
+        if _add_column(cursor, "orders", "opened_at", "TEXT"):
+            print("🔧 Adding order timestamps...")
+            cursor.execute("""UPDATE orders SET opened_at = CASE WHEN length(order_date) = 10
+                              THEN order_date || ' 00:00:00' ELSE order_date END""")
+        if _add_column(cursor, "orders", "closed_at", "TEXT"):
+            cursor.execute("UPDATE orders SET closed_at = opened_at WHERE status != 'OPEN'")
+        _add_column(cursor, "orders", "kot_at", "TEXT")
+        _add_column(cursor, "orders", "payment_mode", "TEXT") # Unknown (NULL) for older orders
+        _add_column(cursor, "orders", "discount", "REAL DEFAULT 0")
+        _add_column(cursor, "orders", "booking_id", "INTEGER")
+
+        # 9. INDEXES for the hot lookups (partial = only the few OPEN orders are indexed)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_table_open ON orders(table_id) WHERE status = 'OPEN'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_room_open ON orders(room_number) WHERE status = 'OPEN'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(order_date)")
+        # Covering: the bill totals (SUM(total_price) per order) never touch the table rows
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id, total_price)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_name ON items(name)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_opened ON orders(opened_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_closed ON orders(closed_at)")
+
+        # 10. DAILY SALES ROLLUP (one row per day / stream / order type / tax slab / payment mode)
+        # It only holds derived numbers, so an older layout is simply dropped and rebuilt.
+        existing = _columns(cursor, "daily_sales")
+        if existing and "payment_mode" not in existing:
+            cursor.execute("DROP TABLE daily_sales")
+        cursor.execute('''CREATE TABLE IF NOT EXISTS daily_sales (
+            sale_date TEXT,
+            stream TEXT,            -- 'food', 'rooms' or 'halls'
+            order_type TEXT,        -- DINE_IN / TAKEOUT / DELIVERY / ROOM_SERVICE / ROOM_BOOKING / HALL_BOOKING
+            tax_rate REAL,
+            payment_mode TEXT,      -- CASH / UPI / QR / CARD, 'N/A' when not recorded
+            subtotal REAL DEFAULT 0,
+            tax REAL DEFAULT 0,
+            orders_count INTEGER DEFAULT 0,
+            PRIMARY KEY (sale_date, stream, order_type, tax_rate, payment_mode)) WITHOUT ROWID''')
+
+        # 11. ITEM x HOUR ROLLUP (what sells when; read by database_analytics)
+        hourly_is_new = not _table_exists(cursor, "item_sales_hourly")
+        cursor.execute('''CREATE TABLE IF NOT EXISTS item_sales_hourly (
+            sale_date TEXT,
+            hour INTEGER,           -- 0-23, from the time the order was opened
+            item_id INTEGER,        -- 0 = not linked to a menu item
+            item_name TEXT,
+            category_id INTEGER,
+            qty INTEGER DEFAULT 0,
+            revenue REAL DEFAULT 0,
+            PRIMARY KEY (sale_date, hour, item_id, item_name)) WITHOUT ROWID''')
+
+        if "payment_mode" not in existing or hourly_is_new:
+            if _table_exists(cursor, "bookings"):
+                _add_column(cursor, "bookings", "payment_mode", "TEXT") # The rebuild reads them (init_room_db runs later)
+                _add_column(cursor, "bookings", "nightly_rate", "REAL")
+            return True
+        return False
+
+    if run_write(work):
+        rebuild_daily_sales() # Existing DB: fill it from the history once (it attaches the archives, so not in work)
 
 def seed_data():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
         cursor.execute("SELECT count(*) FROM items")
         if cursor.fetchone()[0] > 0:
-            conn.close()
             return
     except:
         pass 
@@ -103,134 +351,103 @@ def seed_data():
     ]
     
     try:
-        cursor.executemany("INSERT INTO items (name, category, price, price_dinein, price_delivery, image_path, tax_rate) VALUES (?, ?, ?, ?, ?, ?, ?)", items)
-        conn.commit()
+        run_write(lambda cur: cur.executemany("INSERT INTO items (name, category, price, price_dinein, price_delivery, image_path, tax_rate) VALUES (?, ?, ?, ?, ?, ?, ?)", items))
+        _menu_changed()
         print("✅ Data Seeded Successfully.")
     except Exception as e:
         print(f"⚠️ Seeding Skipped/Error: {e}")
-        
-    conn.close()
 
 def verify_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT role FROM users WHERE username = ? AND password = ?", (username, password))
     res = cursor.fetchone()
-    conn.close()
     return res[0] if res else None
 
-def get_menu_items(price_mode="DINE_IN"):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Selecting image_path explicitly
-    query = """
-        SELECT i.id, i.name, i.price_dinein, i.price_delivery, 
-               c.name as category_name, i.image_path, i.tax_rate
-        FROM items i
-        LEFT JOIN categories c ON i.category_id = c.id
-    """
-    
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    
-    menu_list = []
-    for row in data:
-        final_price = row[3] if price_mode == "DELIVERY" else row[2]
-
-        menu_list.append({
-            "id": row[0],
-            "name": row[1],
-            "price": final_price,
-            "category": row[4],
-            "image": row[5] if row[5] else "", 
-            "tax_rate": row[6] if row[6] is not None else 0.0 
-        })
-        
-    return menu_list
-
 def save_order(target_id, cart_items, order_type="DINE_IN"):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
+    """
+    Saves the cart of an open table/room order.
+    Cart lines carry 'line_id' (their order_items.id) once saved, so only new,
+    changed and removed lines are written. New lines get their line_id filled in.
+    """
     import datetime
-    today = datetime.date.today().strftime("%Y-%m-%d")
+    now = _now()
+    today = now[:10]
     is_room = (order_type == "ROOM_SERVICE")
-    
-    # 1. Get or Create Order ID
-    if is_room:
-        cursor.execute("SELECT id FROM orders WHERE room_number = ? AND status = 'OPEN'", (target_id,))
-    else:
-        cursor.execute("SELECT id FROM orders WHERE table_id = ? AND status = 'OPEN'", (target_id,))
-        
-    row = cursor.fetchone()
-    
-    if row:
-        order_id = row[0]
-        # We clear old items to re-save the full current cart state
-        cursor.execute("DELETE FROM order_items WHERE order_id = ?", (order_id,))
-    else:
-        # Create New Order
+
+    def work(cursor):
+        # 1. Get or Create Order ID
         if is_room:
-            cursor.execute("INSERT INTO orders (room_number, status, order_type, order_date) VALUES (?, 'OPEN', ?, ?)", (target_id, order_type, today))
+            cursor.execute("SELECT id FROM orders WHERE room_number = ? AND status = 'OPEN'", (target_id,))
         else:
-            cursor.execute("INSERT INTO orders (table_id, status, order_type, order_date) VALUES (?, 'OPEN', ?, ?)", (target_id, order_type, today))
-        order_id = cursor.lastrowid
-
-    # 2. Insert Items (With Notes & Correct Tax)
-    for item in cart_items:
-        printed = item.get('printed', 0) 
-        total = item['price'] * item['qty']
-        note = item.get('note', '') 
-        
-        # --- THE FIX IS HERE ---
-        # Use .get('tax_rate', 5.0) instead of item['tax']
-        tax_rate = item.get('tax_rate', 5.0)
-        
-        cursor.execute("""
-            INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price, printed_qty, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (order_id, item['name'], item['qty'], item['price'], tax_rate, total, printed, note))
+            cursor.execute("SELECT id FROM orders WHERE table_id = ? AND status = 'OPEN'", (target_id,))
+            
+        row = cursor.fetchone()
         
+        if row:
+            order_id = row[0]
+        else:
+            # Create New Order
+            if is_room:
+                cursor.execute("INSERT INTO orders (room_number, status, order_type, order_date, opened_at) VALUES (?, 'OPEN', ?, ?, ?)", (target_id, order_type, today, now))
+            else:
+                cursor.execute("INSERT INTO orders (table_id, status, order_type, order_date, opened_at) VALUES (?, 'OPEN', ?, ?, ?)", (target_id, order_type, today, now))
+            order_id = cursor.lastrowid
+
+        # 2. What is already saved for this order (line_id -> saved values)
+        cursor.execute("SELECT id, quantity, unit_price, tax_rate, notes FROM order_items WHERE order_id = ?", (order_id,))
+        saved = {r[0]: r[1:] for r in cursor.fetchall()}
+
+        # 3. Diff the cart against it: only changed lines get written
+        updates, new_lines, kept = [], [], set()
+        for item in cart_items:
+            note = item.get('note', '')
+            # Use .get('tax_rate', 5.0) instead of item['tax']
+            tax_rate = item.get('tax_rate', 5.0)
+            line_id = item.get('line_id')
+            if line_id in saved:
+                kept.add(line_id)
+                if saved[line_id] != (item['qty'], item['price'], tax_rate, note):
+                    updates.append((item['qty'], item['price'], tax_rate, item['price'] * item['qty'], note, item['qty'], line_id))
+            else:
+                new_lines.append(item)
+
+        if updates:
+            # printed_qty is left alone (mark_kot_printed owns it), only clamped if the qty went down
+            cursor.executemany("""
+                UPDATE order_items SET quantity = ?, unit_price = ?, tax_rate = ?, total_price = ?, notes = ?,
+                                       printed_qty = MIN(printed_qty, ?)
+                WHERE id = ?
+            """, updates)
+
+        removed = [(line_id,) for line_id in saved if line_id not in kept]
+        if removed:
+            cursor.executemany("DELETE FROM order_items WHERE id = ?", removed)
+
+        new_ids = []
+        if new_lines:
+            last_id = max(saved, default=0)
+            cursor.executemany(LINE_INSERT, [_line_row(order_id, item, item.get('printed', 0)) for item in new_lines])
+            cursor.execute("SELECT id FROM order_items WHERE order_id = ? AND id > ? ORDER BY id", (order_id, last_id))
+            new_ids = [r[0] for r in cursor.fetchall()]
+            
+        if not is_room:
+            cursor.execute("UPDATE dining_tables SET status = 'OCCUPIED' WHERE id = ?", (target_id,))
+        # The cart is only touched once the write has committed (a retried attempt starts from the same cart)
+        return order_id, list(zip(new_lines, new_ids))
+
+    order_id, added = run_write(work)
+    # Hand the new row ids back to the cart so the next save only sends the difference
+    for item, line_id in added:
+        item['line_id'] = line_id
     if not is_room:
         print(f"DEBUG: Updating Table {target_id} to OCCUPIED")
-        cursor.execute("UPDATE dining_tables SET status = 'OCCUPIED' WHERE id = ?", (target_id,))
-
-    conn.commit()
-    conn.close()
     return order_id
 
-def get_all_tables():
-    """
-    Fetches all tables with their status and current Total Due amount.
-    """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # This smart query joins Tables with active Orders and sums the price
-    # COALESCE(SUM(...), 0) means "If no items, Total is ₹0"
-    query = """
-        SELECT 
-            t.id, 
-            t.status, 
-            COALESCE(SUM(oi.total_price), 0) as total_due
-        FROM dining_tables t
-        LEFT JOIN orders o ON t.id = o.table_id AND o.status = 'OPEN'
-        LEFT JOIN order_items oi ON o.id = oi.order_id
-        GROUP BY t.id
-    """
-    
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    return data 
-    # Returns list of tuples: [(1, 'OCCUPIED', 500.0), (2, 'AVAILABLE', 0.0), ...]
-
 # --- PASTE THIS IN database.py ---
 
 def get_all_items():
-    conn = sqlite3.connect("hotel_restaurant.db") 
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Joining with categories so your Admin table shows the Category Name instead of a number
@@ -243,305 +460,314 @@ def get_all_items():
     
     cursor.execute(query)
     data = cursor.fetchall()
-    conn.close()
     
     return data
 
 # --- SETTINGS & CONFIGURATION HELPERS ---
 
+# --- SETTINGS CACHE ---
+# The whole settings table lives in memory. save_setting writes through to it, and
+# PRAGMA data_version (bumped only when ANOTHER connection/terminal commits) tells
+# us when to re-read it, so a lookup costs one pragma instead of a query.
+_settings = None
+_settings_db = None
+_settings_lock = threading.Lock()
+
+def _settings_map():
+    global _settings, _settings_db
+    conn = get_connection()
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _settings_lock:
+        if _settings is None or _settings_db != DB_NAME or getattr(_local, "settings_seen", None) != (conn, version):
+            _settings = dict(conn.execute("SELECT key, value FROM settings").fetchall())
+            _settings_db = DB_NAME
+            _local.settings_seen = (conn, version)
+        return _settings
+
 def get_setting(key, default=""):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT value FROM settings WHERE key=?", (key,))
-    res = cursor.fetchone()
-    conn.close()
-    return res[0] if res else default
+    settings = _settings_map()
+    return settings[key] if key in settings else default
+
+def get_settings():
+    """A copy of every setting, for screens that show them all."""
+    return dict(_settings_map())
+
+def save_settings(values):
+    """Saves several settings in one transaction ({key: value})."""
+    run_write(lambda cursor: cursor.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", list(values.items())))
+    with _settings_lock:
+        if _settings is not None and _settings_db == DB_NAME:
+            for key, value in values.items():
+                # Kept the way SQLite's TEXT column stores it
+                _settings[key] = value if value is None or isinstance(value, (str, bytes)) else str(value)
 
 def save_setting(key, value):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-    conn.commit()
-    conn.close()
+    save_settings({key: value})
 
 def get_all_categories():
-    """Get categories and their tax rates."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, tax_rate FROM categories")
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    """Get categories and their tax rates (from the menu cache)."""
+    return list(_load_menu()['categories'])
 
 def update_category_tax(cat_id, new_rate):
     """Update tax percentage for a category."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE categories SET tax_rate = ? WHERE id = ?", (new_rate, cat_id))
-    conn.commit()
-    conn.close()
+    run_write(lambda cursor: cursor.execute("UPDATE categories SET tax_rate = ? WHERE id = ?", (new_rate, cat_id)))
+    _menu_changed()
+
+# --- KITCHEN STATIONS ---
+# Each category's KOT lines go to a station (KITCHEN, BAR, ...); a KOT batch is
+# split into one ticket per station (split_kot), and every station can have its
+# own printer (escpos.sink_for). Categories without one go to DEFAULT_STATION.
+DEFAULT_STATION = "KITCHEN"
+
+def set_category_station(cat_id, station):
+    """Sends the category's KOT lines to `station` (blank = DEFAULT_STATION)."""
+    station = (station or "").strip().upper() or None
+    run_write(lambda cursor: cursor.execute("UPDATE categories SET station = ? WHERE id = ?", (station, cat_id)))
+    _menu_changed()
+
+def get_category_stations():
+    """{category id: station} (from the menu cache)."""
+    return dict(_load_menu()['category_stations'])
+
+def split_kot(cart_items):
+    """
+    Splits KOT lines by station: {station: [lines]}, stations in the order they first
+    appear in the cart. Lines not on the menu any more go to DEFAULT_STATION.
+    """
+    stations = _load_menu()['stations']
+    tickets = {}
+    for item in cart_items:
+        tickets.setdefault(stations.get(item.get('id'), DEFAULT_STATION), []).append(item)
+    return tickets
 
 def update_pin(role, new_pin):
     """Update the login PIN for Admin or Cashier."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     # We store the PIN in the 'password' column of the users table
-    cursor.execute("UPDATE users SET password = ? WHERE role = ?", (new_pin, role))
-    conn.commit()
-    conn.close()
+    run_write(lambda cursor: cursor.execute("UPDATE users SET password = ? WHERE role = ?", (new_pin, role)))
 
 def verify_pin(pin):
     """Check if a PIN exists and return the role."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT role FROM users WHERE password = ?", (pin,))
     res = cursor.fetchone()
-    conn.close()
     return res[0] if res else None
 
 def get_active_order(target_id, is_room=False):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Select 'notes' (column index 7 now roughly, but we fetch explicitly)
     if is_room:
         query = """
-            SELECT oi.id, oi.item_name, oi.quantity, oi.unit_price, oi.tax_rate, oi.printed_qty, MAX(i.id), oi.notes
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            LEFT JOIN items i ON oi.item_name = i.name
+            SELECT oi.id, oi.item_name, oi.quantity, oi.unit_price, oi.tax_rate, oi.printed_qty, oi.item_id, oi.notes
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
             WHERE o.room_number = ? AND o.status = 'OPEN'
-            GROUP BY oi.id
+            ORDER BY oi.id
         """
     else:
         query = """
-            SELECT oi.id, oi.item_name, oi.quantity, oi.unit_price, oi.tax_rate, oi.printed_qty, MAX(i.id), oi.notes
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            LEFT JOIN items i ON oi.item_name = i.name
+            SELECT oi.id, oi.item_name, oi.quantity, oi.unit_price, oi.tax_rate, oi.printed_qty, oi.item_id, oi.notes
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
             WHERE o.table_id = ? AND o.status = 'OPEN'
-            GROUP BY oi.id
+            ORDER BY oi.id
         """
         
     cursor.execute(query, (target_id,))
     data = cursor.fetchall()
-    conn.close()
     
     cart = []
     for row in data:
         cart.append({
+            'line_id': row[0], # order_items.id, lets save_order write only what changed
             'id': row[6] if row[6] else 0, 
             'name': row[1], 
             'price': row[3], 
             'qty': row[2], 
-            'tax': row[4],
+            'tax_rate': row[4],
             'printed': row[5],
             'note': row[7] if row[7] else "" # <--- Load Note
         })
     return cart
 
-def checkout_table(table_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def checkout_table(table_id, payment_mode="CASH", discount=0):
+    def work(cursor):
+        cursor.execute("UPDATE orders SET payment_mode=?, discount=? WHERE table_id=? AND status='OPEN'", (payment_mode, discount, t_id))
+        _roll_up_orders(cursor, "o.table_id = ? AND o.status = 'OPEN'", (t_id,))
+        cursor.execute("UPDATE orders SET status='COMPLETED', closed_at=? WHERE table_id=? AND status='OPEN'", (_now(), t_id))
+        cursor.execute("UPDATE dining_tables SET status='AVAILABLE' WHERE id=?", (t_id,))
+
     try:
         t_id = int(table_id) # Ensure it's an integer for the query
-        cursor.execute("UPDATE orders SET status='COMPLETED' WHERE table_id=? AND status='OPEN'", (t_id,))
-        cursor.execute("UPDATE dining_tables SET status='AVAILABLE' WHERE id=?", (t_id,))
-        conn.commit()
+        run_write(work)
         print(f"✅ Table {t_id} Checked Out & Order Closed.")
     except Exception as e:
         print(f"❌ Error checking out: {e}")
-    finally:
-        conn.close()
 
-def get_sales_history():
+SALES_PAGE_SIZE = 50
+
+def get_sales_history(limit=SALES_PAGE_SIZE, after=None, order_type=None, table_id=None,
+                      room_number=None, start=None, end=None):
     """
-    Fetches detailed sales history including Type, Table, and Item Summary.
+    One page of closed orders, newest first:
+    [(id, closed_at, order_type, table/room, "2x Burger, 1x Coke", subtotal, payment_mode), ...]
+    For the next page pass after=(closed_at, id) of the last row you got.
+    Filters are optional; start/end are 'YYYY-MM-DD' (inclusive) on the close date.
+    Live DB only: archived years are in the reports (database_reports).
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # This query joins Orders, Tables, and Items to get a full picture
-    # COALESCE(t.table_number, 'N/A') -> If table is missing (Takeout), show 'N/A'
-    # GROUP_CONCAT(...) -> Combines "Burger" and "Coke" into "2x Burger, 1x Coke"
-    query = """
+    # Keyset paging: the page starts right after the last row seen, straight off
+    # the closed_at index, so page 500 costs the same as page 1 (no OFFSET scan).
+    # The item summary is built per order for the rows on this page only.
+    where = ["o.status != 'OPEN'", "o.closed_at IS NOT NULL"]
+    params = []
+    if after:
+        where.append("(o.closed_at, o.id) < (?, ?)")
+        params += list(after)
+    if order_type:
+        where.append("o.order_type = ?")
+        params.append(order_type)
+    if table_id:
+        where.append("o.table_id = ?")
+        params.append(table_id)
+    if room_number:
+        where.append("o.room_number = ?")
+        params.append(str(room_number))
+    if start:
+        where.append("o.closed_at >= ?")
+        params.append(start)
+    if end:
+        where.append("o.closed_at < ?")
+        params.append(next_day(end))
+
+    cursor = get_connection().cursor()
+    cursor.execute(f"""
         SELECT 
             o.id, 
-            o.created_at, 
+            o.closed_at, 
             o.order_type,
-            COALESCE(t.table_number, '-'), 
-            GROUP_CONCAT(oi.quantity || 'x ' || oi.item_name, ', '),
-            SUM(oi.total_price)
+            COALESCE(t.table_number, 'Room ' || o.room_number, '-'), 
+            (SELECT GROUP_CONCAT(oi.quantity || 'x ' || oi.item_name, ', ')
+             FROM order_items oi WHERE oi.order_id = o.id),
+            COALESCE(o.subtotal, 0),
+            o.payment_mode
         FROM orders o 
         LEFT JOIN dining_tables t ON o.table_id = t.id
-        JOIN order_items oi ON o.id = oi.order_id 
-        WHERE o.status = 'CLOSED' 
-        GROUP BY o.id 
-        ORDER BY o.created_at DESC
-    """
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    return data 
-    # Returns: [(ID, Date, Type, Table, "2x Burger, 1x Coke", TotalPrice), ...]
+        WHERE {" AND ".join(where)}
+        ORDER BY o.closed_at DESC, o.id DESC
+        LIMIT ?
+    """, params + [limit])
+    return cursor.fetchall()
 
-def save_takeout_order(cart_items):
+def save_takeout_order(cart_items, payment_mode="CASH", discount=0):
     """Saves a Takeout order with the current date so it appears on the dashboard."""
-    import sqlite3
     import datetime 
     
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    try:
-        # 1. Grab today's date so the Dashboard filter can actually find it
-        today_date = datetime.date.today().strftime("%Y-%m-%d")
-        
-        # 2. Create Order - NOW WITH order_date!
+    # 1. Grab today's date so the Dashboard filter can actually find it
+    now = _now()
+    today_date = now[:10]
+
+    def work(cursor):
+        # 2. Create Order - NOW WITH order_date! (opened and closed in one go)
         cursor.execute("""
-            INSERT INTO orders (order_type, status, order_date) 
-            VALUES ('TAKEOUT', 'CLOSED', ?)
-        """, (today_date,))
+            INSERT INTO orders (order_type, status, order_date, opened_at, closed_at, payment_mode, discount) 
+            VALUES ('TAKEOUT', 'CLOSED', ?, ?, ?, ?, ?)
+        """, (today_date, now, now, payment_mode, discount))
         
         order_id = cursor.lastrowid
         
-        # 3. Insert Items into the linked table
-        for item in cart_items:
-            total = item['price'] * item['qty']
-            
-            # Using the safe .get() method we fixed earlier
-            tax_val = item.get('tax_rate', 5.0)
-            
-            cursor.execute("""
-                INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (order_id, item['name'], item['qty'], item['price'], tax_val, total))
-            
-        conn.commit()
+        # 3. Insert Items into the linked table (with their menu item + category)
+        cursor.executemany(LINE_INSERT, [_line_row(order_id, item) for item in cart_items])
+        _roll_up_orders(cursor, "o.id = ?", (order_id,)) # Takeouts are closed straight away
         return order_id
-        
+
+    try:
+        return run_write(work)
     except Exception as e:
         print(f"Error saving takeout: {e}")
-        conn.rollback()
         return None
-    finally:
-        conn.close()
         
-def save_delivery_order(cart_items, name, phone, address):
+def save_delivery_order(cart_items, name, phone, address, payment_mode="CASH", discount=0):
     """Saves a Delivery order with customer details and the current date."""
-    import sqlite3
     import datetime # Ensure we have the datetime module to stamp the order!
     
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    try:
-        # 1. Grab today's date so the Dashboard can actually find it
-        today_date = datetime.date.today().strftime("%Y-%m-%d")
-        
-        # 2. Create Order - NOW WITH order_date!
+    # 1. Grab today's date so the Dashboard can actually find it
+    now = _now()
+    today_date = now[:10]
+
+    def work(cursor):
+        # 2. Create Order - NOW WITH order_date! (opened and closed in one go)
         cursor.execute("""
-            INSERT INTO orders (order_type, status, customer_name, customer_phone, customer_address, order_date) 
-            VALUES ('DELIVERY', 'CLOSED', ?, ?, ?, ?)
-        """, (name, phone, address, today_date))
+            INSERT INTO orders (order_type, status, customer_name, customer_phone, customer_address, order_date, opened_at, closed_at, payment_mode, discount) 
+            VALUES ('DELIVERY', 'CLOSED', ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (name, phone, address, today_date, now, now, payment_mode, discount))
         
         order_id = cursor.lastrowid
         
-        # 3. Insert Items (Unchanged)
-        for item in cart_items:
-            total = item['price'] * item['qty']
-            tax_rate = item.get('tax_rate', 5.0) 
-            
-            cursor.execute("""
-                INSERT INTO order_items (order_id, item_name, quantity, unit_price, tax_rate, total_price)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (order_id, item['name'], item['qty'], item['price'], tax_rate, total))
-            
-        conn.commit()
+        # 3. Insert Items (with their menu item + category)
+        cursor.executemany(LINE_INSERT, [_line_row(order_id, item) for item in cart_items])
+        _roll_up_orders(cursor, "o.id = ?", (order_id,)) # Deliveries too
         return order_id
+
+    try:
+        return run_write(work)
     except Exception as e:
         print(f"Error saving delivery: {e}")
-        conn.rollback()
         return None
-    finally:
-        conn.close()
 
-def add_category(name, tax_rate):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def add_category(name, tax_rate, station=None):
+    station = (station or "").strip().upper() or None
     try:
-        cursor.execute("INSERT INTO categories (name, tax_rate) VALUES (?, ?)", (name, tax_rate))
-        conn.commit()
+        run_write(lambda cursor: cursor.execute("INSERT INTO categories (name, tax_rate, station) VALUES (?, ?, ?)",
+                                                (name, tax_rate, station)))
+        _menu_changed()
         return True
     except:
         return False
-    finally:
-        conn.close()
 
 def delete_category(cat_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM categories WHERE id = ?", (cat_id,))
-    conn.commit()
-    conn.close()
-
-def add_item(name, category_id, p_dine, p_del, img_path, tax_rate=5.0):
-    """Inserts a new item ensuring variables map to the correct columns."""
-    import sqlite3
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    try:
-        query = """
-            INSERT INTO items (name, category_id, price_dinein, price_delivery, image_path, tax_rate)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """
-        # Variables are locked in the exact order of the columns
-        cursor.execute(query, (name, category_id, float(p_dine), float(p_del), img_path, float(tax_rate)))
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"Database Error: {e}")
-        return False
-    finally:
-        conn.close()
+    run_write(lambda cursor: cursor.execute("DELETE FROM categories WHERE id = ?", (cat_id,)))
+    _menu_changed()
 
 def delete_item(item_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-    conn.commit()
-    conn.close()
+    run_write(lambda cursor: cursor.execute("DELETE FROM items WHERE id = ?", (item_id,)))
+    _menu_changed()
 
-def mark_kot_printed(target_id, is_room=False):
+def mark_kot_printed(target_id, is_room=False, lines=None):
     """
     Updates the printed_qty to match the actual quantity.
     target_id: Table ID or Room Number
     is_room: Boolean flag to check if it's a room
+    lines: [(printed_qty, line_id), ...] to mark only the lines that went on the
+           station tickets, with the quantity each ticket covered (None = every line)
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # 1. Find the Order ID (Check Room or Table)
-    if is_room:
-        cursor.execute("SELECT id FROM orders WHERE room_number = ? AND status = 'OPEN'", (target_id,))
-    else:
-        cursor.execute("SELECT id FROM orders WHERE table_id = ? AND status = 'OPEN'", (target_id,))
-        
-    row = cursor.fetchone()
-    
-    if row:
-        order_id = row[0]
-        # 2. Set printed_qty = quantity (Syncs them so they don't print again)
-        cursor.execute("UPDATE order_items SET printed_qty = quantity WHERE order_id = ?", (order_id,))
-        conn.commit()
+    def work(cursor):
+        # 1. Find the Order ID (Check Room or Table)
+        if is_room:
+            cursor.execute("SELECT id FROM orders WHERE room_number = ? AND status = 'OPEN'", (target_id,))
+        else:
+            cursor.execute("SELECT id FROM orders WHERE table_id = ? AND status = 'OPEN'", (target_id,))
+            
+        row = cursor.fetchone()
         
-    conn.close()
+        if row:
+            order_id = row[0]
+            # 2. Set printed_qty = quantity (Syncs them so they don't print again)
+            if lines is None:
+                cursor.execute("UPDATE order_items SET printed_qty = quantity WHERE order_id = ?", (order_id,))
+            else:
+                cursor.executemany("UPDATE order_items SET printed_qty = ? WHERE id = ? AND order_id = ?",
+                                   [(qty, line_id, order_id) for qty, line_id in lines])
+            # 3. Remember when the kitchen first got this order
+            cursor.execute("UPDATE orders SET kot_at = COALESCE(kot_at, ?) WHERE id = ?", (_now(), order_id))
+
+    run_write(work)
 
 def get_daily_transactions(date_str):
     """Combines Food Orders and Room Bookings into one detailed master list."""
     import sqlite3
-    conn = sqlite3.connect(DB_NAME) 
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
@@ -549,16 +775,14 @@ def get_daily_transactions(date_str):
             -- PART 1: RESTAURANT & ROOM SERVICE ORDERS
             SELECT 
                 'FOOD-' || o.id as rec_id, 
-                o.order_date, 
+                o.opened_at, 
                 o.order_type, 
-                COALESCE(SUM(oi.total_price), 0) as amount, 
+                COALESCE(o.subtotal, 0) as amount, 
                 o.status,
                 COALESCE(o.customer_name, 'Walk-in Guest') as guest_name,
                 COALESCE(o.customer_phone, '-') as phone
             FROM orders o
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            WHERE o.order_date = ?
-            GROUP BY o.id
+            WHERE o.opened_at >= ? AND o.opened_at < ?
 
             UNION ALL
 
@@ -567,26 +791,25 @@ def get_daily_transactions(date_str):
                 'ROOM-' || b.id as rec_id, 
                 b.check_in_date, 
                 'ROOM_BOOKING' as order_type, 
-                COALESCE(r.price_per_night, 0) as amount, 
+                COALESCE(b.nightly_rate, r.price_per_night, 0) as amount, -- The rate the guest checked in at
                 'CONFIRMED' as status,
                 COALESCE(b.guest_name, 'Room Guest') as guest_name, -- FIXED!
                 COALESCE(b.guest_phone, '-') as phone               -- FIXED!
             FROM bookings b
             JOIN rooms r ON b.room_number = r.room_number
-            WHERE b.check_in_date LIKE ?
+            WHERE b.check_in_date >= ? AND b.check_in_date < ?
             
             ORDER BY rec_id DESC
         """
         
-        # Pass date_str twice (once for the top WHERE, once for the bottom WHERE)
-        cursor.execute(query, (date_str, f"{date_str}%"))
+        # [day, next day) ranges instead of LIKE 'day%' / bare dates, so both sides seek an index
+        day_after = next_day(date_str)
+        cursor.execute(query, (date_str, day_after, date_str, day_after))
         return cursor.fetchall()
         
     except Exception as e:
         print(f"Transactions Error: {e}")
         return []
-    finally:
-        conn.close()
 
 # ==========================================
 # ROOM MANAGEMENT DATABASE FUNCTIONS
@@ -594,52 +817,56 @@ def get_daily_transactions(date_str):
 
 def init_room_db():
     """Creates tables for Rooms and Bookings."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # 1. Rooms Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS rooms (
-            room_number TEXT PRIMARY KEY,
-            room_type TEXT, -- e.g. Single, Double, Suite
-            price_per_night REAL,
-            status TEXT DEFAULT 'AVAILABLE' -- AVAILABLE, OCCUPIED, DIRTY
-        )
-    ''')
-    
-    # 2. Bookings Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            room_number TEXT,
-            guest_name TEXT,
-            guest_phone TEXT,
-            check_in_date TEXT,
-            check_out_date TEXT, -- Null until they leave
-            status TEXT DEFAULT 'ACTIVE', -- ACTIVE, CHECKED_OUT
-            FOREIGN KEY(room_number) REFERENCES rooms(room_number)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    def work(cursor):
+        # 1. Rooms Table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rooms (
+                room_number TEXT PRIMARY KEY,
+                room_type TEXT, -- e.g. Single, Double, Suite
+                price_per_night REAL,
+                status TEXT DEFAULT 'AVAILABLE' -- AVAILABLE, OCCUPIED, DIRTY
+            )
+        ''')
+        
+        # 2. Bookings Table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                room_number TEXT,
+                guest_name TEXT,
+                guest_phone TEXT,
+                check_in_date TEXT,
+                check_out_date TEXT, -- Null until they leave
+                status TEXT DEFAULT 'ACTIVE', -- ACTIVE, CHECKED_OUT
+                payment_mode TEXT, -- Set at check-out
+                nightly_rate REAL, -- The room's price at check-in
+                FOREIGN KEY(room_number) REFERENCES rooms(room_number)
+            )
+        ''')
+        added = _add_column(cursor, "bookings", "payment_mode", "TEXT")
+        added = _add_column(cursor, "bookings", "nightly_rate", "REAL") or added # Older stays fall back to the room's current price
+
+        # 3. Indexes: who is in a room right now, and bookings by day
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_room_active ON bookings(room_number) WHERE status = 'ACTIVE'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_check_in ON bookings(check_in_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_check_out ON bookings(check_out_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_active_in ON bookings(check_in_date) WHERE status = 'ACTIVE'")
+        return added
+
+    if run_write(work):
+        attach_archives(refresh=True) # history_bookings lists the columns it was built with
 
 def add_room(room_num, r_type, price):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)", 
-                       (room_num, r_type, price))
-        conn.commit()
+        run_write(lambda cursor: cursor.execute("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)", 
+                                                (room_num, r_type, price)))
         return True
     except:
         return False # Room probably exists
-    finally:
-        conn.close()
 
 def get_all_rooms():
     """Returns [(room_num, type, price, status, guest_name), ...]"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # We join with bookings to see WHO is in the room if it is occupied
@@ -650,231 +877,445 @@ def get_all_rooms():
     """
     cursor.execute(query)
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def get_all_tables():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     query = """
         SELECT 
             t.table_number,               -- index 0 (String for GUI list/buttons)
             t.status,                     -- index 1
-            COALESCE(SUM(oi.total_price), 0), -- index 2
+            COALESCE(SUM(o.subtotal), 0), -- index 2 (running total kept by the order_items triggers)
             t.id                          -- index 3 (Integer for save_order logic)
         FROM dining_tables t
         LEFT JOIN orders o ON t.id = o.table_id AND o.status = 'OPEN'
-        LEFT JOIN order_items oi ON o.id = oi.order_id
         GROUP BY t.id
     """
     cursor.execute(query)
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def check_in_guest(room_num, name, phone):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    import datetime
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 1. Create Booking
-    cursor.execute("INSERT INTO bookings (room_number, guest_name, guest_phone, check_in_date) VALUES (?, ?, ?, ?)",
-                   (room_num, name, phone, now))
-    
-    # 2. Update Room Status
-    cursor.execute("UPDATE rooms SET status = 'OCCUPIED' WHERE room_number = ?", (room_num,))
-    
-    conn.commit()
-    conn.close()
+    now = _now()
 
-def check_out_guest(room_num):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    import datetime
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 1. Close Booking
-    cursor.execute("UPDATE bookings SET status = 'CHECKED_OUT', check_out_date = ? WHERE room_number = ? AND status = 'ACTIVE'", (now, room_num))
-    
-    # 2. Free Room
-    cursor.execute("UPDATE rooms SET status = 'AVAILABLE' WHERE room_number = ?", (room_num,))
-    
-    conn.commit()
-    conn.close()
+    def work(cursor):
+        # 1. Create Booking, at today's price for the room
+        cursor.execute("""INSERT INTO bookings (room_number, guest_name, guest_phone, check_in_date, nightly_rate)
+                          SELECT ?, ?, ?, ?, (SELECT price_per_night FROM rooms WHERE room_number = ?)""",
+                       (room_num, name, phone, now, room_num))
+        
+        # 2. Update Room Status
+        cursor.execute("UPDATE rooms SET status = 'OCCUPIED' WHERE room_number = ?", (room_num,))
+
+    run_write(work)
+
+def check_out_guest(room_num, payment_mode="CASH"):
+    """Closes the stay and the room service still open on it: both go on the room invoice."""
+    now = _now()
+
+    def work(cursor):
+        # 1. Close Booking, and book the stay into the daily rollup
+        cursor.execute("SELECT id FROM bookings WHERE room_number = ? AND status = 'ACTIVE'", (room_num,))
+        booking_ids = [row[0] for row in cursor.fetchall()]
+        _close_room_orders(cursor, room_num, payment_mode, now, booking_id=booking_ids[0] if booking_ids else None)
+        cursor.execute("UPDATE bookings SET status = 'CHECKED_OUT', check_out_date = ?, payment_mode = ? WHERE room_number = ? AND status = 'ACTIVE'",
+                       (now, payment_mode, room_num))
+        if booking_ids:
+            _roll_up_rooms(cursor, f"b.id IN ({', '.join('?' * len(booking_ids))})", booking_ids)
+        
+        # 2. Free Room
+        cursor.execute("UPDATE rooms SET status = 'AVAILABLE' WHERE room_number = ?", (room_num,))
+
+    run_write(work)
 
 def get_room_food_total(room_num):
     """Returns total cost of pending food orders for a room."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT COALESCE(SUM(oi.total_price), 0)
-        FROM order_items oi
-        JOIN orders o ON oi.order_id = o.id
-        WHERE o.room_number = ? AND o.status = 'OPEN'
-    """, (room_num,))
+    cursor.execute("SELECT COALESCE(SUM(subtotal), 0) FROM orders WHERE room_number = ? AND status = 'OPEN'", (room_num,))
     
     total = cursor.fetchone()[0]
-    conn.close()
     return total
 
-def checkout_room_orders(room_num):
-    """Marks all open food orders for this room as CLOSED."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE orders SET status = 'CLOSED' WHERE room_number = ? AND status = 'OPEN'", (room_num,))
-    conn.commit()
-    conn.close()
+def _close_room_orders(cursor, room_num, payment_mode, closed_at, discount=0, booking_id=None):
+    cursor.execute("UPDATE orders SET payment_mode = ?, discount = ?, booking_id = ? WHERE room_number = ? AND status = 'OPEN'",
+                   (payment_mode, discount, booking_id, room_num))
+    _roll_up_orders(cursor, "o.room_number = ? AND o.status = 'OPEN'", (room_num,))
+    cursor.execute("UPDATE orders SET status = 'CLOSED', closed_at = ? WHERE room_number = ? AND status = 'OPEN'", (closed_at, room_num))
+
+def checkout_room_orders(room_num, payment_mode="CASH", discount=0):
+    """Marks all open food orders for this room as CLOSED (billed on their own, not on the room invoice)."""
+    run_write(lambda cursor: _close_room_orders(cursor, room_num, payment_mode, _now(), discount))
 
 def get_room_order_items(room_num):
     """Fetches the list of all food items ordered by this room."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT oi.item_name, SUM(oi.quantity), oi.unit_price, SUM(oi.total_price)
+        SELECT oi.item_name, SUM(oi.quantity), oi.unit_price, SUM(oi.total_price), COALESCE(oi.tax_rate, 0)
         FROM order_items oi
         JOIN orders o ON oi.order_id = o.id
         WHERE o.room_number = ? AND o.status = 'OPEN'
-        GROUP BY oi.item_name
+        GROUP BY oi.item_name, oi.tax_rate
     """, (room_num,))
     
-    # Returns list of tuples: [('Burger', 2, 100, 200), ('Coke', 1, 40, 40)]
+    # Returns list of tuples: [('Burger', 2, 100, 200, 5.0), ('Coke', 1, 40, 40, 5.0)]
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def get_active_booking_details(room_num):
-    conn = sqlite3.connect(DB_NAME)
+    """(guest_name, guest_phone, check_in_date, nightly_rate) of the guest in the room, or None."""
+    conn = get_connection()
     cursor = conn.cursor()
     query = """
-        SELECT guest_name, guest_phone, check_in_date 
-        FROM bookings 
-        WHERE room_number = ? AND status = 'ACTIVE'
+        SELECT b.guest_name, b.guest_phone, b.check_in_date, COALESCE(b.nightly_rate, r.price_per_night, 0)
+        FROM bookings b
+        LEFT JOIN rooms r ON r.room_number = b.room_number
+        WHERE b.room_number = ? AND b.status = 'ACTIVE'
     """
     cursor.execute(query, (room_num,))
     res = cursor.fetchone()
-    conn.close()
     return res 
 
 # --- TABLE MANAGEMENT ---
 def add_custom_table(name):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO dining_tables (table_number, status) VALUES (?, 'AVAILABLE')", (name,))
-        conn.commit()
+        run_write(lambda cursor: cursor.execute("INSERT INTO dining_tables (table_number, status) VALUES (?, 'AVAILABLE')", (name,)))
         success = True
     except Exception as e:
         print(f"Error adding table: {e}")
         success = False
-    finally:
-        conn.close()
     return success
 
 def delete_table(name):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM dining_tables WHERE id=?", (name,))
-    conn.commit()
-    conn.close()
+    run_write(lambda cursor: cursor.execute("DELETE FROM dining_tables WHERE id=?", (name,)))
 
 # --- ROOM MANAGEMENT ---
 def add_custom_room(r_num, r_type, price):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO rooms (room_number, room_type, price_per_night, status) VALUES (?, ?, ?, 'AVAILABLE')", (r_num, r_type, price))
-        conn.commit()
+        run_write(lambda cursor: cursor.execute("INSERT INTO rooms (room_number, room_type, price_per_night, status) VALUES (?, ?, ?, 'AVAILABLE')", (r_num, r_type, price)))
         success = True
     except:
         success = False
-    conn.close()
     return success
 
 def delete_room(r_num):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM rooms WHERE room_number=?", (r_num,))
-    conn.commit()
-    conn.close()
+    run_write(lambda cursor: cursor.execute("DELETE FROM rooms WHERE room_number=?", (r_num,)))
+
+# ==========================================
+# MENU CACHE (the menu is read on every POS screen, edited rarely)
+# ==========================================
+# Edits made here drop the cache straight away (_menu_changed). Edits from other
+# terminals / connections are caught like the settings cache does: when PRAGMA
+# data_version moves, settings.menu_version (bumped by the items / categories
+# triggers) says whether it was the menu that changed; an order being saved
+# elsewhere costs one primary-key lookup, not a reload.
+_menu = None              # {'db', 'version', 'categories', 'category_stations', 'stations', 'DINE_IN', 'DELIVERY', '<mode>_by_category'}
+_menu_generation = 0      # Bumped on every menu change; POS screens compare it to skip refreshes
+_menu_lock = threading.Lock()
+
+MENU_VERSION_BUMP = """INSERT INTO settings (key, value) VALUES ('menu_version', 1)
+                       ON CONFLICT (key) DO UPDATE SET value = value + 1"""
+
+def menu_generation():
+    """Changes whenever items or categories are edited, on this terminal or another one."""
+    _load_menu()
+    return _menu_generation
+
+def _menu_changed():
+    """Called by every function that edits items/categories, after the write."""
+    global _menu, _menu_generation
+    with _menu_lock:
+        _menu = None
+        _menu_generation += 1
+
+def _menu_version(conn):
+    row = conn.execute("SELECT value FROM settings WHERE key = 'menu_version'").fetchone()
+    return row[0] if row else None
+
+def _load_menu():
+    """Reads items + categories once per menu version and builds both price projections."""
+    global _menu, _menu_generation
+    conn = get_connection()
+    seen = (conn, conn.execute("PRAGMA data_version").fetchone()[0])
+    with _menu_lock:
+        if _menu is not None and _menu['db'] == DB_NAME:
+            if getattr(_local, "menu_seen", None) == seen:
+                return _menu
+            if _menu_version(conn) == _menu['version']: # Someone else wrote, but not to the menu
+                _local.menu_seen = seen
+                return _menu
+            _menu_generation += 1 # Edited on another terminal
+
+        # The version is read first: an edit landing in between only causes one more reload
+        version = _menu_version(conn)
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row  # <--- CRITICAL: Enables item['name'] access (cursor only, the connection is shared)
+        cursor.execute("""
+            SELECT i.id, i.name, i.price_dinein, i.price_delivery, 
+                   c.name as category_name, i.image_path, i.tax_rate, c.station
+            FROM items i
+            LEFT JOIN categories c ON i.category_id = c.id
+        """)
+        rows = cursor.fetchall()
+        cursor.execute("SELECT id, name, tax_rate, station FROM categories")
+        categories = cursor.fetchall()
+        menu = {'db': DB_NAME, 'version': version, 'categories': [(c['id'], c['name'], c['tax_rate']) for c in categories]}
+        menu['category_stations'] = {c['id']: c['station'] or DEFAULT_STATION for c in categories}
+        menu['stations'] = {row['id']: row['station'] or DEFAULT_STATION for row in rows} # item id -> station
+
+        for price_mode in ("DINE_IN", "DELIVERY"):
+            menu_list = []
+            by_category = {}
+            for row in rows:
+                # Select price based on mode
+                item = {
+                    "id": row['id'],
+                    "name": row['name'],
+                    "price": row['price_delivery'] if price_mode == "DELIVERY" else row['price_dinein'],
+                    "category": row['category_name'] if row['category_name'] else "Uncategorized", 
+                    "image": row['image_path'] if row['image_path'] else "", 
+                    "tax_rate": row['tax_rate'] if row['tax_rate'] else 0.0
+                }
+                menu_list.append(item)
+                by_category.setdefault(item['category'], []).append(item)
+            menu[price_mode] = menu_list
+            menu[price_mode + '_by_category'] = by_category
+
+        _menu = menu
+        _local.menu_seen = seen
+        return menu
 
 def get_menu_items(price_mode="DINE_IN"):
     """
     Returns menu items as DICTIONARIES so the POS doesn't crash.
+    Served from the menu cache; each caller gets its own copies.
     """
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row  # <--- CRITICAL: Enables item['name'] access
-    cursor = conn.cursor()
-    
-    query = """
-        SELECT i.id, i.name, i.price_dinein, i.price_delivery, 
-               c.name as category_name, i.image_path, i.tax_rate
-        FROM items i
-        LEFT JOIN categories c ON i.category_id = c.id
-    """
-    
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    
-    menu_list = []
-    for row in data:
-        # Select price based on mode
-        final_price = row['price_delivery'] if price_mode == "DELIVERY" else row['price_dinein']
-
-        menu_list.append({
-            "id": row['id'],
-            "name": row['name'],
-            "price": final_price,
-            "category": row['category_name'] if row['category_name'] else "Uncategorized", 
-            "image": row['image_path'] if row['image_path'] else "", 
-            "tax_rate": row['tax_rate'] if row['tax_rate'] else 0.0
-        })
-        
-    return menu_list
+    mode = "DELIVERY" if price_mode == "DELIVERY" else "DINE_IN"
+    return [dict(item) for item in _load_menu()[mode]]
+
+def get_menu_by_category(price_mode="DINE_IN"):
+    """{category name: [item dicts]} from the menu cache."""
+    mode = "DELIVERY" if price_mode == "DELIVERY" else "DINE_IN"
+    return {cat: [dict(item) for item in items] for cat, items in _load_menu()[mode + '_by_category'].items()}
 
 def add_item(name, category_id, price_dine, price_del, image_path, tax_rate=5.0):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
+        run_write(lambda cursor: cursor.execute("""
             INSERT INTO items (name, category_id, price_dinein, price_delivery, image_path, tax_rate)
             VALUES (?, ?, ?, ?, ?, ?)
-        """, (name, category_id, price_dine, price_del, image_path, tax_rate))
-        conn.commit()
+        """, (name, category_id, price_dine, price_del, image_path, tax_rate)))
+        _menu_changed()
         return True
     except Exception as e:
         print(f"Database Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_daily_report(date_str):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     report = {'food': 0.0, 'rooms': 0.0, 'halls': 0.0, 'total': 0.0}
     
     # Matches your orders table column 'order_date'
-    cursor.execute("""
-        SELECT COALESCE(SUM(oi.total_price), 0)
-        FROM order_items oi
-        JOIN orders o ON oi.order_id = o.id
-        WHERE o.order_date = ?
-    """, (date_str,))
-    report['food'] = cursor.fetchone()[0]
-    
-    # Matches your rooms table column 'price_per_night'
-    cursor.execute("""
-        SELECT COALESCE(SUM(r.price_per_night), 0)
-        FROM bookings b
-        JOIN rooms r ON b.room_number = r.room_number
-        WHERE b.check_in_date LIKE ?
-    """, (f"{date_str}%",))
-    report['rooms'] = cursor.fetchone()[0]
+    # A handful of rollup rows for the day (closed orders, checked-out rooms, hall events)
+    cursor.execute("SELECT stream, SUM(subtotal) FROM daily_sales WHERE sale_date = ? GROUP BY stream", (date_str,))
+    for stream, amount in cursor.fetchall():
+        report[stream] = amount
     
-    report['total'] = report['food'] + report['rooms']
-    conn.close()
+    report['total'] = report['food'] + report['rooms'] + report['halls']
     return report
 
+# ==========================================
+# DAILY SALES ROLLUP
+# ==========================================
+# daily_sales (and item_sales_hourly for food) is updated in the same transaction
+# that closes an order, checks a guest out or books a hall, so reports never have
+# to scan the history. rebuild_daily_sales() recomputes both from scratch
+# (python maintenance.py rebuild-rollup).
+
+ROOM_TAX_RATE = 18.0 # CGST 9% + SGST 9%, as printed on the room invoice
+
+_ADD_TO_ROLLUP = """
+    ON CONFLICT (sale_date, stream, order_type, tax_rate, payment_mode) DO UPDATE SET
+        subtotal = subtotal + excluded.subtotal,
+        tax = tax + excluded.tax,
+        orders_count = orders_count + excluded.orders_count
+"""
+
+def _column_or_null(cursor, db, table, alias, column):
+    """alias.column, or NULL for an archive written before the column existed."""
+    return f"{alias}.{column}" if column in _columns(cursor, f"{db}.{table}") else "NULL"
+
+def _roll_up_orders(cursor, where, params, db="main"):
+    """Adds the food orders matching `where` (on orders o) to the rollup. Call it as they close."""
+    payment = _column_or_null(cursor, db, "orders", "o", "payment_mode")
+    opened = _column_or_null(cursor, db, "orders", "o", "opened_at")
+    item_id = _column_or_null(cursor, db, "order_items", "oi", "item_id")
+    category_id = _column_or_null(cursor, db, "order_items", "oi", "category_id")
+    cursor.execute(f"""
+        INSERT INTO daily_sales (sale_date, stream, order_type, tax_rate, payment_mode, subtotal, tax, orders_count)
+        SELECT substr(o.order_date, 1, 10), 'food', o.order_type, COALESCE(oi.tax_rate, 0), COALESCE({payment}, 'N/A'),
+               SUM(oi.total_price), SUM(oi.total_price * COALESCE(oi.tax_rate, 0) / 100.0), COUNT(DISTINCT o.id)
+        FROM {db}.orders o
+        JOIN {db}.order_items oi ON oi.order_id = o.id
+        WHERE {where}
+        GROUP BY 1, 3, 4, 5
+    """ + _ADD_TO_ROLLUP, params)
+
+    # Same orders, per item and hour of day
+    cursor.execute(f"""
+        INSERT INTO item_sales_hourly (sale_date, hour, item_id, item_name, category_id, qty, revenue)
+        SELECT substr(o.order_date, 1, 10), CAST(COALESCE(substr({opened}, 12, 2), 0) AS INTEGER),
+               COALESCE({item_id}, 0), oi.item_name, MAX({category_id}), SUM(oi.quantity), SUM(oi.total_price)
+        FROM {db}.orders o
+        JOIN {db}.order_items oi ON oi.order_id = o.id
+        WHERE {where}
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (sale_date, hour, item_id, item_name) DO UPDATE SET
+            category_id = COALESCE(excluded.category_id, category_id),
+            qty = qty + excluded.qty,
+            revenue = revenue + excluded.revenue
+    """, params)
+
+def _roll_up_rooms(cursor, where, params, db="main"):
+    """Adds room stays (bookings b) to the rollup: nightly rate x nights (min 1), on the check-out day."""
+    rate = _column_or_null(cursor, db, "bookings", "b", "nightly_rate") # NULL: bill at the room's current price
+    payment = _column_or_null(cursor, db, "bookings", "b", "payment_mode")
+    cursor.execute(f"""
+        INSERT INTO daily_sales (sale_date, stream, order_type, tax_rate, payment_mode, subtotal, tax, orders_count)
+        SELECT substr(b.check_out_date, 1, 10), 'rooms', 'ROOM_BOOKING', ?, COALESCE({payment}, 'N/A'),
+               SUM(stay), SUM(stay) * ? / 100.0, COUNT(*)
+        FROM (
+            SELECT b.*, COALESCE({rate}, r.price_per_night, 0)
+                        * MAX(1, CAST(julianday(b.check_out_date) - julianday(b.check_in_date) AS INTEGER)) AS stay
+            FROM {db}.bookings b
+            JOIN rooms r ON r.room_number = b.room_number
+            WHERE {where}
+        ) b
+        WHERE 1
+        GROUP BY 1, 5
+    """ + _ADD_TO_ROLLUP, (ROOM_TAX_RATE, ROOM_TAX_RATE) + tuple(params))
+
+def _roll_up_halls(cursor, where, params):
+    """Adds hall bookings (hall_bookings h) to the rollup on their event day. Halls carry no tax in the app."""
+    cursor.execute(f"""
+        INSERT INTO daily_sales (sale_date, stream, order_type, tax_rate, payment_mode, subtotal, tax, orders_count)
+        SELECT h.event_date, 'halls', 'HALL_BOOKING', 0, 'N/A', SUM(h.total_price), 0, COUNT(*)
+        FROM hall_bookings h
+        WHERE {where}
+        GROUP BY 1
+    """ + _ADD_TO_ROLLUP, params)
+
+def roll_up_hall_booking(cursor, booking_id):
+    """Called by database_halls.book_hall inside its write transaction."""
+    _roll_up_halls(cursor, "h.id = ?", (booking_id,))
+
+def rebuild_daily_sales(date_from=None, date_to=None):
+    """
+    Recomputes daily_sales and item_sales_hourly from the order/booking history for [date_from, date_to]
+    (both 'YYYY-MM-DD', inclusive; None = no limit). Returns the number of rollup rows written.
+    """
+    start = date_from or "0000-00-00"
+    end = next_day(date_to) if date_to else "9999-99-99"
+
+    archives = attach_archives() # Archived years count too (must happen outside the transaction)
+
+    def work(cursor):
+        cursor.execute("DELETE FROM daily_sales WHERE sale_date >= ? AND sale_date < ?", (start, end))
+        cursor.execute("DELETE FROM item_sales_hourly WHERE sale_date >= ? AND sale_date < ?", (start, end))
+        before = cursor.connection.total_changes
+        for db in ["main"] + [db for db in archives if _columns(cursor, f"{db}.order_items")]:
+            _roll_up_orders(cursor, "o.status != 'OPEN' AND o.order_date >= ? AND o.order_date < ?", (start, end), db)
+        if _table_exists(cursor, "bookings"):
+            for db in ["main"] + [db for db in archives if _columns(cursor, f"{db}.bookings")]:
+                _roll_up_rooms(cursor, "b.status = 'CHECKED_OUT' AND b.check_out_date >= ? AND b.check_out_date < ?",
+                               (start, end), db)
+        if _table_exists(cursor, "hall_bookings"):
+            _roll_up_halls(cursor, "h.event_date >= ? AND h.event_date < ?", (start, end))
+        return cursor.connection.total_changes - before
+
+    return run_write(work)
+
+
+# ==========================================
+# ARCHIVED HISTORY (per-year archive files)
+# ==========================================
+# database_archive.py moves old closed orders and finished stays out of the live
+# DB into <db>_archive_<year>.db next to it, so the POS only ever scans recent rows.
+# Reports read the full history through TEMP views that attach_archives() puts
+# on a connection: history_orders, history_lines (orders x order_items) and
+# history_bookings, each the live rows UNION ALL every archive's rows. A date
+# filter on a view is pushed down into every branch, so each file uses its own
+# indexes. The live POS queries never touch these views.
+
+ARCHIVED_TABLES = ("orders", "order_items", "bookings")
+
+def archive_path(year):
+    stem, ext = os.path.splitext(DB_NAME)
+    return f"{stem}_archive_{year}{ext or '.db'}"
+
+def archive_files():
+    """{year: path} of the archive files that exist for the current DB_NAME."""
+    stem, ext = os.path.splitext(os.path.basename(DB_NAME))
+    folder = os.path.dirname(os.path.abspath(DB_NAME))
+    pattern = re.compile(re.escape(stem) + r"_archive_(\d{4})" + re.escape(ext or ".db") + "$")
+    found = {}
+    for name in os.listdir(folder):
+        match = pattern.match(name)
+        if match:
+            found[match.group(1)] = os.path.join(folder, name)
+    return dict(sorted(found.items()))
+
+def attach_archives(conn=None, refresh=False):
+    """
+    Attaches every archive file to conn (default: this thread's connection) as
+    arch<year> and (re)builds the history_* views. Cheap when nothing changed;
+    refresh=True rebuilds the views anyway (after an archive gained tables).
+    Returns the attached schema names, oldest first.
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    files = archive_files()
+    wanted = {f"arch{year}": path for year, path in files.items()}
+    attached = {row[1] for row in cursor.execute("PRAGMA database_list") if row[1].startswith("arch")}
+    views = {row[0] for row in cursor.execute("SELECT name FROM temp.sqlite_master WHERE type = 'view'")}
+    needed = {"history_orders", "history_lines"} | ({"history_bookings"} if _table_exists(cursor, "bookings") else set())
+    if not refresh and attached == set(wanted) and needed <= views:
+        return list(wanted)
+
+    # ATTACH / DETACH are not allowed inside a transaction: attach before run_write()
+    for name in attached - set(wanted):
+        cursor.execute(f"DETACH DATABASE {name}")
+    for name in set(wanted) - attached:
+        cursor.execute("ATTACH DATABASE ? AS " + name, (wanted[name],))
+        cursor.execute(f"PRAGMA {name}.cache_size = -16000") # Page cache and mmap are per attached file
+        cursor.execute(f"PRAGMA {name}.mmap_size = 268435456")
+
+    # Column lists come from the live tables; an archive written by an older
+    # version may lack newer columns, which read as NULL
+    archives = list(wanted)
+    def cols(table, alias, db):
+        have = set(_columns(cursor, f"{db}.{table}")) if db != "main" else None
+        return ", ".join(f"{alias}.{c}" if have is None or c in have else f"NULL AS {c}"
+                         for c in _columns(cursor, f"main.{table}"))
+
+    def holding(*tables):
+        """main plus the archives that have these tables (a brand-new archive file is still empty)."""
+        return ["main"] + [db for db in archives if all(_columns(cursor, f"{db}.{t}") for t in tables)]
+
+    for name, table, alias in (("history_orders", "orders", "o"), ("history_bookings", "bookings", "b")):
+        cursor.execute(f"DROP VIEW IF EXISTS temp.{name}")
+        if not _table_exists(cursor, table):
+            continue
+        branches = [f"SELECT {cols(table, alias, db)} FROM {db}.{table} {alias}" for db in holding(table)]
+        cursor.execute(f"CREATE TEMP VIEW {name} AS " + " UNION ALL ".join(branches))
+
+    cursor.execute("DROP VIEW IF EXISTS temp.history_lines")
+    branches = [f"""SELECT o.order_date, o.order_type, o.status, {cols("order_items", "oi", db)}
+                    FROM {db}.orders o JOIN {db}.order_items oi ON oi.order_id = o.id"""
+                for db in holding("orders", "order_items")]
+    cursor.execute("CREATE TEMP VIEW history_lines AS " + " UNION ALL ".join(branches))
+    return archives
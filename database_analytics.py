@@ -0,0 +1,72 @@
+import database
+
+# ==========================================
+# ITEM ANALYTICS (top sellers, hour x weekday heatmaps)
+# ==========================================
+# Everything here reads the item_sales_hourly rollup, which the close hook in
+# database.py keeps current, so a dashboard view never touches order history.
+
+WEEKDAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"] # SQLite's %w order
+
+
+def _filters(start, end, item_name=None, category_id=None):
+    where = ["s.sale_date >= ?", "s.sale_date < ?"]
+    params = [start, database.next_day(end)]
+    if item_name:
+        where.append("s.item_name = ?")
+        params.append(item_name)
+    if category_id:
+        where.append("s.category_id = ?")
+        params.append(category_id)
+    return " AND ".join(where), params
+
+
+def top_sellers(start, end, limit=10, category_id=None, by="qty"):
+    """[(item_name, category, qty, revenue), ...] best first, by 'qty' or 'revenue'."""
+    where, params = _filters(start, end, category_id=category_id)
+    order = "revenue" if by == "revenue" else "qty"
+    cursor = database.get_connection().cursor()
+    cursor.execute(f"""
+        SELECT s.item_name, COALESCE(c.name, 'Uncategorized'), SUM(s.qty) AS qty, SUM(s.revenue) AS revenue
+        FROM item_sales_hourly s
+        LEFT JOIN categories c ON c.id = s.category_id
+        WHERE {where}
+        GROUP BY s.item_name, s.category_id -- Same name in two categories: two rows
+        ORDER BY {order} DESC
+        LIMIT ?
+    """, params + [limit])
+    return cursor.fetchall()
+
+
+def category_totals(start, end):
+    """[(category, qty, revenue), ...] best first."""
+    where, params = _filters(start, end)
+    cursor = database.get_connection().cursor()
+    cursor.execute(f"""
+        SELECT COALESCE(c.name, 'Uncategorized'), SUM(s.qty), SUM(s.revenue)
+        FROM item_sales_hourly s
+        LEFT JOIN categories c ON c.id = s.category_id
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY 3 DESC
+    """, params)
+    return cursor.fetchall()
+
+
+def heatmap(start, end, item_name=None, category_id=None):
+    """
+    Quantity sold as a 7 x 24 grid: grid[weekday][hour], weekday 0 = Sunday.
+    Narrow it to one item or one category, or leave both out for the whole menu.
+    """
+    where, params = _filters(start, end, item_name, category_id)
+    cursor = database.get_connection().cursor()
+    cursor.execute(f"""
+        SELECT CAST(strftime('%w', s.sale_date) AS INTEGER), s.hour, SUM(s.qty)
+        FROM item_sales_hourly s
+        WHERE {where}
+        GROUP BY 1, 2
+    """, params)
+    grid = [[0] * 24 for _ in range(7)]
+    for weekday, hour, qty in cursor.fetchall():
+        grid[weekday][hour] = qty
+    return grid
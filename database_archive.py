@@ -0,0 +1,160 @@
+import datetime
+import os
+import sqlite3
+
+import database
+
+# ==========================================
+# HOT / COLD ARCHIVAL
+# ==========================================
+# Moves closed orders (with their lines) and checked-out stays older than N days
+# from the live DB into one archive file per year (see database.archive_path()).
+# The daily_sales / item_sales_hourly rollups stay in the live DB, so dashboards
+# don't change; reports that need the rows read them through the history_* views.
+#
+# Each year is moved in two steps:
+#   1. ONE transaction on the archive copies the rows (INSERT OR IGNORE by id),
+#      committed with synchronous=FULL before anything is deleted.
+#   2. ONE write transaction on the live DB deletes exactly the rows the archive
+#      now holds.
+# With WAL on the live DB SQLite can't commit both files atomically, so this
+# order is what makes a crash safe: the worst case is rows sitting in both
+# files until the next run, which skips the copies and finishes the deletes.
+
+ARCHIVE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS {db}idx_orders_date ON orders(order_date)",
+    "CREATE INDEX IF NOT EXISTS {db}idx_orders_opened ON orders(opened_at)",
+    "CREATE INDEX IF NOT EXISTS {db}idx_order_items_order ON order_items(order_id, total_price)",
+    "CREATE INDEX IF NOT EXISTS {db}idx_bookings_check_in ON bookings(check_in_date)",
+    "CREATE INDEX IF NOT EXISTS {db}idx_bookings_check_out ON bookings(check_out_date)",
+]
+
+# What counts as finished history (o = orders, b = bookings), for one year
+OLD_ORDERS = "o.status != 'OPEN' AND o.order_date < ? AND substr(o.order_date, 1, 4) = ?"
+OLD_BOOKINGS = "b.status = 'CHECKED_OUT' AND b.check_out_date < ? AND substr(b.check_out_date, 1, 4) = ?"
+
+
+def _create_archive(cursor, path):
+    """
+    A new archive file with the live tables' layout. It is built under a temp name
+    and renamed into place, so other terminals never attach a half-made file.
+    """
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp) # Left over from a crash
+    archive = sqlite3.connect(tmp)
+    try:
+        for table in _live_tables(cursor):
+            cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            archive.execute(cursor.fetchone()[0])
+        for statement in ARCHIVE_INDEXES:
+            try:
+                archive.execute(statement.format(db=""))
+            except sqlite3.OperationalError:
+                pass # No bookings table on this install
+        archive.commit()
+        archive.execute("PRAGMA journal_mode = WAL") # Readers of the archive never block the next copy
+    finally:
+        archive.close()
+    os.replace(tmp, path)
+
+
+def _upgrade_archive(cursor, db):
+    """Gives an older archive the tables and columns the live DB has gained since."""
+    for table in _live_tables(cursor):
+        have = database._columns(cursor, f"{db}.{table}")
+        if not have:
+            cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            create = cursor.fetchone()[0]
+            cursor.execute(create.replace(f"CREATE TABLE {table}", f"CREATE TABLE {db}.{table}", 1))
+            continue
+        cursor.execute(f"PRAGMA main.table_info({table})")
+        for _, column, col_type, _, _, _ in cursor.fetchall():
+            if column not in have:
+                cursor.execute(f"ALTER TABLE {db}.{table} ADD COLUMN {column} {col_type}")
+
+
+def _live_tables(cursor):
+    """The archived tables this install has (bookings only exist once rooms are set up)."""
+    return [table for table in database.ARCHIVED_TABLES if database._table_exists(cursor, table)]
+
+
+def _years(cursor, cutoff):
+    cursor.execute("SELECT DISTINCT substr(o.order_date, 1, 4) FROM orders o WHERE o.status != 'OPEN' AND o.order_date < ?",
+                   (cutoff,))
+    years = {row[0] for row in cursor.fetchall()}
+    if database._table_exists(cursor, "bookings"):
+        cursor.execute("""SELECT DISTINCT substr(b.check_out_date, 1, 4) FROM bookings b
+                          WHERE b.status = 'CHECKED_OUT' AND b.check_out_date < ?""", (cutoff,))
+        years |= {row[0] for row in cursor.fetchall()}
+    return sorted(year for year in years if year)
+
+
+def archive_history(days=365, progress=None):
+    """
+    Moves closed orders and checked-out bookings older than `days` into the
+    per-year archive files. progress(year, moved) is called after each year.
+    Returns {year: {'orders': n, 'order_items': n, 'bookings': n}} of rows moved.
+    """
+    cutoff = (datetime.date.today() - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    moved = {}
+
+    for year in _years(cursor, cutoff):
+        path = database.archive_path(year)
+        if not os.path.exists(path):
+            _create_archive(cursor, path)
+        database.attach_archives(conn)
+        db = f"arch{year}"
+        params = (cutoff, year)
+
+        # 1. Copy into the archive: its own transaction, fully synced
+        cursor.execute(f"PRAGMA {db}.synchronous = FULL")
+        cursor.execute("BEGIN")
+        try:
+            _upgrade_archive(cursor, db)
+            tables = _live_tables(cursor)
+            cols = {table: ", ".join(database._columns(cursor, f"main.{table}")) for table in tables}
+            cursor.execute(f"""INSERT OR IGNORE INTO {db}.orders ({cols['orders']})
+                               SELECT {cols['orders']} FROM main.orders o WHERE {OLD_ORDERS}""", params)
+            cursor.execute(f"""INSERT OR IGNORE INTO {db}.order_items ({cols['order_items']})
+                               SELECT {cols['order_items']} FROM main.order_items
+                               WHERE order_id IN (SELECT o.id FROM main.orders o WHERE {OLD_ORDERS})""", params)
+            if "bookings" in tables:
+                cursor.execute(f"""INSERT OR IGNORE INTO {db}.bookings ({cols['bookings']})
+                                   SELECT {cols['bookings']} FROM main.bookings b WHERE {OLD_BOOKINGS}""", params)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        database.attach_archives(conn, refresh=True) # Picks up any tables / columns the upgrade added
+
+        # 2. Delete from the live DB exactly what the archive holds now
+        def work(cursor):
+            counts = {}
+            cursor.execute(f"DELETE FROM main.orders AS o WHERE {OLD_ORDERS} AND o.id IN (SELECT id FROM {db}.orders)",
+                           params)
+            counts['orders'] = cursor.rowcount
+            # Lines after their orders, so the totals trigger has nothing left to recompute
+            cursor.execute(f"""DELETE FROM main.order_items WHERE order_id IN (SELECT id FROM {db}.orders)
+                               AND order_id NOT IN (SELECT id FROM main.orders)""")
+            counts['order_items'] = cursor.rowcount
+            counts['bookings'] = 0
+            if "bookings" in tables:
+                cursor.execute(f"""DELETE FROM main.bookings AS b WHERE {OLD_BOOKINGS}
+                                   AND b.id IN (SELECT id FROM {db}.bookings)""", params)
+                counts['bookings'] = cursor.rowcount
+            return counts
+
+        moved[year] = database.run_write(work)
+        if progress:
+            progress(year, moved[year])
+    return moved
+
+
+def compact():
+    """VACUUM the live DB so the space freed by archiving goes back to the disk. Needs a quiet moment."""
+    conn = database.get_connection()
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)") # With WAL the smaller file only lands on checkpoint
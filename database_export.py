@@ -0,0 +1,100 @@
+import csv
+import gzip
+import os
+
+import database
+import database_reports
+
+# ==========================================
+# STREAMING CSV EXPORT (for the accountant)
+# ==========================================
+# Rows go from the cursor to the file BATCH_SIZE at a time, so memory stays
+# flat however long the range is. Everything is read inside ONE read
+# transaction on a separate read-only connection: all four files come from the
+# same snapshot, and with WAL the POS terminals keep writing meanwhile.
+
+BATCH_SIZE = 2000
+
+# file name -> (count query, export query); every query takes (start, day after end).
+# The history_* views include the archived years (database.attach_archives()).
+EXPORTS = {
+    "orders": (
+        "SELECT COUNT(*) FROM history_orders WHERE order_date >= ? AND order_date < ?",
+        "SELECT * FROM history_orders WHERE order_date >= ? AND order_date < ? ORDER BY id",
+    ),
+    "order_items": (
+        "SELECT COUNT(*) FROM history_lines WHERE order_date >= ? AND order_date < ?",
+        "SELECT * FROM history_lines WHERE order_date >= ? AND order_date < ? ORDER BY order_id, id",
+    ),
+    "bookings": (
+        "SELECT COUNT(*) FROM history_bookings WHERE check_in_date >= ? AND check_in_date < ?",
+        """SELECT b.*, r.room_type, r.price_per_night FROM history_bookings b LEFT JOIN rooms r ON r.room_number = b.room_number
+           WHERE b.check_in_date >= ? AND b.check_in_date < ? ORDER BY b.id""",
+    ),
+    "hall_bookings": (
+        "SELECT COUNT(*) FROM hall_bookings WHERE event_date >= ? AND event_date < ?",
+        """SELECT hb.*, h.name AS hall_name FROM hall_bookings hb LEFT JOIN halls h ON h.id = hb.hall_id
+           WHERE hb.event_date >= ? AND hb.event_date < ? ORDER BY hb.id""",
+    ),
+}
+
+
+def financial_year(year):
+    """Indian financial year starting in `year`: 2024 -> ('2024-04-01', '2025-03-31')."""
+    return f"{year}-04-01", f"{year + 1}-03-31"
+
+
+def export_history(folder, start, end, compress=False, progress=None):
+    """
+    Writes orders / order_items / bookings / hall_bookings for start..end (inclusive)
+    as CSV files into `folder` (.csv.gz with compress=True).
+    progress(name, rows_done, rows_total) is called after every batch.
+    Returns {name: rows written}.
+    """
+    os.makedirs(folder, exist_ok=True)
+    params = (start, database.next_day(end))
+    written = {}
+
+    conn = database.open_reader()
+    try:
+        database.attach_archives(conn)
+        conn.execute("BEGIN") # The snapshot starts at the first read below and lasts until the end
+        for name, (count_sql, export_sql) in EXPORTS.items():
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+            if cursor.fetchone() is None:
+                continue # e.g. halls never set up on this install
+            total = cursor.execute(count_sql, params).fetchone()[0]
+
+            path = os.path.join(folder, f"{name}.csv.gz" if compress else f"{name}.csv")
+            opener = gzip.open if compress else open
+            with opener(path, "wt", newline="", encoding="utf-8") as f:
+                out = csv.writer(f)
+                cursor.execute(export_sql, params)
+                out.writerow([col[0] for col in cursor.description])
+                done = 0
+                while True:
+                    rows = cursor.fetchmany(BATCH_SIZE)
+                    if not rows:
+                        break
+                    out.writerows(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(name, done, total)
+            if progress and done == 0:
+                progress(name, 0, 0)
+            written[name] = done
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return written
+
+
+def write_gst_csv(path, start, end):
+    """The GST slab summary (database_reports.gst_summary) as one CSV. Returns the row count."""
+    rows = database_reports.gst_summary(start, end)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(database_reports.GST_COLUMNS)
+        out.writerows(rows)
+    return len(rows)
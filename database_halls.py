@@ -1,84 +1,132 @@
+import datetime
 import sqlite3
+import database
 
-DB_NAME = "hotel_restaurant.db"
+# Halls share the POS connection manager (one connection per thread).
 
 def init_hall_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # 1. Halls Table (e.g., "Grand Ballroom", "Poolside")
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS halls (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE,
-            capacity INTEGER,
-            price_per_day REAL
-        )
-    ''')
+    def work(cursor):
+        # 1. Halls Table (e.g., "Grand Ballroom", "Poolside")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS halls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE,
+                capacity INTEGER,
+                price_per_day REAL
+            )
+        ''')
     
-    # 2. Hall Bookings Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS hall_bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hall_id INTEGER,
-            customer_name TEXT,
-            phone TEXT,
-            event_date TEXT, -- YYYY-MM-DD
-            event_type TEXT, -- Wedding, Birthday, Conference
-            services TEXT,   -- "DJ, Decoration, Food"
-            total_price REAL,
-            status TEXT DEFAULT 'CONFIRMED',
-            FOREIGN KEY(hall_id) REFERENCES halls(id)
-        )
-    ''')
+        # 2. Hall Bookings Table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS hall_bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hall_id INTEGER,
+                customer_name TEXT,
+                phone TEXT,
+                event_date TEXT, -- YYYY-MM-DD
+                event_type TEXT, -- Wedding, Birthday, Conference
+                services TEXT,   -- "DJ, Decoration, Food"
+                total_price REAL,
+                status TEXT DEFAULT 'CONFIRMED',
+                FOREIGN KEY(hall_id) REFERENCES halls(id)
+            )
+        ''')
     
-    # Add dummy halls if empty
-    cursor.execute("SELECT count(*) FROM halls")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("INSERT INTO halls (name, capacity, price_per_day) VALUES ('Grand Ballroom', 500, 20000)")
-        cursor.execute("INSERT INTO halls (name, capacity, price_per_day) VALUES ('Poolside Area', 100, 10000)")
-        cursor.execute("INSERT INTO halls (name, capacity, price_per_day) VALUES ('Conference Hall', 50, 5000)")
-        
-    conn.commit()
-    conn.close()
+        # Add dummy halls if empty
+        cursor.execute("SELECT count(*) FROM halls")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("INSERT INTO halls (name, capacity, price_per_day) VALUES ('Grand Ballroom', 500, 20000)")
+            cursor.execute("INSERT INTO halls (name, capacity, price_per_day) VALUES ('Poolside Area', 100, 10000)")
+            cursor.execute("INSERT INTO halls (name, capacity, price_per_day) VALUES ('Conference Hall', 50, 5000)")
+
+        # One booking per hall per day, enforced by the DB itself
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_hall_bookings_date ON hall_bookings(event_date)")
+        try:
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_hall_bookings_hall_date ON hall_bookings(hall_id, event_date)")
+        except sqlite3.IntegrityError:
+            print("⚠️ Some halls are double-booked already; fix those bookings so the unique index can be created.")
+
+    database.run_write(work)
     print("✅ Hall Database Ready.")
 
 def get_all_halls():
-    conn = sqlite3.connect(DB_NAME)
+    conn = database.get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM halls")
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def book_hall(hall_id, name, phone, date, event_type, services, price):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Check if already booked
-    cursor.execute("SELECT * FROM hall_bookings WHERE hall_id = ? AND event_date = ?", (hall_id, date))
-    if cursor.fetchone():
-        conn.close()
-        return False # Already Booked
-        
+    """Books the hall for `date` ('YYYY-MM-DD'). False if that hall is already booked that day."""
+    def work(cursor):
+        # ONE statement: the row only goes in if the day is still free, and the
+        # unique (hall_id, event_date) index turns that check into a lookup
+        cursor.execute("""
+            INSERT INTO hall_bookings (hall_id, customer_name, phone, event_date, event_type, services, total_price)
+            SELECT ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM hall_bookings WHERE hall_id = ? AND event_date = ?)
+        """, (hall_id, name, phone, date, event_type, services, price, hall_id, date))
+        if cursor.rowcount == 0:
+            return False # Already Booked
+        database.roll_up_hall_booking(cursor, cursor.lastrowid) # Revenue counts on the event day
+        return True
+
+    try:
+        return database.run_write(work)
+    except sqlite3.IntegrityError:
+        return False # The unique index caught it
+
+def month_calendar(month):
+    """
+    Every hall's bookings for one month ('YYYY-MM'), from one query on the
+    (hall_id, event_date) index: [(hall_id, hall_name, days), ...] where
+    days[d - 1] is None for a free day d, else (booking_id, customer_name, event_type).
+    """
+    first = datetime.date(int(month[:4]), int(month[5:7]), 1)
+    following = (first + datetime.timedelta(days=32)).replace(day=1)
+    cursor = database.get_connection().cursor()
     cursor.execute("""
-        INSERT INTO hall_bookings (hall_id, customer_name, phone, event_date, event_type, services, total_price)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (hall_id, name, phone, date, event_type, services, price))
-    
-    conn.commit()
-    conn.close()
-    return True
+        SELECT h.id, h.name, b.event_date, b.id, b.customer_name, b.event_type
+        FROM halls h
+        LEFT JOIN hall_bookings b ON b.hall_id = h.id AND b.event_date >= ? AND b.event_date < ?
+        ORDER BY h.id
+    """, (first.strftime("%Y-%m-%d"), following.strftime("%Y-%m-%d")))
+
+    calendar = {}
+    for hall_id, hall_name, event_date, booking_id, customer, event_type in cursor.fetchall():
+        if hall_id not in calendar:
+            calendar[hall_id] = (hall_id, hall_name, [None] * (following - first).days)
+        if event_date:
+            calendar[hall_id][2][int(event_date[8:10]) - 1] = (booking_id, customer, event_type)
+    return list(calendar.values())
+
+BOOKINGS_PAGE_SIZE = 25
 
-def get_bookings():
-    conn = sqlite3.connect(DB_NAME)
+def get_bookings(limit=BOOKINGS_PAGE_SIZE, after=None, upcoming=True):
+    """
+    One page of hall bookings: [(id, hall_name, client, date, type, price), ...].
+    upcoming=True: today onwards, soonest first; False: everything, latest first.
+    For the next page pass after=(event_date, id) of the last row you got.
+    """
+    # Keyset paging on the event_date index, like database.get_sales_history()
+    where, params = [], []
+    if upcoming:
+        where.append("b.event_date >= ?")
+        params.append(datetime.date.today().strftime("%Y-%m-%d"))
+    if after:
+        where.append(f"(b.event_date, b.id) {'>' if upcoming else '<'} (?, ?)")
+        params += list(after)
+    direction = "ASC" if upcoming else "DESC"
+
+    conn = database.get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT b.id, h.name, b.customer_name, b.event_date, b.event_type, b.total_price 
         FROM hall_bookings b 
         JOIN halls h ON b.hall_id = h.id
-        ORDER BY b.event_date DESC
-    """)
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY b.event_date {direction}, b.id {direction}
+        LIMIT ?
+    """, params + [limit])
     data = cursor.fetchall()
-    conn.close()
-    return data
\ No newline at end of file
+    return data
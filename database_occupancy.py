@@ -0,0 +1,115 @@
+import datetime
+
+import database
+
+# ==========================================
+# ROOM OCCUPANCY (occupancy %, ADR, RevPAR)
+# ==========================================
+# A stay occupies its room every night from the check-in date to the night
+# before check-out (a same-day stay counts one night). The recursive CTE below
+# expands the stays that touch the range into room-nights inside SQLite, so the
+# work grows with the nights sold in the range, not with the booking history.
+# Archived years are included through history_bookings (database.attach_archives()).
+#
+# Revenue of a room-night is what the stay was billed (nightly rate x billed
+# nights, the figure on the invoice and in daily_sales) spread evenly over its
+# nights; a guest still in house counts at the rate they checked in at.
+# Rooms available = the rooms set up today; the app keeps no history of them.
+#
+#   occupancy % = rooms sold / rooms available
+#   ADR         = room revenue / rooms sold
+#   RevPAR      = room revenue / rooms available
+
+OCCUPANCY_COLUMNS = ["Day", "Room Type", "Available", "Sold", "Occupancy %", "Revenue", "ADR", "RevPAR"]
+
+# group -> (day column, room type column); 'All' where the range / types are summed
+GROUPS = {
+    "day": ("date(d.day)", "'All'"),
+    "room_type": ("'All'", "i.room_type"),
+    "day_room_type": ("date(d.day)", "i.room_type"),
+    "total": ("'All'", "'All'"),
+}
+
+ROOM_NIGHTS_SQL = """
+    WITH RECURSIVE
+    -- Each stay's dates parsed ONCE (MATERIALIZED: otherwise SQLite inlines the
+    -- subquery and re-parses them wherever they are used); nights are julian day numbers.
+    -- short = 1 when the guest left earlier in the day than they arrived: the bill
+    -- counts whole 24 hours, so that last part-day is not charged
+    booked(room_number, room_type, first_night, checkout_day, price, short) AS MATERIALIZED (
+        -- Finished stays (check_out_date index)
+        SELECT b.room_number, COALESCE(r.room_type, '-'),
+               julianday(substr(b.check_in_date, 1, 10)), julianday(substr(b.check_out_date, 1, 10)),
+               COALESCE(b.nightly_rate, r.price_per_night, 0), substr(b.check_out_date, 12) < substr(b.check_in_date, 12)
+        FROM history_bookings b
+        JOIN rooms r ON r.room_number = b.room_number
+        WHERE b.status = 'CHECKED_OUT' AND b.check_out_date >= :start AND b.check_in_date < :day_after
+
+        UNION ALL
+
+        -- Guests in house: occupied up to tonight, at the rate they checked in at
+        SELECT b.room_number, COALESCE(r.room_type, '-'), julianday(substr(b.check_in_date, 1, 10)),
+               julianday(:today) + 1, COALESCE(b.nightly_rate, r.price_per_night, 0), 0
+        FROM bookings b
+        JOIN rooms r ON r.room_number = b.room_number
+        WHERE b.status = 'ACTIVE' AND b.check_in_date < :day_after
+    ),
+    -- One row per room per night inside the range. A stay's bill (rate x billed
+    -- nights, min 1, as on the invoice) is spread evenly over its calendar nights
+    stays(room_number, room_type, night, last_night, rate) AS (
+        SELECT room_number, room_type, MAX(first_night, julianday(:start)),
+               MIN(MAX(first_night, checkout_day - 1), julianday(:end)),
+               price * MAX(1, checkout_day - first_night - short) / MAX(1, checkout_day - first_night)
+        FROM booked
+        WHERE MAX(first_night, julianday(:start)) <= MIN(MAX(first_night, checkout_day - 1), julianday(:end))
+
+        UNION ALL
+
+        SELECT room_number, room_type, night + 1, last_night, rate FROM stays WHERE night < last_night
+    ),
+    days(day) AS (
+        SELECT julianday(:start) UNION ALL SELECT day + 1 FROM days WHERE day < julianday(:end)
+    ),
+    inventory(room_type, rooms) AS (
+        SELECT COALESCE(room_type, '-'), COUNT(*) FROM rooms GROUP BY 1
+    ),
+    nights(night, room_type, sold, revenue) AS (
+        -- DISTINCT: two stays on one room the same night (a same-day check-out and the next guest) sell it once
+        SELECT night, room_type, COUNT(DISTINCT room_number), SUM(rate)
+        FROM stays
+        GROUP BY 1, 2
+    )
+"""
+
+
+def occupancy(start, end, group="day"):
+    """
+    Room figures from start to end (both 'YYYY-MM-DD', inclusive), grouped by
+    'day', 'room_type', 'day_room_type' or 'total'. Returns
+    [(day, room_type, available, sold, occupancy_pct, revenue, adr, revpar), ...]
+    in OCCUPANCY_COLUMNS order; available / sold are room-nights.
+    """
+    day_col, type_col = GROUPS[group]
+    cursor = database.get_connection().cursor()
+    database.attach_archives(cursor.connection)
+    params = {
+        "start": start,
+        "end": end,
+        "day_after": database.next_day(end),
+        "today": datetime.date.today().strftime("%Y-%m-%d"),
+    }
+    cursor.execute(ROOM_NIGHTS_SQL + f"""
+        SELECT day, room_type, available, sold,
+               ROUND(100.0 * sold / available, 1), ROUND(revenue, 2),
+               ROUND(COALESCE(revenue / NULLIF(sold, 0), 0), 2), ROUND(revenue / available, 2)
+        FROM (
+            SELECT {day_col} AS day, {type_col} AS room_type, SUM(i.rooms) AS available,
+                   SUM(COALESCE(n.sold, 0)) AS sold, SUM(COALESCE(n.revenue, 0)) AS revenue
+            FROM days d
+            CROSS JOIN inventory i
+            LEFT JOIN nights n ON n.night = d.day AND n.room_type = i.room_type
+            GROUP BY 1, 2
+        )
+        ORDER BY 1, 2
+    """, params)
+    return cursor.fetchall()
@@ -0,0 +1,166 @@
+import datetime
+
+import database
+
+# ==========================================
+# REPORT ENGINE (any date range, period x dimension)
+# ==========================================
+# Money by order type / tax slab / payment mode comes from the daily_sales
+# rollup (a few rows per day). Category and item figures need the order lines,
+# read once through the order_date index. Either way: ONE query per report.
+# Archived years are included without the caller noticing: category / item
+# figures are summed per file (live + each archive), the transaction list reads
+# the history_* views (see database.attach_archives()).
+
+# period -> SQL bucket for a date column. A week is labelled by its Monday, so a
+# week across New Year stays one bucket ('weekday 0' = the coming Sunday, or the day itself)
+PERIODS = {
+    "day": "date({col})",
+    "week": "date({col}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m', {col})",
+}
+
+# dimension -> (source, SQL expression)
+DIMENSIONS = {
+    "order_type": ("rollup", "order_type"),
+    "tax_rate": ("rollup", "tax_rate"),
+    "payment_mode": ("rollup", "payment_mode"),
+    "category": ("lines", "COALESCE(c.name, 'Uncategorized')"),
+    "item": ("lines", "oi.item_name"),
+}
+
+
+def sales_report(start, end, period="day", dimension="order_type"):
+    """
+    Sales from start to end (both 'YYYY-MM-DD', inclusive), grouped by period and one dimension.
+    Returns [(period, value, subtotal, tax, count), ...] sorted by period then value.
+    count = orders for the rollup dimensions (an order split over two tax slabs counts in both),
+    quantity sold for category / item. Category and item cover food only.
+    """
+    bucket = PERIODS[period]
+    source, expr = DIMENSIONS[dimension]
+    cursor = database.get_connection().cursor()
+
+    if source == "rollup":
+        cursor.execute(f"""
+            SELECT {bucket.format(col="sale_date")}, {expr}, SUM(subtotal), SUM(tax), SUM(orders_count)
+            FROM daily_sales
+            WHERE sale_date >= ? AND sale_date < ?
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """, (start, database.next_day(end)))
+    else:
+        # Aggregated in each file (live + every archive) on its own indexes, then summed;
+        # cheaper than grouping over the history_lines view
+        branch = f"""
+            SELECT {bucket.format(col="o.order_date")} AS period, {expr} AS value, SUM(oi.total_price) AS subtotal,
+                   SUM(oi.total_price * COALESCE(oi.tax_rate, 0) / 100.0) AS tax, SUM(oi.quantity) AS qty
+            FROM {{db}}.orders o
+            JOIN {{db}}.order_items oi ON oi.order_id = o.id
+            LEFT JOIN categories c ON c.id = oi.category_id
+            WHERE o.order_date >= ? AND o.order_date < ? AND o.status != 'OPEN'
+            GROUP BY 1, 2
+        """
+        dbs = ["main"] + database.attach_archives(cursor.connection)
+        cursor.execute(f"""
+            SELECT period, value, SUM(subtotal), SUM(tax), SUM(qty)
+            FROM ({" UNION ALL ".join(branch.format(db=db) for db in dbs)})
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """, (start, database.next_day(end)) * len(dbs))
+    return cursor.fetchall()
+
+
+def month_range(month):
+    """'2025-02' -> ('2025-02-01', '2025-02-28')."""
+    first = datetime.date(int(month[:4]), int(month[5:7]), 1)
+    following = (first + datetime.timedelta(days=32)).replace(day=1)
+    return first.strftime("%Y-%m-%d"), (following - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+GST_COLUMNS = ["Month", "Stream", "GST %", "Taxable Value", "CGST", "SGST", "Total Tax"]
+
+
+def gst_summary(start, end):
+    """
+    GST by month, revenue stream and rate slab, for filing:
+    [(month, stream, tax_rate, taxable, cgst, sgst, total_tax), ...].
+    One GROUP BY over daily_sales, whose tax was computed from each order line's
+    stored rate (rooms at database.ROOM_TAX_RATE), so years of history cost a few
+    thousand rollup rows. Intra-state supply: the tax splits evenly into CGST + SGST.
+    """
+    cursor = database.get_connection().cursor()
+    cursor.execute("""
+        SELECT strftime('%Y-%m', sale_date), stream, tax_rate, ROUND(SUM(subtotal), 2),
+               ROUND(SUM(tax) / 2, 2), ROUND(SUM(tax) / 2, 2), ROUND(SUM(tax), 2)
+        FROM daily_sales
+        WHERE sale_date >= ? AND sale_date < ?
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+    """, (start, database.next_day(end)))
+    return cursor.fetchall()
+
+
+def range_summary(start, end):
+    """Same shape as database.get_daily_report(), for a whole date range."""
+    cursor = database.get_connection().cursor()
+    report = {'food': 0.0, 'rooms': 0.0, 'halls': 0.0, 'total': 0.0}
+    cursor.execute("""
+        SELECT stream, SUM(subtotal) FROM daily_sales
+        WHERE sale_date >= ? AND sale_date < ?
+        GROUP BY stream
+    """, (start, database.next_day(end)))
+    for stream, amount in cursor.fetchall():
+        report[stream] = amount
+    report['total'] = report['food'] + report['rooms'] + report['halls']
+    return report
+
+
+# Food orders and room bookings side by side; columns match the Detailed Transactions table
+TRANSACTIONS_SQL = """
+    SELECT 'FOOD-' || o.id as rec_id, o.opened_at, o.order_type, COALESCE(o.subtotal, 0), o.status,
+           COALESCE(o.customer_name, 'Walk-in Guest'), COALESCE(o.customer_phone, '-')
+    FROM history_orders o
+    WHERE o.opened_at >= ? AND o.opened_at < ?
+
+    UNION ALL
+
+    SELECT 'ROOM-' || b.id, b.check_in_date, 'ROOM_BOOKING', COALESCE(b.nightly_rate, r.price_per_night, 0), 'CONFIRMED',
+           COALESCE(b.guest_name, 'Room Guest'), COALESCE(b.guest_phone, '-')
+    FROM history_bookings b
+    JOIN rooms r ON b.room_number = r.room_number
+    WHERE b.check_in_date >= ? AND b.check_in_date < ?
+"""
+
+TRANSACTION_COLUMNS = 7
+
+
+def get_transactions(start, end):
+    """Food orders and room bookings from start to end, newest first (like database.get_daily_transactions)."""
+    cursor = database.get_connection().cursor()
+    database.attach_archives(cursor.connection)
+    day_after = database.next_day(end)
+    cursor.execute(TRANSACTIONS_SQL + " ORDER BY 2 DESC", (start, day_after, start, day_after))
+    return cursor.fetchall()
+
+
+def open_transactions(start, end, sort_column=1, descending=True, conn=None):
+    """
+    Same rows as get_transactions(), sorted by the database on any column, as a
+    live cursor on a read-only connection (a new one unless `conn` is given).
+    Pull rows with fetchmany() and close cursor.connection when done.
+    """
+    if not 0 <= sort_column < TRANSACTION_COLUMNS:
+        raise ValueError(f"No column {sort_column}")
+    direction = "DESC" if descending else "ASC"
+    day_after = database.next_day(end)
+    reader = conn or database.open_reader()
+    try:
+        database.attach_archives(reader)
+        # Receipt ID breaks ties so the order is stable between runs
+        return reader.execute(TRANSACTIONS_SQL + f" ORDER BY {sort_column + 1} {direction}, 1 {direction}",
+                              (start, day_after, start, day_after))
+    except Exception:
+        if conn is None:
+            reader.close()
+        raise
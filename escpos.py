@@ -0,0 +1,181 @@
+import datetime
+import socket
+import urllib.parse
+
+import database
+
+# ==========================================
+# ESC/POS OUTPUT (thermal KOT / bill printers)
+# ==========================================
+# KOTs and 80mm bills go to the printer as raw ESC/POS bytes: no PDF, no
+# viewer, a few hundred bytes per ticket. Where they go is a setting
+# ('kot_printer' / 'bill_printer'):
+#
+#   ''                          -> no thermal printer: PDF as before (printer.py)
+#   'tcp://192.168.1.50:9100'   -> network printer (raw port, 9100 if left out)
+#   '/dev/usb/lp0', 'COM3', r'\\PC\Kitchen'  -> device / shared printer
+#   'file:kot.bin'              -> appended to a file (testing without a printer)
+#
+# Kitchen stations (database.split_kot) can each have their own printer in the
+# 'station_printers' setting, e.g. 'BAR=tcp://192.168.1.51:9100; PASTRY=COM4';
+# stations not listed use 'kot_printer'.
+
+COLUMNS = 48        # Characters per line, font A on 80mm paper (32 on 58mm)
+SEND_TIMEOUT = 3    # Seconds to reach a network printer
+ENCODING = "cp437"  # The printers' default code page
+
+SINK_SETTINGS = {"kot": "kot_printer", "bill": "bill_printer"}
+
+# --- Commands ---
+ESC, GS = b"\x1b", b"\x1d"
+INIT = ESC + b"@"
+LEFT, CENTER, RIGHT = ESC + b"a\x00", ESC + b"a\x01", ESC + b"a\x02"
+BOLD_ON, BOLD_OFF = ESC + b"E\x01", ESC + b"E\x00"
+NORMAL, DOUBLE_HEIGHT, DOUBLE = GS + b"!\x00", GS + b"!\x01", GS + b"!\x11"
+CUT = GS + b"VA\x03" # Feed 3 dots and cut
+
+
+def feed(lines):
+    return ESC + b"d" + bytes([lines])
+
+
+def qr(data, size=6):
+    """QR code (model 2, error correction M), `size` dots per module."""
+    payload = data.encode("utf-8")
+    store = len(payload) + 3
+    return b"".join([
+        GS + b"(k\x04\x001A2\x00",                                   # Model 2
+        GS + b"(k\x03\x001C" + bytes([size]),                        # Module size
+        GS + b"(k\x03\x001E1",                                       # Error correction M
+        GS + b"(k" + bytes([store % 256, store // 256]) + b"1P0" + payload,  # Store the data
+        GS + b"(k\x03\x001Q0",                                       # Print it
+    ])
+
+
+def text(line):
+    return line.encode(ENCODING, "replace") + b"\n"
+
+
+def columns(left, right, width=COLUMNS):
+    """left and right on one line, right-aligned."""
+    left = left[:max(0, width - len(right) - 1)]
+    return text(left + " " * (width - len(left) - len(right)) + right)
+
+
+def rule(char="-", width=COLUMNS):
+    return text(char * width)
+
+
+# ==========================================
+# TICKETS (same content as the PDF versions in printer.py)
+# ==========================================
+
+def render_kot(table_num, cart_items, station=None, width=COLUMNS):
+    now = datetime.datetime.now()
+    kot_id = f"KOT-{str(table_num).replace(' ', '')}-{now.strftime('%H%M%S')[-4:]}"
+    out = [INIT, CENTER, BOLD_ON, DOUBLE_HEIGHT, text(f"{station or 'KITCHEN'} TICKET"),
+           DOUBLE, text(str(table_num)), NORMAL, BOLD_OFF,
+           text(f"Time: {now.strftime('%d-%b %H:%M')}"), text(f"ID: {kot_id}"),
+           LEFT, rule("=", width), BOLD_ON, text("QTY  ITEM"), BOLD_OFF]
+    for item in cart_items:
+        out += [BOLD_ON, DOUBLE_HEIGHT, text(f"{str(item['qty']):<4} {item['name'][:width - 5]}"), NORMAL, BOLD_OFF]
+        if item.get('note'):
+            out.append(text(f"     * {item['note']}"[:width]))
+        out.append(rule("-", width))
+    out += [feed(3), CUT]
+    return b"".join(out)
+
+
+def render_bill(order_type, table_num, cart_items, total_amount, discount=0, customer=None,
+                upi_id="", payee="", width=COLUMNS):
+    """The 80mm bill; with a UPI ID it ends with a QR code for paying the total."""
+    if order_type == "ROOM_SERVICE":
+        label = f"ROOM: {table_num}"
+    elif order_type == "DINE_IN":
+        label = f"TABLE: {table_num}"
+    else:
+        label = f"TYPE: {order_type} ({table_num})"
+
+    out = [INIT, CENTER, BOLD_ON, DOUBLE, text("GRAND HOTEL"), NORMAL, BOLD_OFF,
+           text("123 Hospitality Lane"), text("Rishikesh, Uttarakhand"),
+           LEFT, rule("-", width),
+           BOLD_ON, columns(f"Order: {label}", datetime.datetime.now().strftime("%d-%b %H:%M"), width), BOLD_OFF]
+    if customer:
+        out.append(text(f"Guest: {customer['name'][:20]}"))
+        if customer.get('address'):
+            out.append(text(f"Addr: {customer['address']}"[:width]))
+    out += [rule("-", width), BOLD_ON, columns(f"{'Item':<{width - 18}}Qty", "Price", width), BOLD_OFF, rule("-", width)]
+
+    subtotal = 0.0
+    total_tax = 0.0
+    for item in cart_items:
+        qty = item['qty']
+        line_total = float(item['price']) * qty
+        tax_rate = item.get('tax_rate', 5.0)
+        subtotal += line_total
+        total_tax += line_total * (tax_rate / 100)
+        out.append(columns(f"{item['name'][:width - 19]:<{width - 18}}{qty}", f"{line_total:.2f}", width))
+        out.append(text(f"  (@ {tax_rate}%)"))
+
+    final_total = subtotal + total_tax - discount
+    out += [rule("-", width), columns("Subtotal:", f"{subtotal:.2f}", width), columns("Tax (Total):", f"{total_tax:.2f}", width)]
+    if discount > 0:
+        out.append(columns("Discount:", f"-{discount:.2f}", width))
+    out += [rule("=", width), BOLD_ON, DOUBLE_HEIGHT, columns("TOTAL:", f"Rs. {final_total:.2f}", width), NORMAL, BOLD_OFF]
+
+    if upi_id:
+        pay = {"pa": upi_id, "pn": payee, "am": f"{final_total:.2f}", "cu": "INR"}
+        link = "upi://pay?" + urllib.parse.urlencode(pay, safe="@", quote_via=urllib.parse.quote)
+        out += [CENTER, feed(1), qr(link), text("Scan to pay (UPI)")]
+    out += [CENTER, feed(1), text("Thank You for Visiting!"), feed(3), CUT]
+    return b"".join(out)
+
+
+RENDERERS = {"kot": render_kot, "bill": render_bill}
+
+
+def station_sinks():
+    """{station: printer} from the 'station_printers' setting."""
+    sinks = {}
+    for entry in database.get_setting("station_printers", "").split(";"):
+        station, _, target = entry.partition("=")
+        if station.strip() and target.strip():
+            sinks[station.strip().upper()] = target.strip()
+    return sinks
+
+
+def sink_for(kind, station=None):
+    """
+    Where tickets of this kind go ('kot' / 'bill'); a KOT for a kitchen station goes
+    to the station's own printer if it has one. '' = no thermal printer, use the PDF.
+    """
+    if kind == "kot" and station:
+        sink = station_sinks().get(station.upper())
+        if sink:
+            return sink
+    setting = SINK_SETTINGS.get(kind)
+    return database.get_setting(setting, "").strip() if setting else ""
+
+
+def ticket(kind, *args, **kwargs):
+    """The ESC/POS bytes of a ticket; args / kwargs are those of printer.render_kot / render_bill."""
+    if kind == "bill":
+        kwargs.setdefault("upi_id", database.get_setting("upi_id", "").strip())
+        kwargs.setdefault("payee", database.get_setting("restaurant_name", "") or "GRAND HOTEL")
+    return RENDERERS[kind](*args, **kwargs)
+
+
+def send(target, data, timeout=None):
+    """Writes raw bytes to a printer (see the sinks at the top). Raises OSError if it can't be reached."""
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rstrip("/").partition(":")
+        if not port.isdigit() and port:
+            raise OSError(f"bad printer port in {target}")
+        with socket.create_connection((host, int(port or 9100)), timeout=timeout or SEND_TIMEOUT) as conn:
+            conn.sendall(data)
+    elif target.startswith("file:"):
+        with open(target[len("file:"):], "ab") as f:
+            f.write(data)
+    else:
+        with open(target, "wb") as f: # Device files take one ticket per open
+            f.write(data)
@@ -1,25 +1,108 @@
-from PyQt6.QtCore import Qt, QSize, QTimer 
+from PyQt6.QtCore import (
+    Qt, QSize, QTimer, QDate, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
+)
 from PyQt6.QtGui import QIcon, QFont, QColor, QPixmap
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QPushButton, QLabel, QGridLayout, QMessageBox, QDialog, QWidget, QGroupBox,
     QScrollArea, QLineEdit, QComboBox, QTableWidget, QTableWidgetItem, QFileDialog,
     QHeaderView, QTabWidget, QFormLayout, QTextEdit, QFrame, QGraphicsDropShadowEffect,
-    QCheckBox, QInputDialog, QListWidget, QStackedWidget, QToolButton, QAbstractItemView
+    QCheckBox, QInputDialog, QListWidget, QStackedWidget, QToolButton, QAbstractItemView,
+    QDateEdit, QProgressDialog, QTableView
 )
 import sys
 import datetime
 import os
 import database
-import printer
+import print_queue
 import database_halls
-import shutil
+import database_reports
+import database_analytics
+import database_occupancy
+import database_export
 import webbrowser
 
 # ==========================================
 # 1. HELPER CLASSES (TOP)
 # ==========================================
 
+class TaskSignals(QObject):
+    done = pyqtSignal(object, object)   # (task, result)
+    failed = pyqtSignal(object, str)    # (task, error message)
+    progress = pyqtSignal(object, object) # (task, what fn passed to report())
+    cancelled = pyqtSignal(object)      # (task) it has stopped after cancel()
+
+class TaskCancelled(Exception):
+    pass
+
+class PrintMonitor(QObject):
+    """Brings print_queue status changes (reported from its background thread) onto the GUI thread."""
+    changed = pyqtSignal(object) # PrintJob
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        print_queue.add_listener(self.changed.emit)
+
+class DbTask(QRunnable):
+    """
+    Runs fn(*args) on a QThreadPool thread and hands the result back to the GUI
+    through signals. The pool thread reads through its own connection
+    (database.get_connection() is per thread); reader=True opens a fresh
+    read-only one instead and calls fn(reader, *args), for results that keep a
+    live cursor after the task ends.
+    cancel() drops the result and interrupts the query if it is still running.
+    progress=True passes fn task.report as its last argument, for long jobs:
+    each call emits signals.progress, and raises once the task is cancelled.
+    """
+    def __init__(self, fn, *args, reader=False, progress=False):
+        super().__init__()
+        self.fn, self.args, self.reader = fn, args + ((self.report,) if progress else ()), reader
+        self.signals = TaskSignals()
+        self.cancelled = False
+        self.conn = None
+
+    def cancel(self):
+        self.cancelled = True
+        conn = self.conn
+        if conn is not None:
+            try:
+                conn.interrupt() # The running statement fails with "interrupted"
+            except Exception:
+                pass # Already closed
+
+    def report(self, *value):
+        if self.cancelled:
+            raise TaskCancelled()
+        self.signals.progress.emit(self, value)
+
+    def run(self):
+        if self.cancelled:
+            self.signals.cancelled.emit(self)
+            return
+        try:
+            if self.reader:
+                self.conn = database.open_reader(same_thread=False)
+                result = self.fn(self.conn, *self.args)
+            else:
+                self.conn = database.get_connection()
+                result = self.fn(*self.args)
+        except Exception as e:
+            if self.reader and self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            if self.cancelled:
+                self.signals.cancelled.emit(self)
+            else:
+                self.signals.failed.emit(self, str(e))
+            return
+        if self.reader and self.cancelled:
+            self.conn.close()
+        self.conn = None
+        if self.cancelled:
+            self.signals.cancelled.emit(self)
+        else:
+            self.signals.done.emit(self, result)
+
 class CustomerDialog(QDialog):
     """Popup to get customer details for Delivery."""
     def __init__(self, parent=None):
@@ -158,9 +241,10 @@ class SettingsWindow(QDialog):
     def setup_info_tab(self):
         l = QFormLayout()
         self.tab_info.setLayout(l)
-        self.inp_name = QLineEdit(database.get_setting("restaurant_name"))
-        self.inp_addr = QLineEdit(database.get_setting("address"))
-        self.inp_phone = QLineEdit(database.get_setting("phone"))
+        settings = database.get_settings()
+        self.inp_name = QLineEdit(settings.get("restaurant_name", ""))
+        self.inp_addr = QLineEdit(settings.get("address", ""))
+        self.inp_phone = QLineEdit(settings.get("phone", ""))
         
         l.addRow("Name:", self.inp_name)
         l.addRow("Address:", self.inp_addr)
@@ -172,9 +256,11 @@ class SettingsWindow(QDialog):
         l.addRow(btn)
 
     def save_info(self):
-        database.save_setting("restaurant_name", self.inp_name.text())
-        database.save_setting("address", self.inp_addr.text())
-        database.save_setting("phone", self.inp_phone.text())
+        database.save_settings({
+            "restaurant_name": self.inp_name.text(),
+            "address": self.inp_addr.text(),
+            "phone": self.inp_phone.text(),
+        })
         QMessageBox.information(self, "Saved", "Info Updated!")
 
     def setup_menu_tab(self):
@@ -350,6 +436,85 @@ class SettingsWindow(QDialog):
         self.tab_sec.setLayout(l)
         l.addWidget(QLabel("Change PINs here (Logic same as before)"))
 
+class TransactionsModel(QAbstractTableModel):
+    """
+    Detailed transactions for a date range, pulled from a database cursor
+    BATCH rows at a time as the view scrolls (canFetchMore / fetchMore).
+    Clicking a header asks for the query to be re-run with that ORDER BY
+    (resort signal) instead of sorting in Python.
+    """
+    HEADERS = ["Receipt ID", "Date", "Order Type", "Amount (₹)", "Status", "Guest Name", "Phone"]
+    BATCH = 500
+    resort = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.cursor = None
+        self.sort_column, self.descending = 1, True # Newest first
+
+    @staticmethod
+    def first_batch(reader, start, end, sort_column, descending):
+        """Runs on a DbTask: the query (and any sort) happens off the GUI thread."""
+        cursor = database_reports.open_transactions(start, end, sort_column, descending, conn=reader)
+        return cursor, cursor.fetchmany(TransactionsModel.BATCH)
+
+    def show_rows(self, cursor, rows):
+        """Takes over the cursor returned by first_batch()."""
+        self.beginResetModel()
+        self.release()
+        self.rows = rows
+        self.cursor = cursor
+        if len(rows) < self.BATCH:
+            self.release()
+        self.endResetModel()
+
+    def release(self):
+        """Closes the reader (all rows read, or nobody is looking any more)."""
+        if self.cursor is not None:
+            self.cursor.connection.close()
+            self.cursor = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        value = self.rows[index.row()][index.column()]
+        if index.column() == 3:
+            return f"₹ {float(value):.2f}"
+        return str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.cursor is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.cursor is None:
+            return
+        batch = self.cursor.fetchmany(self.BATCH)
+        if len(batch) < self.BATCH:
+            self.release() # All read: don't hold the snapshot open
+        if batch:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(batch) - 1)
+            self.rows.extend(batch)
+            self.endInsertRows()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        descending = order == Qt.SortOrder.DescendingOrder
+        if (column, descending) == (self.sort_column, self.descending):
+            return
+        self.sort_column, self.descending = column, descending
+        self.resort.emit()
+
 class ReportsWindow(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -363,15 +528,34 @@ class ReportsWindow(QDialog):
         # --- TOP CONTROLS ---
         top_layout = QHBoxLayout()
         
-        lbl_date = QLabel("📅 Select Date:")
+        lbl_date = QLabel("📅 From:")
         lbl_date.setFont(QFont("Segoe UI", 12, QFont.Weight.Bold))
         top_layout.addWidget(lbl_date)
         
-        self.inp_date = QLineEdit()
-        self.inp_date.setText(datetime.date.today().strftime("%Y-%m-%d"))
-        self.inp_date.setFixedWidth(150)
-        self.inp_date.setStyleSheet("padding: 5px; font-size: 14px; border: 1px solid #ccc; border-radius: 4px; background-color: white;")
-        top_layout.addWidget(self.inp_date)
+        picker_style = "padding: 5px; font-size: 14px; border: 1px solid #ccc; border-radius: 4px; background-color: white;"
+        self.inp_from = QDateEdit(QDate.currentDate())
+        self.inp_to = QDateEdit(QDate.currentDate())
+        for picker in (self.inp_from, self.inp_to):
+            picker.setCalendarPopup(True)
+            picker.setDisplayFormat("yyyy-MM-dd")
+            picker.setFixedWidth(150)
+            picker.setStyleSheet(picker_style)
+        top_layout.addWidget(self.inp_from)
+        lbl_to = QLabel("To:")
+        lbl_to.setFont(QFont("Segoe UI", 12, QFont.Weight.Bold))
+        top_layout.addWidget(lbl_to)
+        top_layout.addWidget(self.inp_to)
+        
+        # Group by: period x dimension
+        self.combo_period = QComboBox()
+        self.combo_period.addItems(list(database_reports.PERIODS))
+        self.combo_dimension = QComboBox()
+        self.combo_dimension.addItems(list(database_reports.DIMENSIONS))
+        for combo in (self.combo_period, self.combo_dimension):
+            combo.setStyleSheet(picker_style)
+        top_layout.addWidget(QLabel("Group by:"))
+        top_layout.addWidget(self.combo_period)
+        top_layout.addWidget(self.combo_dimension)
         
         btn_refresh = QPushButton("🔄 Generate Report")
         btn_refresh.setFixedWidth(150)
@@ -379,25 +563,71 @@ class ReportsWindow(QDialog):
         btn_refresh.clicked.connect(self.load_report)
         top_layout.addWidget(btn_refresh)
         
+        btn_gst = QPushButton("🧾 GST CSV")
+        btn_gst.setToolTip("Taxable value, CGST and SGST per month, stream and rate slab for the chosen dates")
+        btn_gst.setStyleSheet("background-color: #16a085; color: white; padding: 8px; font-weight: bold; border-radius: 4px;")
+        btn_gst.clicked.connect(self.export_gst)
+        top_layout.addWidget(btn_gst)
+        
+        # Busy state while the workers run
+        self.lbl_busy = QLabel("")
+        self.lbl_busy.setStyleSheet("color: #7f8c8d; font-weight: bold;")
+        top_layout.addWidget(self.lbl_busy)
+        self.btn_cancel = QPushButton("✖ Cancel")
+        self.btn_cancel.setStyleSheet("background-color: #c0392b; color: white; padding: 8px; font-weight: bold; border-radius: 4px;")
+        self.btn_cancel.clicked.connect(self.cancel_loading)
+        self.btn_cancel.hide()
+        top_layout.addWidget(self.btn_cancel)
+        
         top_layout.addStretch() # Pushes the controls to the left neatly
         main_layout.addLayout(top_layout)
         
+        # Queries run on the thread pool; tasks holds the ones still out ({name: DbTask})
+        self.tasks = {}
+        self.range = None
+        self.needs_reload = False
+        
+        # A date change cancels whatever is loading and reloads once the picker settles
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(400)
+        self.reload_timer.timeout.connect(self.load_report)
+        for picker in (self.inp_from, self.inp_to):
+            picker.dateChanged.connect(self.date_changed)
+        
         # --- 1. KPI CARDS ROW ---
         self.kpi_layout = QHBoxLayout()
         main_layout.addLayout(self.kpi_layout)
         
-        # --- 2. DETAILED DATA TABLE ---
+        # --- 2. BREAKDOWN (period x dimension) ---
+        self.breakdown = QTableWidget()
+        self.breakdown.setColumnCount(5)
+        self.breakdown.setHorizontalHeaderLabels(["Period", "Group", "Sales (₹)", "Tax (₹)", "Count"])
+        self.breakdown.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.breakdown.setStyleSheet("""
+            QTableWidget { background-color: white; border-radius: 8px; border: 1px solid #ddd; font-size: 13px; }
+            QHeaderView::section { background-color: #ecf0f1; font-weight: bold; padding: 8px; border: none; }
+        """)
+        main_layout.addWidget(self.breakdown)
+        
+        # --- 3. DETAILED DATA TABLE ---
         lbl_details = QLabel("Detailed Transactions")
         lbl_details.setFont(QFont("Segoe UI", 14, QFont.Weight.Bold))
         lbl_details.setStyleSheet("margin-top: 20px; color: #333;")
         main_layout.addWidget(lbl_details)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(["Receipt ID", "Date", "Order Type", "Amount (₹)", "Status", "Guest Name", "Phone"])
+        # A model/view pair: only the rows scrolled into view are ever read or drawn
+        self.model = TransactionsModel(self)
+        self.model.resort.connect(self.refresh_table)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.horizontalHeader().setSortIndicator(self.model.sort_column, Qt.SortOrder.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.verticalHeader().setDefaultSectionSize(28) # Fixed row height, no per-row measuring
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.setStyleSheet("""
-            QTableWidget { background-color: white; border-radius: 8px; border: 1px solid #ddd; font-size: 13px; }
+            QTableView { background-color: white; border-radius: 8px; border: 1px solid #ddd; font-size: 13px; }
             QHeaderView::section { background-color: #ecf0f1; font-weight: bold; padding: 8px; border: none; }
         """)
         main_layout.addWidget(self.table)
@@ -423,43 +653,314 @@ class ReportsWindow(QDialog):
         l.addWidget(lbl_amt)
         self.kpi_layout.addWidget(frame)
 
+    def export_gst(self):
+        start = self.inp_from.date().toString("yyyy-MM-dd")
+        end = self.inp_to.date().toString("yyyy-MM-dd")
+        if end < start:
+            start, end = end, start
+        path, _ = QFileDialog.getSaveFileName(self, "Save GST Summary", f"GST_{start}_{end}.csv", "CSV Files (*.csv)")
+        if not path:
+            return
+        try:
+            rows = database_export.write_gst_csv(path, start, end)
+            QMessageBox.information(self, "GST Summary", f"Saved {rows} slab rows to\n{path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"GST export failed: {e}")
+
+    def run_task(self, name, fn, *args, reader=False):
+        """Starts fn on the pool; the result comes back in task_done() (a newer task with the same name wins)."""
+        if name in self.tasks:
+            self.tasks[name].cancel()
+        task = DbTask(fn, *args, reader=reader)
+        task.signals.done.connect(self.task_done)
+        task.signals.failed.connect(self.task_failed)
+        self.tasks[name] = task
+        QThreadPool.globalInstance().start(task)
+        self.update_busy()
+
+    def _finish(self, task):
+        """Name of the task if it is still the current one, else None."""
+        for name, current in self.tasks.items():
+            if current is task:
+                del self.tasks[name]
+                self.update_busy()
+                return name
+        return None
+
+    def task_done(self, task, result):
+        name = self._finish(task)
+        if name is None or task.cancelled:
+            if task.reader:
+                result[0].connection.close() # Stale detail rows: nobody will read that cursor
+            return
+        if name == "summary":
+            self.show_summary(result)
+        elif name == "breakdown":
+            self.show_breakdown(result)
+        elif name == "detail":
+            self.model.show_rows(*result)
+
+    def task_failed(self, task, error):
+        name = self._finish(task)
+        if name:
+            print(f"Report Error ({name}): {error}")
+
+    def cancel_loading(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks = {}
+        self.update_busy()
+
+    def update_busy(self):
+        if self.tasks:
+            self.lbl_busy.setText("⏳ Loading " + ", ".join(self.tasks) + "...")
+            self.btn_cancel.show()
+        else:
+            self.lbl_busy.setText("")
+            self.btn_cancel.hide()
+
+    def date_changed(self):
+        self.cancel_loading()
+        self.reload_timer.start()
+
     def load_report(self):
+        self.reload_timer.stop()
+        self.cancel_loading()
+        self.needs_reload = False
+        
         # Clear old KPI cards
         for i in reversed(range(self.kpi_layout.count())): 
             widget = self.kpi_layout.itemAt(i).widget()
             if widget: widget.setParent(None)
             
-        date_str = self.inp_date.text()
+        start = self.inp_from.date().toString("yyyy-MM-dd")
+        end = self.inp_to.date().toString("yyyy-MM-dd")
+        if end < start:
+            start, end = end, start
+        self.range = (start, end)
+        self.breakdown.setRowCount(0)
         
-        # 1. Load the Summary Numbers (Your existing function)
-        try:
-            data = database.get_daily_report(date_str)
-            self.create_kpi_card("TOTAL REVENUE", data['total'], "#2c3e50") 
-            self.create_kpi_card("🍔 FOOD SALES", data['food'], "#e67e22") 
-            self.create_kpi_card("🛏️ ROOM REVENUE", data['rooms'], "#27ae60") 
-            self.create_kpi_card("🎉 EVENTS", data['halls'], "#8e44ad") 
-        except Exception as e:
-            print(f"Error loading summary: {e}")
+        # 1. Summary numbers for the whole range (cards show as soon as this lands)
+        self.run_task("summary", database_reports.range_summary, start, end)
+
+        # 2. Breakdown for the chosen grouping
+        self.run_task("breakdown", database_reports.sales_report, start, end,
+                      self.combo_period.currentText(), self.combo_dimension.currentText())
+
+        # 3. The Detailed Table
+        self.refresh_table()
 
-        # 2. Load the Detailed Table
-        self.refresh_table(date_str)
+    def show_summary(self, data):
+        self.create_kpi_card("TOTAL REVENUE", data['total'], "#2c3e50") 
+        self.create_kpi_card("🍔 FOOD SALES", data['food'], "#e67e22") 
+        self.create_kpi_card("🛏️ ROOM REVENUE", data['rooms'], "#27ae60") 
+        self.create_kpi_card("🎉 EVENTS", data['halls'], "#8e44ad") 
+
+    def show_breakdown(self, rows):
+        self.breakdown.setRowCount(len(rows))
+        for r, (period, group, amount, tax, count) in enumerate(rows):
+            self.breakdown.setItem(r, 0, QTableWidgetItem(str(period)))
+            self.breakdown.setItem(r, 1, QTableWidgetItem(str(group)))
+            self.breakdown.setItem(r, 2, QTableWidgetItem(f"₹ {float(amount or 0):,.2f}"))
+            self.breakdown.setItem(r, 3, QTableWidgetItem(f"₹ {float(tax or 0):,.2f}"))
+            self.breakdown.setItem(r, 4, QTableWidgetItem(str(count)))
         
-    def refresh_table(self, date_str):
-        self.table.setRowCount(0)
-        try:
-            transactions = database.get_daily_transactions(date_str)
-            self.table.setRowCount(len(transactions))
-            
-            for r, row in enumerate(transactions):
-                self.table.setItem(r, 0, QTableWidgetItem(str(row[0])))              # ID
-                self.table.setItem(r, 1, QTableWidgetItem(str(row[1])))              # Date
-                self.table.setItem(r, 2, QTableWidgetItem(str(row[2])))              # Type
-                self.table.setItem(r, 3, QTableWidgetItem(f"₹ {float(row[3]):.2f}")) # Amount
-                self.table.setItem(r, 4, QTableWidgetItem(str(row[4])))              # Status
-                self.table.setItem(r, 5, QTableWidgetItem(str(row[5])))              # Guest Name
-                self.table.setItem(r, 6, QTableWidgetItem(str(row[6])))              # Phone
-        except Exception as e:
-            print(f"Table Data Error: {e}")
+    def refresh_table(self):
+        """(Re)loads the detail rows for the current range and sort; also called on a header click."""
+        if self.range:
+            self.run_task("detail", TransactionsModel.first_batch, *self.range,
+                          self.model.sort_column, self.model.descending, reader=True)
+
+    def hideEvent(self, event):
+        # Don't keep queries or a half-read cursor going while nobody is looking
+        if self.tasks or self.model.cursor is not None:
+            self.needs_reload = True
+        self.cancel_loading()
+        self.model.release()
+        super().hideEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.needs_reload:
+            self.load_report()
+
+class AnalyticsTab(QWidget):
+    """Top sellers + hour x weekday heatmap, read from the item_sales_hourly rollup."""
+    RANGES = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last 365 days": 365}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setStyleSheet("background-color: #f4f6f9; font-family: 'Segoe UI';")
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # --- CONTROLS ---
+        top = QHBoxLayout()
+        self.combo_range = QComboBox()
+        self.combo_range.addItems(list(self.RANGES))
+        self.combo_range.setCurrentText("Last 30 days")
+        self.combo_category = QComboBox()
+        self.combo_by = QComboBox()
+        self.combo_by.addItems(["qty", "revenue"])
+        for label, widget in (("📅 Range:", self.combo_range), ("Category:", self.combo_category), ("Rank by:", self.combo_by)):
+            top.addWidget(QLabel(label))
+            top.addWidget(widget)
+        btn_refresh = QPushButton("🔄 Refresh")
+        btn_refresh.setStyleSheet("background-color: #2980b9; color: white; padding: 8px; font-weight: bold; border-radius: 4px;")
+        btn_refresh.clicked.connect(self.load)
+        top.addWidget(btn_refresh)
+        top.addStretch()
+        layout.addLayout(top)
+
+        # --- TOP SELLERS (click one to see its heatmap) ---
+        body = QHBoxLayout()
+        self.table_top = QTableWidget()
+        self.table_top.setColumnCount(4)
+        self.table_top.setHorizontalHeaderLabels(["Item", "Category", "Qty", "Revenue (₹)"])
+        self.table_top.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table_top.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table_top.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_top.itemSelectionChanged.connect(self.load_heatmap)
+        body.addWidget(self.table_top, 2)
+
+        # --- HEATMAP: weekday rows x hour columns ---
+        right = QVBoxLayout()
+        self.lbl_heatmap = QLabel("Whole menu")
+        self.lbl_heatmap.setFont(QFont("Segoe UI", 12, QFont.Weight.Bold))
+        right.addWidget(self.lbl_heatmap)
+        self.table_heat = QTableWidget(7, 24)
+        self.table_heat.setVerticalHeaderLabels(database_analytics.WEEKDAYS)
+        self.table_heat.setHorizontalHeaderLabels([f"{h:02d}" for h in range(24)])
+        self.table_heat.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table_heat.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        right.addWidget(self.table_heat)
+        body.addLayout(right, 3)
+        layout.addLayout(body)
+
+        self.load_categories()
+        self.combo_category.currentIndexChanged.connect(self.load)
+        self.load()
+
+    def load_categories(self):
+        self.combo_category.clear()
+        self.combo_category.addItem("All categories", None)
+        for c_id, c_name, _ in database.get_all_categories():
+            self.combo_category.addItem(c_name, c_id)
+
+    def date_range(self):
+        days = self.RANGES[self.combo_range.currentText()]
+        end = datetime.date.today()
+        return (end - datetime.timedelta(days=days - 1)).strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+    def load(self):
+        start, end = self.date_range()
+        rows = database_analytics.top_sellers(start, end, limit=25, category_id=self.combo_category.currentData(),
+                                              by=self.combo_by.currentText())
+        self.table_top.blockSignals(True)
+        self.table_top.setRowCount(len(rows))
+        for r, (name, category, qty, revenue) in enumerate(rows):
+            self.table_top.setItem(r, 0, QTableWidgetItem(str(name)))
+            self.table_top.setItem(r, 1, QTableWidgetItem(str(category)))
+            self.table_top.setItem(r, 2, QTableWidgetItem(str(qty)))
+            self.table_top.setItem(r, 3, QTableWidgetItem(f"₹ {float(revenue or 0):,.2f}"))
+        self.table_top.clearSelection()
+        self.table_top.blockSignals(False)
+        self.load_heatmap()
+
+    def load_heatmap(self):
+        start, end = self.date_range()
+        selected = self.table_top.selectedItems()
+        item_name = self.table_top.item(selected[0].row(), 0).text() if selected else None
+        category_id = None if item_name else self.combo_category.currentData()
+        self.lbl_heatmap.setText(f"When does it sell? {item_name or self.combo_category.currentText()}")
+
+        grid = database_analytics.heatmap(start, end, item_name=item_name, category_id=category_id)
+        peak = max(max(row) for row in grid) or 1
+        for weekday, hours in enumerate(grid):
+            for hour, qty in enumerate(hours):
+                cell = QTableWidgetItem(str(qty) if qty else "")
+                # White -> orange as the hour gets busier
+                heat = qty / peak
+                cell.setBackground(QColor(255, int(255 - 140 * heat), int(255 - 235 * heat)))
+                cell.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.table_heat.setItem(weekday, hour, cell)
+
+class OccupancyTab(QWidget):
+    """Room occupancy %, ADR and RevPAR per day or per room type (database_occupancy), loaded on the thread pool."""
+    RANGES = AnalyticsTab.RANGES
+    GROUPS = {"Per day": "day", "Per room type": "room_type", "Per day & room type": "day_room_type"}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setStyleSheet("background-color: #f4f6f9; font-family: 'Segoe UI';")
+        self.task = None
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # --- CONTROLS ---
+        top = QHBoxLayout()
+        self.combo_range = QComboBox()
+        self.combo_range.addItems(list(self.RANGES))
+        self.combo_range.setCurrentText("Last 30 days")
+        self.combo_group = QComboBox()
+        self.combo_group.addItems(list(self.GROUPS))
+        for label, widget in (("📅 Range:", self.combo_range), ("Show:", self.combo_group)):
+            top.addWidget(QLabel(label))
+            top.addWidget(widget)
+        btn_refresh = QPushButton("🔄 Refresh")
+        btn_refresh.setStyleSheet("background-color: #2980b9; color: white; padding: 8px; font-weight: bold; border-radius: 4px;")
+        btn_refresh.clicked.connect(self.load)
+        top.addWidget(btn_refresh)
+        top.addStretch()
+        layout.addLayout(top)
+
+        # --- RANGE TOTALS ---
+        self.lbl_totals = QLabel("")
+        self.lbl_totals.setFont(QFont("Segoe UI", 12, QFont.Weight.Bold))
+        layout.addWidget(self.lbl_totals)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(database_occupancy.OCCUPANCY_COLUMNS))
+        self.table.setHorizontalHeaderLabels(database_occupancy.OCCUPANCY_COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.combo_range.currentIndexChanged.connect(self.load)
+        self.combo_group.currentIndexChanged.connect(self.load)
+        self.load()
+
+    def load(self):
+        days = self.RANGES[self.combo_range.currentText()]
+        end = datetime.date.today()
+        start = (end - datetime.timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        if self.task:
+            self.task.cancel()
+        self.task = DbTask(self.fetch, start, end.strftime("%Y-%m-%d"), self.GROUPS[self.combo_group.currentText()])
+        self.task.signals.done.connect(self.show_rows)
+        QThreadPool.globalInstance().start(self.task)
+
+    @staticmethod
+    def fetch(start, end, group):
+        # Runs on a pool thread
+        return database_occupancy.occupancy(start, end, "total"), database_occupancy.occupancy(start, end, group)
+
+    def show_rows(self, task, result):
+        if task is not self.task or task.cancelled:
+            return
+        self.task = None
+        totals, rows = result
+        if totals:
+            _, _, available, sold, occ, revenue, adr, revpar = totals[0]
+            self.lbl_totals.setText(f"Occupancy {occ:.1f} %  ({sold} of {available} room-nights)   |   "
+                                    f"ADR ₹ {adr:,.2f}   |   RevPAR ₹ {revpar:,.2f}   |   Room revenue ₹ {revenue:,.2f}")
+        else:
+            self.lbl_totals.setText("No rooms set up yet.")
+        self.table.setRowCount(len(rows))
+        for r, (day, room_type, available, sold, occ, revenue, adr, revpar) in enumerate(rows):
+            for c, text in enumerate((day, room_type, str(available), str(sold), f"{occ:.1f} %",
+                                      f"₹ {revenue:,.2f}", f"₹ {adr:,.2f}", f"₹ {revpar:,.2f}")):
+                self.table.setItem(r, c, QTableWidgetItem(text))
 
 # ==========================================
 # 4. TABBED INTERFACE COMPONENTS
@@ -711,27 +1212,19 @@ class RoomsTab(QWidget):
         self.dlg.show()
 
     def process_checkout(self, room_num):
-        # 1. Gather Room Data for pricing
-        room_data = database.get_all_rooms()
-        price_per_night = 0
-        for r in room_data:
-            if str(r[0]) == str(room_num):
-                price_per_night = r[2]
-                break
-        
-        # 2. FIX: Fetch full Guest Details (Name, Phone, Check-in)
+        # 1. Fetch full Guest Details (Name, Phone, Check-in) and the rate they checked in at
         guest_details = database.get_active_booking_details(room_num)
         if not guest_details:
             QMessageBox.warning(self, "Error", "No active booking found for this room!")
             return
             
-        guest_name, guest_phone, check_in_date = guest_details
+        guest_name, guest_phone, check_in_date, price_per_night = guest_details
         
-        # 3. Get Food Total
+        # 2. Get Food Total
         food_items = database.get_room_order_items(room_num)
         food_total = sum(item[3] for item in food_items)
         
-        # 4. Checkout Dialog
+        # 3. Checkout Dialog
         dlg = QDialog(self)
         dlg.setWindowTitle("Checkout & Payment")
         v_layout = QVBoxLayout(dlg)
@@ -751,8 +1244,10 @@ class RoomsTab(QWidget):
         v_layout.addWidget(btn_pay)
         
         if dlg.exec() == QDialog.DialogCode.Accepted:
-            # 5. Finalize: Passing the full guest_details tuple now!
-            printer.generate_room_bill(
+            # 4. Finalize: Passing the full guest_details tuple now!
+            print_queue.submit(
+                "room_bill",
+                f"Invoice Room {room_num}",
                 room_num, 
                 guest_details, 
                 food_items, 
@@ -760,9 +1255,8 @@ class RoomsTab(QWidget):
                 combo_pay.currentText()
             )
             
-            # Cleanup database
-            database.checkout_room_orders(room_num)
-            database.check_out_guest(room_num)
+            # Cleanup database (closes the room service on the invoice too)
+            database.check_out_guest(room_num, combo_pay.currentText())
             self.refresh_rooms()
 
 class PartyTab(QWidget):
@@ -781,8 +1275,9 @@ class PartyTab(QWidget):
         
         self.inp_name = QLineEdit()
         self.inp_phone = QLineEdit()
-        self.inp_date = QLineEdit()
-        self.inp_date.setPlaceholderText("YYYY-MM-DD")
+        self.inp_date = QDateEdit(QDate.currentDate())
+        self.inp_date.setCalendarPopup(True)
+        self.inp_date.setDisplayFormat("yyyy-MM-dd")
         self.inp_type = QComboBox()
         self.inp_type.addItems(["Wedding", "Birthday", "Conference", "Party"])
         
@@ -808,18 +1303,45 @@ class PartyTab(QWidget):
         
         self.layout.addWidget(left_frame, stretch=1)
         
-        # --- RIGHT: Upcoming Bookings List ---
+        # --- RIGHT: Month Calendar (halls x days) + Upcoming Bookings List ---
         right_frame = QFrame()
         right_layout = QVBoxLayout()
         right_frame.setLayout(right_layout)
         
+        month_bar = QHBoxLayout()
+        btn_prev = QPushButton("◀")
+        btn_prev.clicked.connect(lambda: self.change_month(-1))
+        btn_next = QPushButton("▶")
+        btn_next.clicked.connect(lambda: self.change_month(1))
+        self.lbl_month = QLabel()
+        self.lbl_month.setFont(QFont("Segoe UI", 12, QFont.Weight.Bold))
+        month_bar.addWidget(QLabel("<b>AVAILABILITY</b>"))
+        month_bar.addStretch()
+        month_bar.addWidget(btn_prev)
+        month_bar.addWidget(self.lbl_month)
+        month_bar.addWidget(btn_next)
+        right_layout.addLayout(month_bar)
+        
+        # Green = free (click to fill the form), purple = booked (hover for the client)
+        self.calendar = QTableWidget()
+        self.calendar.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.calendar.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.calendar.cellClicked.connect(self.pick_day)
+        right_layout.addWidget(self.calendar, stretch=1)
+        
         right_layout.addWidget(QLabel("<b>UPCOMING EVENTS</b>"))
         self.table = QTableWidget()
         self.table.setColumnCount(5)
         self.table.setHorizontalHeaderLabels(["Hall", "Client", "Date", "Type", "Price"])
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
-        right_layout.addWidget(self.table)
-        
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        right_layout.addWidget(self.table, stretch=1)
+        self.btn_more = QPushButton("⬇ Load more")
+        self.btn_more.clicked.connect(self.load_more)
+        right_layout.addWidget(self.btn_more)
+        
+        self.month = QDate.currentDate().addDays(1 - QDate.currentDate().day())
+        self.refresh_calendar()
         self.refresh_bookings()
         self.layout.addWidget(right_frame, stretch=2)
 
@@ -851,7 +1373,7 @@ class PartyTab(QWidget):
             hall_id, 
             self.inp_name.text(), 
             self.inp_phone.text(), 
-            self.inp_date.text(), 
+            self.inp_date.date().toString("yyyy-MM-dd"), 
             self.inp_type.currentText(), 
             ", ".join(services), 
             total
@@ -859,20 +1381,65 @@ class PartyTab(QWidget):
         
         if success:
             QMessageBox.information(self, "Success", f"Hall Booked!\nTotal: ₹{total}")
-            self.refresh_bookings()
         else:
             QMessageBox.warning(self, "Error", "Hall is already booked for this date!")
+        self.refresh_calendar() # Either way: shows the booking, or who got the day first
+        self.refresh_bookings()
+
+    def change_month(self, step):
+        self.month = self.month.addMonths(step)
+        self.refresh_calendar()
+
+    def refresh_calendar(self):
+        self.lbl_month.setText(self.month.toString("MMMM yyyy"))
+        rows = database_halls.month_calendar(self.month.toString("yyyy-MM"))
+        days = self.month.daysInMonth()
+        self.calendar.setRowCount(len(rows))
+        self.calendar.setColumnCount(days)
+        self.calendar.setHorizontalHeaderLabels([str(d) for d in range(1, days + 1)])
+        self.calendar.setVerticalHeaderLabels([name for _, name, _ in rows])
+        self.calendar_halls = [hall_id for hall_id, _, _ in rows]
+        for r, (_, _, booked) in enumerate(rows):
+            for d, booking in enumerate(booked):
+                cell = QTableWidgetItem("●" if booking else "")
+                cell.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                if booking:
+                    cell.setBackground(QColor("#8e44ad"))
+                    cell.setForeground(QColor("white"))
+                    cell.setToolTip(f"{booking[1]} - {booking[2]}")
+                else:
+                    cell.setBackground(QColor("#d5f5e3"))
+                self.calendar.setItem(r, d, cell)
+
+    def pick_day(self, row, column):
+        """A free day clicked on the calendar: put its hall and date into the booking form."""
+        if self.calendar.item(row, column).text():
+            return # Booked
+        for i in range(self.combo_hall.count()):
+            if self.combo_hall.itemData(i)[0] == self.calendar_halls[row]:
+                self.combo_hall.setCurrentIndex(i)
+        self.inp_date.setDate(self.month.addDays(column))
 
     def refresh_bookings(self):
-        data = database_halls.get_bookings()
-        self.table.setRowCount(len(data))
-        for r, row in enumerate(data):
+        self.table.setRowCount(0)
+        self.load_more()
+
+    def load_more(self):
+        """Appends the next page of upcoming events (keyset paging: the last row shown is the bookmark)."""
+        after = self.last_booking if self.table.rowCount() else None
+        data = database_halls.get_bookings(after=after)
+        start = self.table.rowCount()
+        self.table.setRowCount(start + len(data))
+        for r, row in enumerate(data, start):
             # row: (id, hall_name, client, date, type, price)
             self.table.setItem(r, 0, QTableWidgetItem(row[1]))
             self.table.setItem(r, 1, QTableWidgetItem(row[2]))
             self.table.setItem(r, 2, QTableWidgetItem(row[3]))
             self.table.setItem(r, 3, QTableWidgetItem(row[4]))
             self.table.setItem(r, 4, QTableWidgetItem(str(row[5])))
+        if data:
+            self.last_booking = (data[-1][3], data[-1][0])
+        self.btn_more.setEnabled(len(data) == database_halls.BOOKINGS_PAGE_SIZE)
 
 class SettingsTab(QWidget):
     def __init__(self):
@@ -896,11 +1463,20 @@ class SettingsTab(QWidget):
         p1_layout = QFormLayout()
         self.page_info.setLayout(p1_layout)
         
-        self.inp_name = QLineEdit(database.get_setting("restaurant_name"))
-        self.inp_addr = QLineEdit(database.get_setting("address"))
-        self.inp_phone = QLineEdit(database.get_setting("phone"))
-        self.inp_gst = QLineEdit(database.get_setting("gstin"))
-        self.inp_tax = QLineEdit(database.get_setting("tax_rate"))
+        settings = database.get_settings()
+        self.inp_name = QLineEdit(settings.get("restaurant_name", ""))
+        self.inp_addr = QLineEdit(settings.get("address", ""))
+        self.inp_phone = QLineEdit(settings.get("phone", ""))
+        self.inp_gst = QLineEdit(settings.get("gstin", ""))
+        self.inp_tax = QLineEdit(settings.get("tax_rate", ""))
+        self.inp_kot_printer = QLineEdit(settings.get("kot_printer", ""))
+        self.inp_bill_printer = QLineEdit(settings.get("bill_printer", ""))
+        for inp in (self.inp_kot_printer, self.inp_bill_printer):
+            inp.setPlaceholderText("blank = PDF   e.g. tcp://192.168.1.50:9100, /dev/usb/lp0, COM3, file:test.bin")
+        self.inp_station_printers = QLineEdit(settings.get("station_printers", ""))
+        self.inp_station_printers.setPlaceholderText("other stations, e.g. BAR=tcp://192.168.1.51:9100; PASTRY=COM4")
+        self.inp_upi = QLineEdit(settings.get("upi_id", ""))
+        self.inp_upi.setPlaceholderText("e.g. grandhotel@okbank (QR code on thermal bills)")
         
         btn_save_info = QPushButton("💾 Save Business Info")
         btn_save_info.setStyleSheet("background-color: #27ae60; color: white; padding: 10px;")
@@ -912,6 +1488,11 @@ class SettingsTab(QWidget):
         p1_layout.addRow("Phone:", self.inp_phone)
         p1_layout.addRow("GSTIN / Tax ID:", self.inp_gst)
         p1_layout.addRow("Default Tax %:", self.inp_tax)
+        p1_layout.addRow(QLabel("<b>THERMAL PRINTERS (ESC/POS)</b>"))
+        p1_layout.addRow("Kitchen (KOT):", self.inp_kot_printer)
+        p1_layout.addRow("Station KOTs:", self.inp_station_printers)
+        p1_layout.addRow("Bills:", self.inp_bill_printer)
+        p1_layout.addRow("UPI ID:", self.inp_upi)
         p1_layout.addRow(btn_save_info)
         
         self.stack.addWidget(self.page_info)
@@ -988,6 +1569,22 @@ class SettingsTab(QWidget):
         btn_backup.clicked.connect(self.backup_data)
         p3_layout.addWidget(btn_backup)
         
+        # Accountant export: line-level CSVs for a financial year
+        export_row = QHBoxLayout()
+        self.combo_fy = QComboBox()
+        this_fy = datetime.date.today().year - (1 if datetime.date.today().month < 4 else 0)
+        for year in range(this_fy, this_fy - 6, -1):
+            self.combo_fy.addItem(f"FY {year}-{str(year + 1)[2:]}", year)
+        self.chk_gzip = QCheckBox("gzip")
+        self.btn_export = QPushButton("🧾 Export CSV for Accountant")
+        self.btn_export.setFixedHeight(50)
+        self.btn_export.clicked.connect(self.export_csv)
+        self.export_task = None
+        export_row.addWidget(self.combo_fy)
+        export_row.addWidget(self.chk_gzip)
+        export_row.addWidget(self.btn_export, 1)
+        p3_layout.addLayout(export_row)
+        
         btn_reset = QPushButton("⚠️ FACTORY RESET SALES")
         btn_reset.setStyleSheet("background-color: darkred; color: white; font-weight: bold;")
         btn_reset.setFixedHeight(50)
@@ -1001,11 +1598,17 @@ class SettingsTab(QWidget):
         self.stack.setCurrentIndex(row)
 
     def save_info(self):
-        database.save_setting("restaurant_name", self.inp_name.text())
-        database.save_setting("address", self.inp_addr.text())
-        database.save_setting("phone", self.inp_phone.text())
-        database.save_setting("gstin", self.inp_gst.text())
-        database.save_setting("tax_rate", self.inp_tax.text())
+        database.save_settings({
+            "restaurant_name": self.inp_name.text(),
+            "address": self.inp_addr.text(),
+            "phone": self.inp_phone.text(),
+            "gstin": self.inp_gst.text(),
+            "tax_rate": self.inp_tax.text(),
+            "kot_printer": self.inp_kot_printer.text().strip(),
+            "station_printers": self.inp_station_printers.text().strip(),
+            "bill_printer": self.inp_bill_printer.text().strip(),
+            "upi_id": self.inp_upi.text().strip(),
+        })
         QMessageBox.information(self, "Saved", "Business Info Updated!")
 
     def refresh_tables_list(self):
@@ -1054,32 +1657,68 @@ class SettingsTab(QWidget):
             self.refresh_rooms_list()
 
     def backup_data(self):
-        
-        src = database.DB_NAME
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
         default_name = f"Backup_Hotel_{timestamp}.db"
         
         dest, _ = QFileDialog.getSaveFileName(self, "Save Backup", default_name, "Database Files (*.db)")
         if dest:
             try:
-                shutil.copy(src, dest)
+                database.backup_database(dest)
                 QMessageBox.information(self, "Success", "Backup Created Successfully!")
             except Exception as e:
                 QMessageBox.critical(self, "Error", str(e))
 
+    def export_csv(self):
+        folder = QFileDialog.getExistingDirectory(self, "Export to folder")
+        if not folder:
+            return
+        start, end = database_export.financial_year(self.combo_fy.currentData())
+        folder = os.path.join(folder, f"Hotel_Export_{start}_{end}")
+
+        # A year of history takes a while: export on the pool, keep the window live
+        self.export_dlg = QProgressDialog("Exporting...", "Cancel", 0, 100, self)
+        self.export_dlg.setWindowTitle("CSV Export")
+        self.export_dlg.setMinimumDuration(0)
+        self.export_dlg.setAutoClose(False)
+        self.export_dlg.setAutoReset(False)
+
+        self.export_task = DbTask(database_export.export_history, folder, start, end, self.chk_gzip.isChecked(), progress=True)
+        self.export_task.signals.progress.connect(self.export_progress)
+        self.export_task.signals.done.connect(lambda task, written: self.export_finished(
+            "Export Done", f"Saved to {folder}\n\n" + "\n".join(f"{name}: {rows:,} rows" for name, rows in written.items())))
+        self.export_task.signals.failed.connect(lambda task, error: self.export_finished("Export Error", error))
+        self.export_task.signals.cancelled.connect(lambda task: self.export_finished(
+            "Export Cancelled", f"The files in {folder} are incomplete."))
+        self.export_dlg.canceled.connect(self.export_task.cancel)
+        self.btn_export.setEnabled(False)
+        QThreadPool.globalInstance().start(self.export_task)
+
+    def export_progress(self, task, value):
+        name, done, total = value
+        self.export_dlg.setLabelText(f"{name}: {done:,} / {total:,} rows")
+        self.export_dlg.setValue(int(done * 100 / total) if total else 100)
+
+    def export_finished(self, title, message):
+        self.export_task = None
+        self.export_dlg.close()
+        self.btn_export.setEnabled(True)
+        if title == "Export Error":
+            QMessageBox.critical(self, title, message)
+        else:
+            QMessageBox.information(self, title, message)
+
     def reset_sales(self):
         pwd, ok = QInputDialog.getText(self, "Admin Security", "Enter Admin Password to WIPE SALES:", QLineEdit.EchoMode.Password)
         if ok and pwd == "admin123": # Change this to your real password logic
-            confirm = QMessageBox.question(self, "FINAL WARNING", "This will delete ALL Order History.\nAre you sure?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            confirm = QMessageBox.question(self, "FINAL WARNING", "This will delete ALL Order History in the live database.\n(Archived years are kept.)\nAre you sure?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if confirm == QMessageBox.StandardButton.Yes:
-                import sqlite3
-                conn = sqlite3.connect(database.DB_NAME)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM orders")
-                cursor.execute("DELETE FROM order_items")
-                cursor.execute("DELETE FROM bookings")
-                conn.commit()
-                conn.close()
+                def wipe(cursor):
+                    cursor.execute("DELETE FROM orders")
+                    cursor.execute("DELETE FROM order_items")
+                    cursor.execute("DELETE FROM bookings")
+                    database.rebuild_daily_sales() # Rollup keeps only what's left (hall bookings, archives)
+                database.attach_archives() # Can't attach inside the wipe transaction
+                database.run_write(wipe)
                 QMessageBox.information(self, "Reset", "All Sales Data Wiped.")
         elif ok:
              QMessageBox.warning(self, "Error", "Incorrect Password")
@@ -1101,8 +1740,8 @@ class MenuManager(QWidget):
         cat_group.setLayout(cat_vbox)
 
         self.cat_table = QTableWidget()
-        self.cat_table.setColumnCount(3)
-        self.cat_table.setHorizontalHeaderLabels(["ID", "Name", "Tax %"])
+        self.cat_table.setColumnCount(4)
+        self.cat_table.setHorizontalHeaderLabels(["ID", "Name", "Tax %", "Station"])
         self.cat_table.setFixedHeight(180) # Compact height
         self.cat_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
         
@@ -1121,12 +1760,19 @@ class MenuManager(QWidget):
         cat_input_row = QHBoxLayout()
         self.inp_new_cat = QLineEdit(); self.inp_new_cat.setPlaceholderText("New Category Name")
         self.inp_new_tax = QLineEdit("5.0"); self.inp_new_tax.setFixedWidth(50)
+        self.inp_new_station = QLineEdit(); self.inp_new_station.setPlaceholderText(database.DEFAULT_STATION)
+        self.inp_new_station.setFixedWidth(90)
         btn_add_cat = QPushButton("➕")
         btn_add_cat.clicked.connect(self.add_category_logic)
+        btn_station = QPushButton("🍳 Set Station")
+        btn_station.setToolTip("Send the selected category's KOT lines to this station (KITCHEN, BAR, ...)")
+        btn_station.clicked.connect(self.set_station_logic)
         
         cat_input_row.addWidget(self.inp_new_cat)
         cat_input_row.addWidget(self.inp_new_tax)
+        cat_input_row.addWidget(self.inp_new_station)
         cat_input_row.addWidget(btn_add_cat)
+        cat_input_row.addWidget(btn_station)
         cat_vbox.addLayout(cat_input_row)
 
         btn_del_cat = QPushButton("🗑️ Delete Category")
@@ -1213,11 +1859,13 @@ class MenuManager(QWidget):
         self.cat_table.setRowCount(0)
         self.inp_cat.clear()
         cats = database.get_all_categories()
+        stations = database.get_category_stations()
         for r, (cid, name, tax) in enumerate(cats):
             self.cat_table.insertRow(r)
             self.cat_table.setItem(r, 0, QTableWidgetItem(str(cid)))
             self.cat_table.setItem(r, 1, QTableWidgetItem(name))
             self.cat_table.setItem(r, 2, QTableWidgetItem(str(tax)))
+            self.cat_table.setItem(r, 3, QTableWidgetItem(stations.get(cid, database.DEFAULT_STATION)))
             self.inp_cat.addItem(name, cid) 
 
         self.refresh_table()
@@ -1226,10 +1874,19 @@ class MenuManager(QWidget):
         name = self.inp_new_cat.text().upper().strip()
         try: tax = float(self.inp_new_tax.text())
         except: tax = 5.0
-        if name and database.add_category(name, tax):
+        if name and database.add_category(name, tax, self.inp_new_station.text()):
             self.inp_new_cat.clear()
             self.refresh_all_data()
 
+    def set_station_logic(self):
+        row = self.cat_table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Station", "Select a category first.")
+            return
+        cid = int(self.cat_table.item(row, 0).text())
+        database.set_category_station(cid, self.inp_new_station.text())
+        self.refresh_all_data()
+
     def delete_category_logic(self):
         row = self.cat_table.currentRow()
         if row >= 0:
@@ -1360,6 +2017,9 @@ class POSInterface(QWidget):
         # --- TRACKING STATE ---
         self.current_category = "ALL ITEMS" # Tracks active sidebar selection
         self.all_items = [] # Stores full database menu
+        self.items_by_category = {} # Same items, grouped by category name
+        self.menu_gen = None # database.menu_generation() of the menu / categories on screen
+        self.cats_gen = None
         
         self.db_price_mode = "DELIVERY" if mode == "DELIVERY" else "DINE_IN"
         
@@ -1482,6 +2142,9 @@ class POSInterface(QWidget):
         form_layout.addRow("Subtotal:", self.lbl_subtotal)
         form_layout.addRow("Tax:", self.lbl_tax)
         form_layout.addRow("Discount (%):", self.inp_discount)
+        self.combo_payment = QComboBox()
+        self.combo_payment.addItems(["CASH", "UPI / QR", "CARD"])
+        form_layout.addRow("Payment:", self.combo_payment)
         form_layout.addRow("TOTAL:", self.lbl_final)
         cart_layout.addWidget(form_frame)
         
@@ -1517,11 +2180,15 @@ class POSInterface(QWidget):
         cart_layout.addLayout(btn_box)
         self.layout.addWidget(self.cart_frame)
         
-        self.all_items = []
         self.refresh_menu()
         if self.cart: self.update_cart_ui()
     
     def refresh_categories(self):
+        # 0. Nothing to do if the categories didn't change since the last build
+        if self.cats_gen == database.menu_generation():
+            return
+        self.cats_gen = database.menu_generation()
+
         # 1. Clear existing widgets in cat_layout
         while self.cat_layout.count():
             child = self.cat_layout.takeAt(0)
@@ -1551,7 +2218,11 @@ class POSInterface(QWidget):
         self.cat_layout.addStretch()
 
     def refresh_menu(self):
+        if self.menu_gen == database.menu_generation():
+            return # Menu unchanged, the grid on screen is still right
+        self.menu_gen = database.menu_generation()
         self.all_items = database.get_menu_items(self.db_price_mode)
+        self.items_by_category = database.get_menu_by_category(self.db_price_mode)
         self.apply_filter()
 
     def render_menu_items(self, items):
@@ -1657,11 +2328,11 @@ class POSInterface(QWidget):
 
     def apply_filter(self):
         search_text = self.search_bar.text().lower()
-        filtered = [
-            i for i in self.all_items 
-            if (self.current_category == "ALL ITEMS" or i['category'] == self.current_category)
-            and (search_text in i['name'].lower())
-        ]
+        if self.current_category == "ALL ITEMS":
+            pool = self.all_items
+        else:
+            pool = self.items_by_category.get(self.current_category, [])
+        filtered = [i for i in pool if search_text in i['name'].lower()]
         self.render_menu_items(filtered)
 
     def add_to_cart(self, item_data):
@@ -1677,6 +2348,7 @@ class POSInterface(QWidget):
 
         # 2. If new (or only modified versions exist), create fresh entry
         new_item = {
+            'line_id': None, # Filled in by database.save_order once the line is saved
             'id': item_data['id'],
             'name': item_data['name'],
             'price': float(item_data['price']), 
@@ -1813,18 +2485,10 @@ class POSInterface(QWidget):
             QMessageBox.warning(self, "Empty Order", "Please add items before sending to Kitchen.")
             return
 
-        # 2. Calculate New Items
-        items_to_print = []
-        for item in self.cart:
-            current_qty = item['qty']
-            printed_qty = item.get('printed', 0)
-            if current_qty > printed_qty:
-                new_qty = current_qty - printed_qty
-                print_item = item.copy()
-                print_item['qty'] = new_qty
-                items_to_print.append(print_item)
+        # 2. Lines with new quantity since the last KOT
+        new_lines = [item for item in self.cart if item['qty'] > item.get('printed', 0)]
         
-        if not items_to_print:
+        if not new_lines:
             self.lbl_alert.setText("⚠️ No new items to print")
             self.lbl_alert.show()
             QTimer.singleShot(1500, lambda: self.lbl_alert.hide())
@@ -1837,7 +2501,7 @@ class POSInterface(QWidget):
         if self.tab_ref and hasattr(self.tab_ref, 'refresh_tables'):
             self.tab_ref.refresh_tables()
 
-        # 4. Print KOT Logic
+        # 4. Print KOT Logic: one ticket per kitchen station (only the new quantity on it)
         if self.is_room:
             label = f"ROOM {self.table_num}"
         elif self.mode == "TAKEOUT":
@@ -1847,10 +2511,13 @@ class POSInterface(QWidget):
         else:
             label = f"TABLE {self.table_num}"
             
-        printer.generate_kot(label, items_to_print)
-        database.mark_kot_printed(self.table_num, is_room=self.is_room)
+        items_to_print = [dict(item, qty=item['qty'] - item.get('printed', 0)) for item in new_lines]
+        print_queue.submit_kots(f"KOT {label}", label, items_to_print)
+        # Each line is marked with the quantity its station's ticket carried
+        database.mark_kot_printed(self.table_num, is_room=self.is_room,
+                                  lines=[(item['qty'], item['line_id']) for item in new_lines])
         
-        # 5. Update Local Cart
+        # 5. Update Local Cart (lines cut below their printed qty were clamped by save_order)
         for item in self.cart:
             item['printed'] = item['qty']
         self.update_cart_ui() 
@@ -1878,7 +2545,9 @@ class POSInterface(QWidget):
         final_total = gross_total - discount_amount
 
         # 2. Print
-        printer.generate_bill(
+        print_queue.submit(
+            "bill",
+            f"Bill {self.table_num}",
             order_type=self.mode, 
             table_num=self.table_num, 
             cart_items=self.cart, 
@@ -1889,9 +2558,9 @@ class POSInterface(QWidget):
         
         # 3. Checkout Logic
         if self.mode == "ROOM_SERVICE":
-            database.checkout_room_orders(self.table_num) 
+            database.checkout_room_orders(self.table_num, self.combo_payment.currentText(), discount_amount)
         else:
-            database.checkout_table(self.table_num) 
+            database.checkout_table(self.table_num, self.combo_payment.currentText(), discount_amount)
         
         # --- UNIVERSAL REFRESH ---
         if self.tab_ref:
@@ -1921,10 +2590,13 @@ class POSInterface(QWidget):
             if not self.customer_info: 
                 return
             
-            database.save_delivery_order(self.cart, self.customer_info['name'], self.customer_info['phone'], self.customer_info['address'])
-            printer.generate_kot("DELIVERY", self.cart)
+            database.save_delivery_order(self.cart, self.customer_info['name'], self.customer_info['phone'], self.customer_info['address'],
+                                         self.combo_payment.currentText(), discount_amt)
+            print_queue.submit_kots("KOT DELIVERY", "DELIVERY", self.cart)
             
-            printer.generate_bill(
+            print_queue.submit(
+                "bill",
+                "Bill DELIVERY",
                 order_type="DELIVERY", 
                 table_num="", 
                 cart_items=self.cart, 
@@ -1934,10 +2606,12 @@ class POSInterface(QWidget):
             )
             
         elif self.mode == "TAKEOUT":
-            database.save_takeout_order(self.cart)
-            printer.generate_kot("TAKEOUT", self.cart)
+            database.save_takeout_order(self.cart, self.combo_payment.currentText(), discount_amt)
+            print_queue.submit_kots("KOT TAKEOUT", "TAKEOUT", self.cart)
             
-            printer.generate_bill(
+            print_queue.submit(
+                "bill",
+                "Bill TAKEOUT",
                 order_type="TAKEOUT", 
                 table_num="", 
                 cart_items=self.cart, 
@@ -1981,6 +2655,14 @@ class AdminWindow(QMainWindow):
         self.tab_reports = ReportsWindow() 
         self.tabs.addTab(self.tab_reports, "📊 Sales Reports")
         
+        # 1b. Item Analytics (top sellers + hourly heatmap)
+        self.tab_analytics = AnalyticsTab()
+        self.tabs.addTab(self.tab_analytics, "📈 Item Analytics")
+        
+        # 1c. Room occupancy, ADR and RevPAR
+        self.tab_occupancy = OccupancyTab()
+        self.tabs.addTab(self.tab_occupancy, "🛏️ Occupancy")
+        
         # 2. Menu Manager Tab (The class we just added above)
         self.tab_menu = MenuManager()
         self.tabs.addTab(self.tab_menu, "🍔 Menu Manager")
@@ -2031,6 +2713,19 @@ class HotelApp(QMainWindow):
         self.tab_party = PartyTab(self)
         self.tabs.addTab(self.tab_party, "🎉 Party & Events")
 
+        # Tickets print in the background; their progress shows in the status bar
+        self.print_monitor = PrintMonitor(self)
+        self.print_monitor.changed.connect(self.print_status)
+
+    def print_status(self, job):
+        note = f" - retrying ({job.error})" if job.status == print_queue.QUEUED and job.error else ""
+        self.statusBar().showMessage(f"🖨️ {job.label}: {job.status}{note}", 8000)
+        if job.status == print_queue.FAILED:
+            answer = QMessageBox.question(self, "Print Failed",
+                                          f"{job.label} could not be printed:\n{job.error}\n\nTry again?")
+            if answer == QMessageBox.StandardButton.Yes:
+                print_queue.retry(job)
+
     def setup_menu_bar(self):
         menu = self.menuBar()
 
@@ -2082,6 +2777,8 @@ if __name__ == "__main__":
     database_halls.init_hall_db()
     print("Database Ready.")
     
+    app.aboutToQuit.connect(print_queue.shutdown) # Tickets still in the queue finish first
+    
     login = LoginWindow()
     if login.exec():
         window = HotelApp(login.user_role)
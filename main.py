@@ -40,8 +40,7 @@ def restaurant_menu():
     t = input("Table No: ")
     
     # FETCH REAL MENU FROM DB
-    import sqlite3
-    conn = sqlite3.connect('hotel_restaurant.db')
+    conn = database.get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id, name, price FROM items")
     items = cursor.fetchall()
@@ -49,7 +48,6 @@ def restaurant_menu():
     print("\n--- CURRENT MENU ---")
     for item in items:
         print(f"{item[0]}. {item[1]} (Rs.{item[2]})")
-    conn.close()
     
     i = int(input("Item ID: "))
     q = int(input("Qty: "))
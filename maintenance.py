@@ -0,0 +1,163 @@
+"""
+Maintenance commands for the POS database (run them on the machine that holds
+hotel_restaurant.db, preferably outside service hours).
+
+    python maintenance.py rebuild-rollup                          # whole history
+    python maintenance.py rebuild-rollup --from 2025-04-01 --to 2025-04-30
+    python maintenance.py export --fy 2024 --out exports/FY2024 --gzip
+    python maintenance.py export --from 2025-01-01 --to 2025-01-31 --out exports/jan
+    python maintenance.py archive --days 365 --vacuum                # move old history to per-year files
+    python maintenance.py gst --month 2025-04 --out gst_apr.csv       # GST by rate slab for filing
+    python maintenance.py occupancy --from 2025-04-01 --to 2025-04-30 --by room_type
+    python maintenance.py invoices --month 2025-04 --out invoices/apr   # copies of every bill / room invoice
+"""
+import argparse
+import sys
+import time
+
+import bulk_invoices
+import database
+import database_archive
+import database_export
+import database_reports
+import database_occupancy
+
+
+def cmd_rebuild_rollup(args):
+    rows = database.rebuild_daily_sales(args.date_from, args.date_to)
+    span = f"{args.date_from or 'start'} .. {args.date_to or 'today'}"
+    print(f"✅ Sales rollups rebuilt for {span}: {rows} rows written.")
+
+
+def cmd_export(args):
+    if args.fy:
+        start, end = database_export.financial_year(args.fy)
+    elif args.date_from and args.date_to:
+        start, end = args.date_from, args.date_to
+    else:
+        raise SystemExit("❌ Give --fy YEAR or both --from and --to")
+
+    def progress(name, done, total):
+        sys.stdout.write(f"\r  {name:<14}{done:>9} / {total}")
+        sys.stdout.flush()
+        if done == total:
+            sys.stdout.write("\n")
+
+    print(f"📤 Exporting {start} .. {end} to {args.out}")
+    written = database_export.export_history(args.out, start, end, compress=args.gzip, progress=progress)
+    print(f"✅ Export done: {sum(written.values())} rows in {len(written)} files.")
+
+
+def cmd_archive(args):
+    print(f"📦 Archiving closed orders and stays older than {args.days} days...")
+    moved = database_archive.archive_history(args.days, progress=lambda year, counts: print(
+        f"  {year}: {counts['orders']} orders, {counts['order_items']} lines, {counts['bookings']} bookings"
+        f" -> {database.archive_path(year)}"))
+    if not moved:
+        print("✅ Nothing old enough to archive.")
+        return
+    if args.vacuum:
+        print("🧹 Compacting the live database...")
+        database_archive.compact()
+    print("✅ Archive done.")
+
+
+def cmd_gst(args):
+    if args.month:
+        start, end = database_reports.month_range(args.month)
+    elif args.date_from and args.date_to:
+        start, end = args.date_from, args.date_to
+    else:
+        raise SystemExit("❌ Give --month YYYY-MM or both --from and --to")
+
+    rows = database_reports.gst_summary(start, end)
+    print(f"🧾 GST summary {start} .. {end}")
+    print("".join(f"{col:>14}" for col in database_reports.GST_COLUMNS))
+    for row in rows:
+        print("".join(f"{value:>14}" if isinstance(value, str) else f"{value:>14,.2f}" for value in row))
+    if args.out:
+        database_export.write_gst_csv(args.out, start, end)
+        print(f"✅ Saved to {args.out}")
+
+
+def cmd_occupancy(args):
+    database.init_room_db() # Brings the bookings columns up to date on a DB the app hasn't opened since
+    rows = database_occupancy.occupancy(args.date_from, args.date_to, args.by)
+    print(f"🛏️ Room occupancy {args.date_from} .. {args.date_to}")
+    print("".join(f"{col:>13}" for col in database_occupancy.OCCUPANCY_COLUMNS))
+    for row in rows:
+        print("".join(f"{value:>13}" if isinstance(value, str) else f"{value:>13,}" for value in row))
+
+
+def cmd_invoices(args):
+    if args.month:
+        start, end = database_reports.month_range(args.month)
+    elif args.date_from and args.date_to:
+        start, end = args.date_from, args.date_to
+    else:
+        raise SystemExit("❌ Give --month YYYY-MM or both --from and --to")
+    database.init_room_db()
+
+    def progress(done):
+        sys.stdout.write(f"\r  {done} tickets")
+        sys.stdout.flush()
+
+    print(f"🧾 Rendering the bills and room invoices of {start} .. {end} into {args.out}")
+    began = time.perf_counter()
+    result = bulk_invoices.regenerate(args.out, start, end, args.workers, progress)
+    sys.stdout.write("\n")
+    for error in result["failed"]:
+        print(f"❌ {error}")
+    print(f"✅ {result['tickets']} PDFs in {time.perf_counter() - began:.1f}s, listed in {args.out}/index.csv.")
+    if result["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="POS database maintenance")
+    parser.add_argument("--db", default=database.DB_NAME, help="database file (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_roll = sub.add_parser("rebuild-rollup", help="recompute the daily / item-hourly sales rollups from history")
+    p_roll.add_argument("--from", dest="date_from", help="first day, YYYY-MM-DD")
+    p_roll.add_argument("--to", dest="date_to", help="last day, YYYY-MM-DD")
+    p_roll.set_defaults(func=cmd_rebuild_rollup)
+
+    p_exp = sub.add_parser("export", help="stream order / booking history to CSV for the accountant")
+    p_exp.add_argument("--fy", type=int, help="financial year starting in April of YEAR")
+    p_exp.add_argument("--from", dest="date_from", help="first day, YYYY-MM-DD")
+    p_exp.add_argument("--to", dest="date_to", help="last day, YYYY-MM-DD")
+    p_exp.add_argument("--out", default="export", help="output folder")
+    p_exp.add_argument("--gzip", action="store_true", help="write .csv.gz files")
+    p_exp.set_defaults(func=cmd_export)
+
+    p_arch = sub.add_parser("archive", help="move old closed orders / checked-out stays into per-year archive files")
+    p_arch.add_argument("--days", type=int, default=365, help="keep this many days in the live DB (default: %(default)s)")
+    p_arch.add_argument("--vacuum", action="store_true", help="shrink the live DB file afterwards (needs a quiet moment)")
+    p_arch.set_defaults(func=cmd_archive)
+
+    p_gst = sub.add_parser("gst", help="taxable value / CGST / SGST per month, stream and rate slab")
+    p_gst.add_argument("--month", help="YYYY-MM")
+    p_gst.add_argument("--from", dest="date_from", help="first day, YYYY-MM-DD")
+    p_gst.add_argument("--to", dest="date_to", help="last day, YYYY-MM-DD")
+    p_gst.add_argument("--out", help="also write the summary to this CSV file")
+    p_gst.set_defaults(func=cmd_gst)
+
+    p_occ = sub.add_parser("occupancy", help="occupancy %%, ADR and RevPAR for a date range")
+    p_occ.add_argument("--from", dest="date_from", required=True, help="first day, YYYY-MM-DD")
+    p_occ.add_argument("--to", dest="date_to", required=True, help="last day, YYYY-MM-DD")
+    p_occ.add_argument("--by", choices=list(database_occupancy.GROUPS), default="day")
+    p_occ.set_defaults(func=cmd_occupancy)
+
+    p_inv = sub.add_parser("invoices", help="re-render every bill / room invoice of a date range, with an index")
+    p_inv.add_argument("--month", help="YYYY-MM")
+    p_inv.add_argument("--from", dest="date_from", help="first day, YYYY-MM-DD")
+    p_inv.add_argument("--to", dest="date_to", help="last day, YYYY-MM-DD")
+    p_inv.add_argument("--out", default="invoices", help="output folder (default: %(default)s)")
+    p_inv.add_argument("--workers", type=int, help="render processes (default: one per CPU)")
+    p_inv.set_defaults(func=cmd_invoices)
+
+    args = parser.parse_args()
+    database.DB_NAME = args.db
+    database.init_db()
+    args.func(args)
@@ -0,0 +1,238 @@
+import concurrent.futures
+import copy
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import database
+import escpos
+import printer
+
+# ==========================================
+# BACKGROUND PRINT QUEUE (bills, KOTs, room invoices)
+# ==========================================
+# The GUI calls submit() and carries on: reportlab draws the PDF in a pool of
+# worker processes, then the PDF is delivered (printer.deliver) from the pool's
+# callback thread. Every job reports its status to the listeners:
+#
+#   queued -> rendered -> delivered
+#
+# A failed render or delivery is tried again after RETRY_DELAY x attempt
+# seconds (a delivery retry reuses the PDF already rendered); after
+# MAX_ATTEMPTS the job is 'failed' and retry() starts it over.
+# Listeners are called from a background thread: the GUI hands them to Qt
+# with a signal (see PrintMonitor in gui.py).
+#
+# KOTs / bills for a thermal printer (escpos.sink_for) skip the pool: their
+# ESC/POS bytes take well under a millisecond to build, so submit() builds them
+# and a sender thread per printer writes them out, in order; one slow or
+# unplugged printer doesn't hold up the others. When the printer is still
+# unreachable after MAX_ATTEMPTS the job falls back to the PDF.
+#
+# submit_kots() splits a KOT batch into one ticket per kitchen station
+# (database.split_kot); the station tickets render / print in parallel.
+
+QUEUED, RENDERED, DELIVERED, FAILED = "queued", "rendered", "delivered", "failed"
+
+WORKERS = 2          # Render processes; a ticket takes tens of ms, two keep up with a busy lunch
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 1.0    # Seconds before the 2nd attempt, 2x before the 3rd
+
+RENDERERS = {
+    "kot": printer.render_kot,
+    "bill": printer.render_bill,
+    "room_bill": printer.render_room_bill,
+}
+
+_pool = None
+_senders = {} # printer -> its sender thread
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_listeners = []
+
+
+class PrintJob:
+    """One ticket to print. status / error / filename change as it moves through the queue."""
+    def __init__(self, kind, label, args, kwargs):
+        self.id = next(_ids)
+        self.kind, self.label, self.args, self.kwargs = kind, label, args, kwargs
+        self.status = QUEUED
+        self.attempts = 0
+        self.filename = None
+        self.error = None
+        self.sink = None  # Thermal printer the ESC/POS bytes go to; None = PDF
+        self.data = None
+
+
+def add_listener(fn):
+    """fn(job) is called on every status change, from a background thread."""
+    _listeners.append(fn)
+
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def _set(job, status, error=None):
+    job.status, job.error = status, error
+    for fn in list(_listeners):
+        try:
+            fn(job)
+        except Exception as e:
+            print(f"❌ Print listener error: {e}")
+
+
+def _render(kind, args, kwargs):
+    # Runs in a worker process
+    return RENDERERS[kind](*args, **kwargs)
+
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn everywhere: forking the running Qt app (Linux / macOS default) is not safe
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=WORKERS,
+                                                           mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _send_executor(sink):
+    with _lock:
+        if sink not in _senders:
+            _senders[sink] = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="escpos")
+        return _senders[sink]
+
+
+def _drop_pool(broken):
+    """A worker died (e.g. killed): the next job starts a fresh pool."""
+    global _pool
+    with _lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(kind, label, *args, **kwargs):
+    """
+    Queues a print and returns its PrintJob straight away. kind is 'kot', 'bill'
+    or 'room_bill'; args / kwargs are those of the printer.render_* function.
+    label names the ticket in status messages, e.g. 'KOT TABLE 5'.
+    """
+    # Copied now: the pool pickles them later, and the caller goes on changing its cart
+    args, kwargs = copy.deepcopy(args), copy.deepcopy(kwargs)
+    if kind == "room_bill" and kwargs.get("hotel") is None and len(args) < 6:
+        kwargs["hotel"] = printer.hotel_info() # Read here: the workers don't open the DB
+    job = PrintJob(kind, label, args, kwargs)
+    job.sink = escpos.sink_for(kind, kwargs.get("station"))
+    _set(job, QUEUED)
+    if job.sink:
+        job.data = escpos.ticket(kind, *args, **kwargs)
+        _set(job, RENDERED)
+    _attempt(job)
+    return job
+
+
+def submit_kots(label, table_num, cart_items):
+    """
+    Queues one KOT per kitchen station for the cart lines and returns
+    {station: PrintJob}. label names the ticket, e.g. 'KOT TABLE 5'.
+    """
+    tickets = database.split_kot(cart_items)
+    return {station: submit("kot", label if len(tickets) == 1 else f"{label} ({station})", table_num, lines, station=station)
+            for station, lines in tickets.items()}
+
+
+def retry(job):
+    """Starts a failed job again, with a fresh set of attempts."""
+    job.attempts = 0
+    _set(job, QUEUED, job.error)
+    _attempt(job)
+
+
+def _attempt(job):
+    job.attempts += 1
+    if job.sink:
+        try:
+            _send_executor(job.sink).submit(_send, job)
+        except RuntimeError as e: # Sender shut down (app closing)
+            _set(job, FAILED, str(e))
+        return
+    if job.filename:
+        _deliver(job) # Rendered fine last time; only the delivery failed
+        return
+    pool = _executor()
+    try:
+        future = pool.submit(_render, job.kind, job.args, job.kwargs)
+    except BrokenProcessPool as e:
+        _drop_pool(pool)
+        _failed(job, f"print worker crashed: {e}")
+        return
+    except RuntimeError as e: # Pool shut down (app closing)
+        _set(job, FAILED, str(e))
+        return
+    future.add_done_callback(lambda f: _rendered(job, pool, f))
+
+
+def _rendered(job, pool, future):
+    try:
+        job.filename = future.result()
+    except BrokenProcessPool as e:
+        _drop_pool(pool)
+        _failed(job, f"print worker crashed: {e}")
+        return
+    except Exception as e:
+        _failed(job, f"render: {e}")
+        return
+    _set(job, RENDERED)
+    _deliver(job)
+
+
+def _deliver(job):
+    try:
+        printer.deliver(job.filename, job.kind)
+    except Exception as e:
+        _failed(job, f"delivery: {e}")
+        return
+    _set(job, DELIVERED)
+
+
+def _send(job):
+    try:
+        escpos.send(job.sink, job.data)
+    except OSError as e:
+        _failed(job, f"printer {job.sink}: {e}")
+        return
+    _set(job, DELIVERED)
+
+
+def _failed(job, error):
+    if job.attempts >= MAX_ATTEMPTS and job.sink:
+        # Thermal printer still unreachable: print the PDF instead
+        job.sink = job.data = None
+        job.attempts = 0
+        _set(job, QUEUED, f"{error}; printing the PDF instead")
+        _attempt(job)
+        return
+    if job.attempts >= MAX_ATTEMPTS:
+        _set(job, FAILED, error)
+        return
+    _set(job, QUEUED, error) # Back in the queue, with the reason
+    timer = threading.Timer(RETRY_DELAY * job.attempts, _attempt, (job,))
+    timer.daemon = True
+    timer.start()
+
+
+def shutdown(wait=True):
+    """Lets queued tickets finish (wait=True) and stops the workers. Call it when the app closes."""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+        senders = list(_senders.values())
+        _senders.clear()
+    for sender in senders:
+        sender.shutdown(wait=wait)
+    if pool is not None:
+        pool.shutdown(wait=wait)
@@ -1,3 +1,4 @@
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
 from reportlab.lib.pagesizes import A4
@@ -5,6 +6,7 @@ import datetime
 import os
 import subprocess
 import database as database
+import escpos
 
 def num_to_words(num):
     """Converts a number to words (Simplified for common currency)."""
@@ -30,55 +32,233 @@ def num_to_words(num):
         else: return num_to_words(num // k) + ' Thousand, ' + num_to_words(num % k)
     return str(num)
 
+# ==========================================
+# RENDER (build the PDF) / DELIVER (open or print it)
+# ==========================================
+# render_* only draw: no DB access unless the caller leaves out the hotel
+# details, so print_queue.py can run them in worker processes. Each returns
+# the absolute path of the PDF. generate_* do both steps right away, or send a
+# KOT / bill straight to a thermal printer when one is set up (send_raw).
+
+# Page streams are still zlib-compressed, just not ASCII85-wrapped on top: without
+# reportlab's C accelerator that text encoding was ~15% of every render.
+USE_A85 = 0
+
+def _close_page(close):
+    """Runs c.showPage / c.save (where reportlab encodes the page streams) with USE_A85, then puts reportlab's own setting back."""
+    saved = rl_config.useA85
+    rl_config.useA85 = USE_A85
+    try:
+        close()
+    finally:
+        rl_config.useA85 = saved
+
+def hotel_info():
+    """The hotel details printed on invoices, from the settings table."""
+    return {
+        "hotel_name": database.get_setting("hotel_name", "GRAND HOTEL & SUITES"),
+        "hotel_address": database.get_setting("hotel_address", "123, Hospitality Lane, City Center"),
+        "hotel_gst": database.get_setting("hotel_gst", "27AAAAA0000A1Z5"),
+        "hotel_phone": database.get_setting("hotel_phone", "9876543210"),
+    }
+
+def deliver(filename, kind="bill"):
+    """Sends a rendered PDF on: room invoices open in Edge, bills and KOTs in the default PDF app."""
+    if kind == "room_bill":
+        print_file(filename)
+    elif hasattr(os, "startfile"): # Windows only; elsewhere the PDF just stays on disk
+        os.startfile(filename)
+
+# ==========================================
+# STATIC BLOCKS (header, column headers, signature blocks, terms)
+# ==========================================
+# The parts of a ticket that are the same on every job, each drawn by its own
+# function relative to an origin, so the renderers below only lay out the lines
+# that change.
+
+def _draw_at(c, draw, x, y, *args):
+    """Draws the block draw(c, *args) with its origin at (x, y)."""
+    c.saveState() # The block's fonts / colours / line widths stay inside it
+    c.translate(x, y)
+    draw(c, *args)
+    c.restoreState()
+
+# Origin at the top-left corner of the page
+def _room_bill_header(c, width, hotel_name, hotel_addr, gstin, hotel_ph):
+    y = -20
+    c.setFont("Helvetica-Bold", 20)
+    c.drawCentredString(width/2, y, hotel_name)
+    y -= 20
+
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(width/2, y, hotel_addr)
+    y -= 12
+    c.drawCentredString(width/2, y, f"GSTIN: {gstin} | Phone: {hotel_ph}")
+    y -= 20
+    c.line(20, y, width-20, y)
+    y -= 20
+
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(20, y, "TAX INVOICE")
+
+    # Item table header, below the guest details
+    y -= 60
+    c.setFillColorRGB(0.9, 0.9, 0.9)
+    c.rect(20, y-5, width-40, 20, fill=1, stroke=1)
+    c.setFillColorRGB(0, 0, 0)
+
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(30, y, "Description")
+    c.drawString(250, y, "Rate")
+    c.drawString(320, y, "Qty/Days")
+    c.drawRightString(width-30, y, "Amount (INR)")
+
+# Origin at the bottom-left corner of the last page
+def _room_bill_footer(c, width):
+    y = 60
+    c.setFont("Helvetica-Oblique", 10)
+    c.line(20, y+50, 150, y+50); c.drawString(40, y+35, "Guest Signature")
+    c.line(width-170, y+50, width-20, y+50); c.drawString(width-140, y+35, "Authorized Signatory")
+
+    c.setFont("Helvetica", 7)
+    c.drawString(20, y+10, "TERMS & CONDITIONS:")
+    c.drawString(20, y, "1. Subject to City Jurisdiction.  2. Goods once sold will not be taken back.")
+
+# Origin at the top-left corner of the ticket
+def _kot_header(c, width, title):
+    y = -8 * mm
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width/2, y, title)
+    y -= 8 * mm
+    c.rect(5*mm, y-6*mm, width-10*mm, 10*mm) # Box around the table name
+
+    y -= 21 * mm # Below the table name, time and KOT ID
+    c.setLineWidth(1)
+    c.line(0, y, width, y)
+    y -= 5 * mm
+
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2*mm, y, "QTY")
+    c.drawString(15*mm, y, "ITEM")
+
+# Origin at the top-left corner of the bill
+def _bill_header(c, width):
+    y = -10 * mm
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width/2, y, "GRAND HOTEL")
+    y -= 7 * mm
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(width/2, y, "123 Hospitality Lane")
+    y -= 5 * mm
+    c.drawCentredString(width/2, y, "Rishikesh, Uttarakhand")
+    y -= 5 * mm
+    c.line(5*mm, y, width - 5*mm, y)
+
+# Origin on the column header line
+def _bill_columns(c, width):
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(5*mm, 0, "Item")
+    c.drawString(40*mm, 0, "Qty")
+    c.drawRightString(width - 5*mm, 0, "Price")
+    c.line(5*mm, -4*mm, width - 5*mm, -4*mm)
+
+def _bill_footer(c, width):
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawCentredString(width/2, 0, "Thank You for Visiting!")
+
 def generate_room_bill(room_num, guest_data, food_items, room_price, payment_mode):
+    deliver(render_room_bill(room_num, guest_data, food_items, room_price, payment_mode), "room_bill")
+
+def send_raw(kind, *args, **kwargs):
+    """
+    Prints a KOT / bill as ESC/POS on the thermal printer set up for it (escpos.py).
+    False when there is none or it can't be reached: the caller prints the PDF instead.
+    """
+    sink = escpos.sink_for(kind, kwargs.get("station"))
+    if not sink:
+        return False
+    try:
+        escpos.send(sink, escpos.ticket(kind, *args, **kwargs))
+        return True
+    except OSError as e:
+        print(f"⚠️ Thermal printer {sink} unreachable ({e}), printing the PDF instead")
+        return False
+
+def generate_kot(table_num, cart_items, station=None):
+    if send_raw("kot", table_num, cart_items, station=station):
+        return
+    try:
+        deliver(render_kot(table_num, cart_items, station), "kot")
+    except OSError:
+        pass
+
+def generate_bill(order_type, table_num, cart_items, total_amount, discount=0, customer=None):
+    if send_raw("bill", order_type, table_num, cart_items, total_amount, discount, customer):
+        return
+    try:
+        deliver(render_bill(order_type, table_num, cart_items, total_amount, discount, customer), "bill")
+    except OSError:
+        pass
+
+def invoice_number(room_num, check_out_dt):
+    return f"INV-{check_out_dt.strftime('%y%m%d')}{room_num}"
+
+def stay_days(check_in_str, check_out_dt):
+    """Days charged on the room invoice: whole days since check-in, minimum 1."""
+    try:
+        ci_dt = datetime.datetime.strptime(check_in_str.split('.')[0], "%Y-%m-%d %H:%M:%S")
+        days = (check_out_dt - ci_dt).days
+        if days == 0: days = 1 # Minimum 1 day charge
+    except:
+        days = 1
+    return days
+
+def room_bill_totals(room_price, days, food_items):
+    """
+    The room invoice's money: (slabs, subtotal, total_tax) where slabs is
+    {GST rate: taxable value} (room at the room rate, food at each line's rate).
+    """
+    slabs = {database.ROOM_TAX_RATE: room_price * days}
+    for item in food_items:
+        tax_rate = item[4] if len(item) > 4 else 5.0 # The rate stored on the order line
+        slabs[tax_rate] = slabs.get(tax_rate, 0) + item[3]
+    total_tax = sum(2 * round(taxable * tax_rate / 200, 2) for tax_rate, taxable in sorted(slabs.items()) if tax_rate and taxable)
+    return slabs, sum(slabs.values()), total_tax
+
+def render_room_bill(room_num, guest_data, food_items, room_price, payment_mode, hotel=None,
+                     check_out=None, filename=None):
+    """
+    check_out (a datetime) dates the invoice; default now, i.e. checking out.
+    A reprint passes the stored check-out, and its own filename.
+    """
     # --- 1. FETCH DYNAMIC INFO (Replacing hardcoded strings) ---
-    hotel_name = database.get_setting("hotel_name", "GRAND HOTEL & SUITES")
-    hotel_addr = database.get_setting("hotel_address", "123, Hospitality Lane, City Center")
-    gstin = database.get_setting("hotel_gst", "27AAAAA0000A1Z5")
-    hotel_ph = database.get_setting("hotel_phone", "9876543210")
+    hotel = hotel or hotel_info()
+    hotel_name = hotel["hotel_name"]
+    hotel_addr = hotel["hotel_address"]
+    gstin = hotel["hotel_gst"]
+    hotel_ph = hotel["hotel_phone"]
 
     # --- DATA PREP ---
-    booking_id = f"{datetime.datetime.now().strftime('%y%m%d')}{room_num}"
-    invoice_no = f"INV-{booking_id}"
+    check_out_dt = check_out or datetime.datetime.now()
+    invoice_no = invoice_number(room_num, check_out_dt)
     
     # guest_data structure: (name, phone, check_in_date)
     check_in_str = guest_data[2] if len(guest_data) > 2 and guest_data[2] else "N/A"
     guest_phone = guest_data[1] if len(guest_data) > 1 and guest_data[1] else "N/A"
     
-    check_out_dt = datetime.datetime.now()
     check_out_str = check_out_dt.strftime("%Y-%m-%d %H:%M")
-    
-    # Calculate Days Stayed
-    try:
-        ci_dt = datetime.datetime.strptime(check_in_str.split('.')[0], "%Y-%m-%d %H:%M:%S")
-        days = (check_out_dt - ci_dt).days
-        if days == 0: days = 1 # Minimum 1 day charge
-    except:
-        days = 1
+    days = stay_days(check_in_str, check_out_dt)
         
     # --- PDF SETUP ---
-    filename = f"Invoice_{room_num}_{booking_id}.pdf"
+    filename = filename or f"Invoice_{room_num}_{invoice_no[4:]}.pdf"
     c = canvas.Canvas(filename, pagesize=A4)
     width, height = A4
     
-    # --- HEADER (Now using get_setting) ---
-    y = height - 20
-    c.setFont("Helvetica-Bold", 20)
-    c.drawCentredString(width/2, y, hotel_name) # Dynamic
-    y -= 20
-    
-    c.setFont("Helvetica", 10)
-    c.drawCentredString(width/2, y, hotel_addr) # Dynamic
-    y -= 12
-    c.drawCentredString(width/2, y, f"GSTIN: {gstin} | Phone: {hotel_ph}") # Dynamic
-    y -= 20
-    c.line(20, y, width-20, y)
-    y -= 20
+    # --- HEADER + ITEM TABLE HEADER (static block) ---
+    _draw_at(c, _room_bill_header, 0, height, width, hotel_name, hotel_addr, gstin, hotel_ph)
+    y = height - 92
     
     # --- INVOICE INFO ---
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(20, y, "TAX INVOICE")
-    
     c.setFont("Helvetica-Bold", 10)
     c.drawRightString(width-20, y, f"Invoice No: {invoice_no}")
     y -= 12
@@ -96,22 +276,10 @@ def generate_room_bill(room_num, guest_data, food_items, room_price, payment_mod
     c.drawCentredString(width/2, y-27, f"Check-In: {check_in_str}") # Fixed
     c.drawCentredString(width/2, y-39, f"Check-Out: {check_out_str}")
     
-    y -= 60
-    
-    # --- ITEM TABLE HEADER ---
-    c.setFillColorRGB(0.9, 0.9, 0.9)
-    c.rect(20, y-5, width-40, 20, fill=1, stroke=1)
-    c.setFillColorRGB(0, 0, 0)
-    
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(30, y, "Description")
-    c.drawString(250, y, "Rate")
-    c.drawString(320, y, "Qty/Days")
-    c.drawRightString(width-30, y, "Amount (INR)")
-    y -= 20
+    y -= 80 # Past the item table header
     
     # --- TABLE CONTENT ---
-    total_amount = 0
+    slabs, subtotal, total_tax = room_bill_totals(room_price, days, food_items)
     c.setFont("Helvetica", 10)
     
     # A. Room Charges
@@ -121,7 +289,6 @@ def generate_room_bill(room_num, guest_data, food_items, room_price, payment_mod
     c.drawString(330, y, str(days))
     c.drawRightString(width-30, y, f"{room_total:.2f}")
     y -= 15
-    total_amount += room_total
     
     # B. Food Items
     if food_items:
@@ -138,33 +305,36 @@ def generate_room_bill(room_num, guest_data, food_items, room_price, payment_mod
             c.drawString(330, y, str(qty))
             c.drawRightString(width-30, y, f"{line_tot:.2f}")
             y -= 12
-            total_amount += line_tot
             
             if y < 100:
-                c.showPage()
+                _close_page(c.showPage)
                 y = height - 50
     
     y -= 10
     c.line(20, y, width-20, y)
     y -= 20
     
-    # --- TOTALS ---
-    subtotal = total_amount
-    cgst, sgst = subtotal * 0.09, subtotal * 0.09
-    grand_total = subtotal + cgst + sgst
+    # --- TOTALS (GST per slab: room at the room rate, food at each line's rate) ---
+    if y < 120 + 30 * len(slabs): # Keep the totals clear of the footer
+        _close_page(c.showPage)
+        y = height - 50
     
     c.setFont("Helvetica", 10)
-    c.drawString(350, y, "Sub Total:")
+    c.drawString(300, y, "Sub Total:")
     c.drawRightString(width-30, y, f"{subtotal:.2f}")
     y -= 15
     
-    c.drawString(350, y, "CGST (9%):")
-    c.drawRightString(width-30, y, f"{cgst:.2f}")
-    y -= 15
-    
-    c.drawString(350, y, "SGST (9%):")
-    c.drawRightString(width-30, y, f"{sgst:.2f}")
-    y -= 20
+    for tax_rate in sorted(slabs):
+        taxable = slabs[tax_rate]
+        if not tax_rate or not taxable:
+            continue
+        half = round(taxable * tax_rate / 200, 2) # CGST = SGST = half the slab's GST
+        for part in ("CGST", "SGST"):
+            c.drawString(300, y, f"{part} @ {tax_rate / 2:g}% on {taxable:,.2f}:")
+            c.drawRightString(width-30, y, f"{half:.2f}")
+            y -= 15
+    y -= 5
+    grand_total = subtotal + total_tax
     
     c.setFillColorRGB(0.9, 0.9, 0.9)
     c.rect(340, y-5, width-370, 20, fill=1, stroke=0)
@@ -180,23 +350,19 @@ def generate_room_bill(room_num, guest_data, food_items, room_price, payment_mod
     c.setFont("Helvetica-Oblique", 10)
     c.drawString(120, y, f"{num_to_words(int(grand_total))} Rupees Only")
     
-    # --- FOOTER ---
-    y = 60
-    c.line(20, y+50, 150, y+50); c.drawString(40, y+35, "Guest Signature")
-    c.line(width-170, y+50, width-20, y+50); c.drawString(width-140, y+35, "Authorized Signatory")
-    
-    c.setFont("Helvetica", 7)
-    c.drawString(20, y+10, "TERMS & CONDITIONS:")
-    c.drawString(20, y, "1. Subject to City Jurisdiction.  2. Goods once sold will not be taken back.")
+    # --- FOOTER (static block) ---
+    _draw_at(c, _room_bill_footer, 0, 0, width)
     
-    c.save()
-    print_file(filename)
+    _close_page(c.save)
+    return os.path.abspath(filename)
     
-def generate_kot(table_num, cart_items):
+def render_kot(table_num, cart_items, station=None):
     timestamp = datetime.datetime.now().strftime("%H%M%S")
     # Clean label for the ID
     kot_id = f"KOT-{str(table_num).replace(' ', '')}-{timestamp[-4:]}"
-    filename = f"KOT_{str(table_num).replace(' ', '_')}_{timestamp}.pdf"
+    # One ticket per station, printed at the same second: the station keeps the names apart
+    suffix = f"_{station.replace(' ', '_')}" if station else ""
+    filename = f"KOT_{str(table_num).replace(' ', '_')}{suffix}_{timestamp}.pdf"
     
     # --- 1. CALCULATE EXACT HEIGHT ---
     header_height = 42
@@ -220,14 +386,11 @@ def generate_kot(table_num, cart_items):
     y = height - 8 * mm
     mid_x = width / 2
     
-    # --- 2. HEADER ---
-    c.setFont("Helvetica-Bold", 16)
-    c.drawCentredString(mid_x, y, "KITCHEN TICKET")
+    # --- 2. HEADER (title, boxes, column headers: static block) ---
+    _draw_at(c, _kot_header, 0, height, width, f"{station or 'KITCHEN'} TICKET")
     y -= 8 * mm
     
     c.setFont("Helvetica-Bold", 14)
-    # Box around table name
-    c.rect(5*mm, y-6*mm, width-10*mm, 10*mm)
     c.drawCentredString(mid_x, y-4*mm, f"{table_num}")
     y -= 12 * mm
     
@@ -236,18 +399,9 @@ def generate_kot(table_num, cart_items):
     c.drawCentredString(mid_x, y, f"Time: {dt}")
     y -= 4 * mm
     c.drawCentredString(mid_x, y, f"ID: {kot_id}")
-    y -= 5 * mm
-    
-    c.setLineWidth(1)
-    c.line(0, y, width, y)
-    y -= 5 * mm
+    y -= 15 * mm # Past the cut line and QTY / ITEM headers
     
     # --- 3. ITEMS ---
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(2*mm, y, "QTY")
-    c.drawString(15*mm, y, "ITEM")
-    y -= 5 * mm
-    
     for item in cart_items:
         qty = item['qty']
         name = item['name']
@@ -277,11 +431,8 @@ def generate_kot(table_num, cart_items):
     c.setLineWidth(1)
     c.line(0, y, width, y)
     
-    c.save()
-    try:
-        os.startfile(filename)
-    except:
-        pass
+    _close_page(c.save)
+    return os.path.abspath(filename)
 
 def print_file(filename):
     """Opens the PDF explicitly using Microsoft Edge."""
@@ -292,15 +443,12 @@ def print_file(filename):
     except Exception as e:
         print(f"Error opening Edge: {e}")
 
-def generate_bill(order_type, table_num, cart_items, total_amount, discount=0, customer=None):
-    import os
-    import datetime
-    from reportlab.lib.units import mm
-    from reportlab.pdfgen import canvas
-
-    timestamp = datetime.datetime.now().strftime("%H%M%S")
+def render_bill(order_type, table_num, cart_items, total_amount, discount=0, customer=None,
+                printed_at=None, filename=None):
+    """printed_at (a datetime) is the time on the bill, default now; a reprint passes the close time."""
+    printed_at = printed_at or datetime.datetime.now()
     safe_table = str(table_num).replace(' ', '_')
-    filename = f"Bill_{safe_table}_{timestamp}.pdf"
+    filename = filename or f"Bill_{safe_table}_{printed_at.strftime('%H%M%S')}.pdf"
     
     # --- DYNAMIC HEIGHT CALCULATION ---
     # base_height covers header, table headers, and final totals (~90mm)
@@ -320,17 +468,9 @@ def generate_bill(order_type, table_num, cart_items, total_amount, discount=0, c
     left_x = 5 * mm
     right_x = width - 5 * mm
     
-    # --- HEADER ---
-    c.setFont("Helvetica-Bold", 16)
-    c.drawCentredString(mid_x, y, "GRAND HOTEL")
-    y -= 7 * mm
-    c.setFont("Helvetica", 10)
-    c.drawCentredString(mid_x, y, "123 Hospitality Lane")
-    y -= 5 * mm
-    c.drawCentredString(mid_x, y, "Rishikesh, Uttarakhand")
-    y -= 5 * mm
-    c.line(left_x, y, right_x, y)
-    y -= 5 * mm
+    # --- HEADER (static block) ---
+    _draw_at(c, _bill_header, 0, height, width)
+    y -= 22 * mm
     
     # --- INFO ---
     c.setFont("Helvetica-Bold", 11)
@@ -344,7 +484,7 @@ def generate_bill(order_type, table_num, cart_items, total_amount, discount=0, c
     c.drawString(left_x, y, f"Order: {label}")
     
     c.setFont("Helvetica", 9)
-    dt_str = datetime.datetime.now().strftime("%d-%b %H:%M")
+    dt_str = printed_at.strftime("%d-%b %H:%M")
     c.drawRightString(right_x, y, dt_str)
     y -= 6 * mm
     
@@ -361,14 +501,9 @@ def generate_bill(order_type, table_num, cart_items, total_amount, discount=0, c
     c.line(left_x, y, right_x, y)
     y -= 5 * mm
     
-    # --- COLUMN HEADERS ---
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(left_x, y, "Item")
-    c.drawString(left_x + 35*mm, y, "Qty")
-    c.drawRightString(right_x, y, "Price")
-    y -= 4 * mm
-    c.line(left_x, y, right_x, y)
-    y -= 5 * mm
+    # --- COLUMN HEADERS (static block) ---
+    _draw_at(c, _bill_columns, 0, y, width)
+    y -= 9 * mm
     
     # --- ITEMS LOOP ---
     subtotal = 0.0
@@ -426,14 +561,9 @@ def generate_bill(order_type, table_num, cart_items, total_amount, discount=0, c
     y -= 8 * mm 
     
     # --- FOOTER ---
-    c.setFont("Helvetica-Oblique", 9)
-    c.drawCentredString(mid_x, y, "Thank You for Visiting!")
+    _draw_at(c, _bill_footer, 0, y, width)
     
     # "Generated by HotelApp" line has been removed
     
-    c.save()
-    
-    try:
-        os.startfile(filename)
-    except:
-        pass
+    _close_page(c.save)
+    return os.path.abspath(filename)